@@ -0,0 +1,76 @@
+"""Local admin commands for the running bot
+
+The bot listens on a unix socket (KillSwitchConfig.admin_socket) for one
+command per connection and answers with a JSON line:
+
+    python admin_socket.py flatten     # halt, then close and cancel everything
+    python admin_socket.py halt        # stop opening trades
+    python admin_socket.py resume
+    python admin_socket.py status
+"""
+from json_codec import dumpb, loads, pretty
+from typing import Awaitable, Callable, Dict
+import argparse
+import asyncio
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+class AdminServer:
+    def __init__(self, path: str, commands: Dict[str, Callable[[], Awaitable[dict]]]):
+        self.path = path
+        self.commands = commands  # name -> coroutine function returning the reply
+        self.server = None
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a previous run
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.server = await asyncio.start_unix_server(self._handle, self.path)
+        # Only the bot's own user may send commands
+        os.chmod(self.path, 0o600)
+        self.logger.info(f"Admin commands on {self.path}: {', '.join(self.commands)}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            command = (await reader.readline()).decode().strip()
+            handler = self.commands.get(command)
+            if handler is None:
+                reply = {'error': f"unknown command {command!r}", 'commands': list(self.commands)}
+            else:
+                self.logger.warning(f"Admin command: {command}")
+                reply = await handler()
+            writer.write(dumpb(reply) + b"\n")
+            await writer.drain()
+        except Exception as e:
+            self.logger.error(f"Error handling admin command: {e}")
+        finally:
+            writer.close()
+
+def send_command(path: str, command: str, timeout: float = 120.0) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(command.encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    return loads(reply)
+
+def main():
+    parser = argparse.ArgumentParser(description="Send an admin command to the running bot")
+    parser.add_argument('command', choices=['flatten', 'halt', 'resume', 'status'])
+    parser.add_argument('--socket', default=os.getenv("ADMIN_SOCKET", "data/admin.sock"))
+    args = parser.parse_args()
+    print(pretty(send_command(args.socket, args.command)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Live performance attribution per signal channel and per symbol
+
+Every order a trade submits carries the trade's tag in its client order id
+(see bitmart_client.tagged_orders), so when the position closes its fills
+can be picked out of the account's trade history: entry fills, TP/SL/trail
+exits and the fees paid on each. The trade's result is folded into running
+aggregates per channel and per symbol in O(1), published as gauges, and
+written to a small rollup file for the day. On start the rollups are summed
+back up, so a restart resumes the aggregates without replaying any fills.
+"""
+from bitmart_client import TRADE_TAG, trade_tag
+from config import AttributionConfig
+from json_codec import dumpb, loads
+from metrics import metrics
+from models import Trade
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, asdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+ROLLUP = re.compile(r'^\d{4}-\d{2}-\d{2}\.json$')
+
+@dataclass
+class TradeResult:
+    """One closed trade, linked to its signal through the tag on its orders"""
+    channel: str
+    symbol: str
+    message_id: int
+    tag: str
+    opened_at: float
+    closed_at: float
+    entry_price: float  # Average entry fill
+    pnl: float  # Realized profit net of fees, USDT
+    fees: float
+    r: Optional[float]  # pnl over the risk to the posted stop loss, None if the risk is unknown
+    slippage: float  # Entry fill against the market price, percent (positive = worse)
+    time_to_protect: Optional[float]  # Seconds from entry fill to stop loss accepted
+    exit: str  # Leg that closed the position: 'tp', 'stop_loss', 'trail' or 'manual'
+    fills: int
+
+@dataclass
+class RunningStats:
+    """Aggregates that take one trade at a time; averages are derived from the sums"""
+    trades: int = 0
+    wins: int = 0
+    pnl: float = 0.0  # Net of fees, USDT
+    fees: float = 0.0
+    r_sum: float = 0.0
+    r_trades: int = 0  # Trades with a known risk
+    slippage_sum: float = 0.0
+    protect_sum: float = 0.0
+    protect_trades: int = 0  # Trades whose stop loss was placed
+    exits: Dict[str, int] = field(default_factory=dict)  # Exit leg -> trades
+
+    def add(self, result: TradeResult):
+        self.trades += 1
+        self.wins += result.pnl > 0
+        self.pnl += result.pnl
+        self.fees += result.fees
+        if result.r is not None:
+            self.r_sum += result.r
+            self.r_trades += 1
+        self.slippage_sum += result.slippage
+        if result.time_to_protect is not None:
+            self.protect_sum += result.time_to_protect
+            self.protect_trades += 1
+        self.exits[result.exit] = self.exits.get(result.exit, 0) + 1
+
+    def merge(self, other: 'RunningStats'):
+        for f in fields(self):
+            if f.name == 'exits':
+                for leg, count in other.exits.items():
+                    self.exits[leg] = self.exits.get(leg, 0) + count
+            else:
+                setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.trades if self.trades else 0.0
+
+    @property
+    def avg_r(self) -> float:
+        return self.r_sum / self.r_trades if self.r_trades else 0.0
+
+    @property
+    def avg_slippage(self) -> float:
+        return self.slippage_sum / self.trades if self.trades else 0.0
+
+    @property
+    def avg_time_to_protect(self) -> float:
+        return self.protect_sum / self.protect_trades if self.protect_trades else 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RunningStats':
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+class Attribution:
+    """Running per-channel and per-symbol results, with one rollup file per UTC day"""
+
+    def __init__(self, config: AttributionConfig):
+        self.config = config
+        # Since the first rollup: scope ('channel' or 'symbol') -> key -> stats
+        self.totals: Dict[str, Dict[str, RunningStats]] = {'channel': {}, 'symbol': {}}
+        self.day = ""
+        self.today: Dict[str, Dict[str, RunningStats]] = {'channel': {}, 'symbol': {}}
+        self._recorded = OrderedDict()  # Trades already counted, the most recent 1000
+        self.logger = logging.getLogger(__name__)
+
+    def load(self):
+        """Sum the daily rollups into the running totals"""
+        if not self.config.path or not os.path.isdir(self.config.path):
+            return
+        today = self._day(time.time())
+        days = sorted(name for name in os.listdir(self.config.path) if ROLLUP.match(name))
+        for name in days:
+            try:
+                with open(os.path.join(self.config.path, name), 'rb') as f:
+                    rollup = loads(f.read())
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Skipping unreadable rollup {name}: {e}")
+                continue
+            for scope in ('channel', 'symbol'):
+                for key, data in rollup.get(scope, {}).items():
+                    stats = RunningStats.from_dict(data)
+                    self.totals[scope].setdefault(key, RunningStats()).merge(stats)
+                    if name[:-5] == today:
+                        self.today[scope].setdefault(key, RunningStats()).merge(stats)
+        self.day = today
+        for scope, table in self.totals.items():
+            for key, stats in table.items():
+                self._publish(scope, key, stats)
+        self.logger.info(f"Loaded {len(days)} daily rollup(s): {len(self.totals['channel'])} channel(s), "
+                         f"{len(self.totals['symbol'])} symbol(s)")
+
+    def attribute(self, trade: Trade, fills: Iterable[dict], closed_at: float) -> TradeResult:
+        """Build a trade's result from the symbol's fills between its open and close"""
+        tag = trade_tag(trade.channel_id, trade.message_id)
+        entries, exits = [], []
+        for fill in fills:
+            fill_tag = (fill.get('client_order_id') or "").split('_', 1)[0]
+            if TRADE_TAG.match(fill_tag) and fill_tag != tag:
+                continue  # Another trade's order
+            if not trade.opened_at - 1 <= int(fill['create_time']) / 1000 <= closed_at + 1:
+                continue
+            (entries if int(fill['side']) in (1, 4) else exits).append(fill)
+
+        fees = sum(abs(float(fill.get('paid_fees') or 0)) for fill in entries + exits)
+        pnl = sum(float(fill.get('realised_profit') or 0) for fill in exits) - fees
+        volume = sum(float(fill['vol']) for fill in entries)
+        if volume:
+            entry_price = sum(float(fill['price']) * float(fill['vol']) for fill in entries) / volume
+        else:
+            entry_price = (trade.brackets.get('entry') or {}).get('price') or trade.entry_price
+
+        # Risk to the stop loss as posted, in USDT for the notional that was opened
+        stop = trade.signal_stop_loss or trade.stop_loss
+        risk = trade.notional * abs(entry_price - stop) / entry_price if entry_price and stop else 0.0
+        last = max(exits, key=lambda fill: int(fill['create_time'])) if exits else None
+        return TradeResult(
+            channel=str(trade.channel_id),
+            symbol=trade.symbol,
+            message_id=trade.message_id,
+            tag=tag,
+            opened_at=trade.opened_at,
+            closed_at=closed_at,
+            entry_price=entry_price,
+            pnl=pnl,
+            fees=fees,
+            r=pnl / risk if risk > 0 else None,
+            slippage=trade.slippage,
+            time_to_protect=trade.protected_at - trade.filled_at if trade.protected_at and trade.filled_at else None,
+            exit=self.exit_leg(trade, entry_price, float(last['price'])) if last else 'manual',
+            fills=len(entries) + len(exits)
+        )
+
+    def exit_leg(self, trade: Trade, entry_price: float, price: float) -> str:
+        """Credit the final closing fill to the TP or SL leg it is nearest, or to the trail"""
+        tolerance = self.config.exit_tolerance / 100
+        nearest, distance = None, tolerance
+        for leg, bracket in trade.brackets.items():
+            if leg == 'stop_loss' or leg.startswith('tp'):
+                off = abs(price - bracket['price']) / bracket['price']
+                if off <= distance:
+                    nearest, distance = ('tp' if leg.startswith('tp') else leg), off
+        if nearest:
+            return nearest
+        in_profit = price < entry_price if trade.is_short else price > entry_price
+        return 'trail' if 'trail' in trade.brackets and in_profit else 'manual'
+
+    def record(self, result: TradeResult) -> bool:
+        """Fold a closed trade into the aggregates; False if it was already counted"""
+        key = (result.tag, result.symbol, result.opened_at)
+        if key in self._recorded:
+            return False
+        self._recorded[key] = True
+        if len(self._recorded) > 1000:
+            self._recorded.popitem(last=False)
+
+        day = self._day(result.closed_at)
+        if day != self.day:
+            self.day = day
+            self.today = {'channel': {}, 'symbol': {}}
+        for scope, key in (('channel', result.channel), ('symbol', result.symbol)):
+            self.today[scope].setdefault(key, RunningStats()).add(result)
+            stats = self.totals[scope].setdefault(key, RunningStats())
+            stats.add(result)
+            self._publish(scope, key, stats)
+        metrics.inc('attribution_exits_total', channel=result.channel, exit=result.exit)
+        self.logger.info(f"Attributed {result.symbol} trade of message {result.message_id} "
+                         f"(channel {result.channel}): {result.pnl:+.4f} USDT, "
+                         f"R {'n/a' if result.r is None else f'{result.r:+.2f}'}, exit {result.exit}")
+        self._save()
+        return True
+
+    def summary(self, scope: str = 'channel') -> List[dict]:
+        return [
+            {scope: key, 'trades': stats.trades, 'win_rate': stats.win_rate, 'avg_r': stats.avg_r,
+             'pnl': stats.pnl, 'fees': stats.fees, 'avg_slippage': stats.avg_slippage,
+             'avg_time_to_protect': stats.avg_time_to_protect, 'exits': dict(stats.exits)}
+            for key, stats in sorted(self.totals[scope].items())
+        ]
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+    def _publish(self, scope: str, key: str, stats: RunningStats):
+        labels = {scope: key}
+        metrics.set_gauge(f'attribution_{scope}_trades', stats.trades, **labels)
+        metrics.set_gauge(f'attribution_{scope}_win_rate', stats.win_rate, **labels)
+        metrics.set_gauge(f'attribution_{scope}_avg_r', stats.avg_r, **labels)
+        metrics.set_gauge(f'attribution_{scope}_pnl', stats.pnl, **labels)
+        metrics.set_gauge(f'attribution_{scope}_fees', stats.fees, **labels)
+        metrics.set_gauge(f'attribution_{scope}_avg_slippage_percent', stats.avg_slippage, **labels)
+        metrics.set_gauge(f'attribution_{scope}_avg_time_to_protect_seconds', stats.avg_time_to_protect, **labels)
+
+    def _save(self):
+        """Rewrite today's rollup; it holds one small record per channel and symbol"""
+        if not self.config.path:
+            return
+        rollup = {scope: {key: asdict(stats) for key, stats in table.items()} for scope, table in self.today.items()}
+        path = os.path.join(self.config.path, f"{self.day}.json")
+        try:
+            os.makedirs(self.config.path, exist_ok=True)
+            with open(path + ".tmp", 'wb') as f:
+                f.write(dumpb(rollup))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self.logger.error(f"Error writing rollup {path}: {e}")
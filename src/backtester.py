@@ -0,0 +1,338 @@
+"""Vectorized replay of stored signals against local klines
+
+Usage:
+    python backtester.py --channel CHANNEL_ID [--step 1] [--since UNIX] [--until UNIX] [--config trading.json]
+
+Mirrors SignalMonitor.execute_trade: market entry sized to usdt_value, the
+large/medium/normal take-profit split, a trailing stop activated at a target
+with a percentage callback, and a stop loss for the full size.
+"""
+from bitmart_client import BitmartClient
+from config import BitmartConfig, TradingConfig, SizingConfig, ExitConfig, load_trading_config
+from kline_store import KlineStore
+from signal_store import SignalStore
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BacktestParams:
+    usdt_value: float = 15.0  # Target position value
+    callback_rate: float = 2.0  # Trailing stop callback, percent
+    trail_activation_target: int = 1  # Target (1-based) at which the trailing stop activates
+    large_value_ratio: float = 1.0  # Single TP when the actual value exceeds usdt_value by this ratio
+    taker_fee: float = 0.0006  # Fee rate charged on every fill
+    horizon: int = 4320  # Candles a trade is followed for before it is marked to market
+    chunk: int = 256  # Signals simulated per vectorized block
+
+    @classmethod
+    def from_trading_config(cls, trading: TradingConfig, **kwargs) -> 'BacktestParams':
+        return cls(
+            usdt_value=trading.sizing.usdt_value,
+            callback_rate=trading.exits.callback_rate,
+            trail_activation_target=trading.exits.trail_activation_target,
+            large_value_ratio=trading.exits.large_value_ratio,
+            **kwargs
+        )
+
+    def to_trading_config(self) -> TradingConfig:
+        """Live trading config using these parameters with fixed sizing"""
+        return TradingConfig(
+            sizing=SizingConfig(mode="fixed", usdt_value=self.usdt_value),
+            exits=ExitConfig(
+                callback_rate=self.callback_rate,
+                trail_activation_target=self.trail_activation_target,
+                large_value_ratio=self.large_value_ratio
+            )
+        )
+
+def load_contract_specs(bitmart: BitmartClient, path: str) -> Dict[str, tuple]:
+    """Contract size and min volume per symbol, cached in a JSON file"""
+    if os.path.exists(path):
+        with open(path) as f:
+            return {symbol: tuple(spec) for symbol, spec in json.load(f).items()}
+
+    details = bitmart.get_contract_details()
+    if details.get('code') != 1000:
+        raise ValueError(f"Could not get contract details: {details}")
+
+    specs = {
+        contract['symbol']: (float(contract['contract_size']), int(contract['min_volume']))
+        for contract in details.get('data', {}).get('symbols', [])
+    }
+    with open(path, 'w') as f:
+        json.dump(specs, f)
+    return specs
+
+def _first(mask: np.ndarray) -> np.ndarray:
+    """Column of the first True per row, or the row length if there is none"""
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), mask.shape[1])
+
+def _gather(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    return np.take_along_axis(values, np.minimum(index, values.shape[1] - 1)[:, None], axis=1)[:, 0]
+
+class Backtester:
+    """Simulate every signal at once on a matrix of candles per signal
+
+    Candles for all symbols are concatenated into flat arrays. Each signal
+    gets a row of `horizon` candles starting at its entry, and TP, SL and
+    trailing-stop events are found with vectorized first-hit searches on
+    those rows. Prices of shorts are negated so both sides share the long
+    logic.
+    """
+
+    RESULT_COLUMNS = ('valid', 'entry', 'size', 'notional', 'pnl', 'fees', 'r_multiple',
+                      'tp_hit', 'sl_hit', 'trail_hit', 'time_to_tp1', 'hold_time', 'max_drawdown')
+
+    # Everything a simulation reads; candle arrays are flat across symbols,
+    # the rest has one row per signal
+    ARRAYS = ('open', 'high', 'low', 'close', 'start', 'end', 'contract_size',
+              'min_volume', 'side', 'targets', 'stop_loss')
+
+    def __init__(self, arrays: Dict[str, np.ndarray], step: int):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.step = step
+        self.interval = step * 60
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_stores(cls, signals: Dict[str, np.ndarray], symbols: List[str], kline_store: KlineStore,
+                    step: int, specs: Dict[str, tuple]) -> 'Backtester':
+        """Line up stored signals with their symbols' candles"""
+        n = len(signals['timestamp'])
+
+        # Flatten candles of every symbol we have signals for
+        opens, highs, lows, closes = [], [], [], []
+        start = np.zeros(n, dtype=np.int64)
+        end = np.zeros(n, dtype=np.int64)  # Exclusive end of the signal's symbol in the flat arrays
+        contract_size = np.full(n, np.nan)
+        min_volume = np.zeros(n, dtype=np.int64)
+        offset = 0
+        for symbol_id in np.unique(signals['symbol_id']):
+            symbol = symbols[symbol_id]
+            rows = signals['symbol_id'] == symbol_id
+            candles = kline_store.load(symbol, step)
+            if len(candles) == 0 or symbol not in specs:
+                logger.warning(f"No candles or contract spec for {symbol}, skipping its signals")
+                start[rows] = end[rows] = offset
+                continue
+
+            # Market entry at the open of the first candle after the signal
+            local = np.searchsorted(candles['timestamp'], signals['timestamp'][rows], side='right')
+            start[rows] = offset + local
+            end[rows] = offset + len(candles)
+            contract_size[rows], min_volume[rows] = specs[symbol]
+
+            opens.append(candles['open'])
+            highs.append(candles['high'])
+            lows.append(candles['low'])
+            closes.append(candles['close'])
+            offset += len(candles)
+
+        empty = np.empty(0)
+        return cls({
+            'open': np.concatenate(opens) if opens else empty,
+            'high': np.concatenate(highs) if highs else empty,
+            'low': np.concatenate(lows) if lows else empty,
+            'close': np.concatenate(closes) if closes else empty,
+            'start': start,
+            'end': end,
+            'contract_size': contract_size,
+            'min_volume': min_volume,
+            'side': np.asarray(signals['side']),
+            'targets': np.asarray(signals['targets']),
+            'stop_loss': np.asarray(signals['stop_loss']),
+        }, step)
+
+    def run(self, params: BacktestParams = None) -> Dict[str, np.ndarray]:
+        """Simulate all signals and return per-signal result columns"""
+        params = params or BacktestParams()
+        n = len(self.start)
+        results = {
+            'valid': np.zeros(n, dtype=bool),
+            'tp_hit': np.zeros((n, 3), dtype=bool),
+        }
+        for name in self.RESULT_COLUMNS:
+            if name not in results:
+                results[name] = np.full(n, np.nan)
+
+        for lo in range(0, n, params.chunk):
+            hi = min(n, lo + params.chunk)
+            chunk = self._simulate(np.arange(lo, hi), params)
+            for name, values in chunk.items():
+                results[name][lo:hi] = values
+        return results
+
+    def _simulate(self, rows: np.ndarray, params: BacktestParams) -> Dict[str, np.ndarray]:
+        horizon = params.horizon
+        start, end = self.start[rows], self.end[rows]
+        valid_rows = start < end
+        start = np.where(valid_rows, start, 0)
+        end = np.where(valid_rows, end, 1)
+
+        if len(self.open) == 0:
+            return {'valid': np.zeros(len(rows), dtype=bool)}
+
+        cols = np.arange(horizon)
+        index = start[:, None] + cols[None, :]
+        valid = (index < end[:, None]) & valid_rows[:, None]
+        index = np.minimum(index, (end - 1)[:, None])
+
+        # Work in "long space": shorts use negated prices
+        direction = np.where(self.side[rows] == 4, -1.0, 1.0)
+        is_long = (direction > 0)[:, None]
+        high, low = self.high[index], self.low[index]
+        favorable = np.where(is_long, high, -low)
+        adverse = np.where(is_long, low, -high)
+        open_ = direction[:, None] * self.open[index]
+
+        entry_price = self.open[index[:, 0]]
+        entry = open_[:, 0]
+        targets = direction[:, None] * self.targets[rows]
+        stop_loss = direction * self.stop_loss[rows]
+
+        # Position sizing and TP split, as in execute_trade
+        contract_size = self.contract_size[rows]
+        min_volume = self.min_volume[rows]
+        contracts = params.usdt_value / (entry_price * contract_size)
+        size = np.maximum(min_volume, np.nan_to_num(contracts).astype(np.int64))
+        notional = size * entry_price * contract_size
+        third, half = size // 3, size // 2
+        large = notional > params.usdt_value * params.large_value_ratio
+        medium = ~large & (third < min_volume)
+        tp_sizes = np.where(large[:, None], np.stack([size, 0 * size, 0 * size], axis=1),
+                            np.where(medium[:, None], np.stack([half, half, 0 * size], axis=1),
+                                     np.stack([third, third, third], axis=1)))
+
+        # First candle reaching each target and the stop loss
+        tp_time = np.stack([_first((favorable >= targets[:, k, None]) & valid) for k in range(3)], axis=1)
+        sl_time = _first((adverse <= stop_loss[:, None]) & valid)
+
+        # Trailing stop: activates at its target, then trails the best price by callback_rate
+        callback = params.callback_rate / 100
+        activation = tp_time[:, min(params.trail_activation_target, 3) - 1]
+        peak = np.maximum.accumulate(np.where(cols[None, :] >= activation[:, None], favorable, -np.inf), axis=1)
+        prior_peak = np.concatenate([np.full((len(rows), 1), -np.inf), peak[:, :-1]], axis=1)
+        trail_stop = prior_peak * (1 - direction[:, None] * callback)
+        trail_time = _first((adverse <= trail_stop) & (cols[None, :] > activation[:, None]) & valid)
+
+        # Whichever of SL and trail comes first closes the remainder; SL wins ties
+        use_sl = sl_time <= trail_time
+        stop_time = np.minimum(sl_time, trail_time)
+        stopped = stop_time < horizon
+        sl_exit = np.minimum(stop_loss, _gather(open_, sl_time))
+        trail_exit = np.minimum(_gather(trail_stop, trail_time), _gather(open_, trail_time))
+        stop_exit = np.where(use_sl, sl_exit, trail_exit)
+
+        # A TP fills only if its candle comes strictly before the stop
+        tp_filled = (tp_time < stop_time[:, None]) & (tp_sizes > 0)
+        filled_size = (tp_filled * tp_sizes).sum(axis=1)
+        remaining = size - filled_size
+
+        # Unstopped remainders are marked to market at the last followed candle
+        last = np.minimum(horizon, end - start) - 1
+        mark = direction * self.close[start + last]
+        exit_price = np.where(stopped, stop_exit, mark)
+
+        tp_gain = np.where(tp_filled, tp_sizes * (targets - entry[:, None]), 0).sum(axis=1)
+        pnl = contract_size * (tp_gain + remaining * (exit_price - entry))
+        fees = params.taker_fee * contract_size * (
+            size * entry_price
+            + np.where(tp_filled, tp_sizes * np.abs(targets), 0).sum(axis=1)
+            + remaining * np.abs(exit_price)
+        )
+        pnl -= fees
+
+        risk = size * contract_size * np.abs(entry - stop_loss)
+        last_tp = np.where(tp_filled, tp_time, -1).max(axis=1)
+        exit_time = np.where(remaining > 0, np.where(stopped, stop_time, last), last_tp)
+
+        # Maximum adverse excursion until the trade is closed
+        held = (cols[None, :] <= exit_time[:, None]) & valid
+        worst = np.where(held, adverse, np.inf).min(axis=1)
+        max_drawdown = (worst - entry) / np.abs(entry)
+
+        return {
+            'valid': valid_rows,
+            'entry': entry_price,
+            'size': size,
+            'notional': notional,
+            'pnl': pnl,
+            'fees': fees,
+            'r_multiple': np.where(risk > 0, pnl / np.where(risk > 0, risk, 1), np.nan),
+            'tp_hit': tp_filled,
+            'sl_hit': stopped & use_sl,
+            'trail_hit': stopped & ~use_sl,
+            'time_to_tp1': np.where(tp_filled[:, 0], (tp_time[:, 0] + 1) * self.interval, np.nan),
+            'hold_time': (exit_time + 1) * self.interval,
+            'max_drawdown': max_drawdown,
+        }
+
+def summarize(results: Dict[str, np.ndarray]) -> dict:
+    """Aggregate per-signal results into headline numbers"""
+    valid = results['valid']
+    count = int(valid.sum())
+    if count == 0:
+        return {'signals': 0}
+
+    pnl = results['pnl'][valid]
+    return {
+        'signals': count,
+        'total_pnl': float(pnl.sum()),
+        'avg_pnl': float(pnl.mean()),
+        'win_rate': float((pnl > 0).mean()),
+        'avg_r': float(np.nanmean(results['r_multiple'][valid])),
+        'tp_hit_rates': [float(rate) for rate in results['tp_hit'][valid].mean(axis=0)],
+        'sl_rate': float(results['sl_hit'][valid].mean()),
+        'trail_rate': float(results['trail_hit'][valid].mean()),
+        'avg_time_to_tp1': float(np.nanmean(results['time_to_tp1'][valid])) if results['tp_hit'][valid, 0].any() else None,
+        'avg_max_drawdown': float(results['max_drawdown'][valid].mean()),
+        'worst_drawdown': float(results['max_drawdown'][valid].min()),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest stored signals against local klines")
+    parser.add_argument('--channel', type=int, action='append', help="Channel ids (default: all)")
+    parser.add_argument('--signals', default=os.path.join('data', 'signals'))
+    parser.add_argument('--klines', default=os.path.join('data', 'klines'))
+    parser.add_argument('--step', type=int, default=1, help="Candle interval in minutes")
+    parser.add_argument('--since', type=int)
+    parser.add_argument('--until', type=int)
+    parser.add_argument('--config', help="Trading config file to take sizing and exit parameters from")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    bitmart = BitmartClient(BitmartConfig(
+        api_key=os.getenv("BITMART_API_KEY"),
+        api_secret=os.getenv("BITMART_API_SECRET"),
+        memo=os.getenv("BITMART_MEMO")
+    ))
+    store = SignalStore(args.signals)
+    specs = load_contract_specs(bitmart, os.path.join(args.klines, 'contract_specs.json'))
+    signals = store.load(channels=args.channel, since=args.since, until=args.until)
+
+    started = time.time()
+    trading = load_trading_config(args.config) if args.config else TradingConfig()
+    backtester = Backtester.from_stores(signals, store.symbols, KlineStore(bitmart, args.klines), args.step, specs)
+    results = backtester.run(BacktestParams.from_trading_config(trading))
+    logger.info(f"Simulated {len(signals['timestamp'])} signals in {time.time() - started:.2f}s")
+    print(json.dumps(summarize(results), indent=2))
+
+if __name__ == "__main__":
+    main()
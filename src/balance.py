@@ -0,0 +1,92 @@
+from bitmart_client import BitmartClient
+from config import SizingConfig
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class BalanceCache:
+    """Locally cached futures account balance
+
+    Seeded from assets-detail, adjusted incrementally from our own fills and
+    overwritten whenever the reconciler fetches a fresh snapshot, so position
+    sizing can read it synchronously without a round trip.
+    """
+
+    def __init__(self, bitmart: BitmartClient, currency: str = "USDT"):
+        self.bitmart = bitmart
+        self.currency = currency
+        self.equity = 0.0
+        self.available = 0.0
+        self.position_margin = 0.0
+        self.updated_at = 0.0  # 0 means the cache was never seeded
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def seeded(self) -> bool:
+        return self.updated_at > 0
+
+    def seed(self):
+        """Load the balance from the exchange"""
+        assets = self.bitmart.get_contract_assets()
+        if not self.update_from_assets(assets):
+            raise ValueError(f"Could not load {self.currency} balance: {assets}")
+        self.logger.info(f"Balance seeded: equity={self.equity:.2f} available={self.available:.2f} {self.currency}")
+
+    def update_from_assets(self, assets: dict) -> bool:
+        """Replace the cached balance with an assets-detail response"""
+        if assets.get('code') != 1000:
+            return False
+
+        for asset in assets.get('data') or []:
+            if asset.get('currency') == self.currency:
+                self.equity = float(asset['equity'])
+                self.available = float(asset['available_balance'])
+                self.position_margin = float(asset['position_deposit'])
+                self.updated_at = time.time()
+                return True
+        return False
+
+    def apply_open(self, notional: float, leverage: str):
+        """Reserve margin for a position we just opened"""
+        margin = notional / float(leverage)
+        self.available -= margin
+        self.position_margin += margin
+
+    def apply_close(self, notional: float, leverage: str, realized_pnl: float = 0.0):
+        """Release margin for a position we just closed"""
+        margin = notional / float(leverage)
+        self.available += margin + realized_pnl
+        self.position_margin = max(0.0, self.position_margin - margin)
+        self.equity += realized_pnl
+
+    def target_notional(self, sizing: SizingConfig, entry_price: float,
+                        stop_loss: Optional[float] = None, leverage: str = "1") -> float:
+        """Position value in USDT for a new trade according to the sizing mode
+
+        Args:
+            sizing: Sizing configuration
+            entry_price: Signal entry price
+            stop_loss: Signal stop loss, used by the 'risk' mode
+            leverage: Leverage the position will be opened with
+        """
+        if sizing.mode == "fixed" or not self.seeded:
+            if sizing.mode != "fixed":
+                self.logger.warning(f"Balance not loaded, falling back to fixed size of {sizing.usdt_value} USDT")
+            return sizing.usdt_value
+
+        if sizing.mode == "percent_equity":
+            # Commit a share of equity as margin
+            notional = self.equity * sizing.equity_percent / 100 * float(leverage)
+        elif sizing.mode == "risk":
+            # Lose risk_percent of equity if the stop loss is hit
+            if not stop_loss or stop_loss == entry_price:
+                raise ValueError("Risk-based sizing needs a stop loss different from the entry")
+            risk_usdt = self.equity * sizing.risk_percent / 100
+            notional = risk_usdt / (abs(entry_price - stop_loss) / entry_price)
+        else:
+            raise ValueError(f"Unknown sizing mode: {sizing.mode}")
+
+        # Never ask for more margin than is available
+        return min(notional, self.available * float(leverage))
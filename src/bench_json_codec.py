@@ -0,0 +1,103 @@
+"""Benchmark the JSON work done for one signal with each codec backend
+
+Usage:
+    python bench_json_codec.py [--signals 2000]
+
+Replays the encode/sign, decode and log-formatting steps execute_trade
+goes through for a normal three-target trade, with reply payloads shaped
+like BitMart's.
+"""
+from json_codec import JsonCodec, orjson
+import argparse
+import hashlib
+import hmac
+import time
+
+CONTRACT = {
+    "symbol": "BTCUSDT", "product_type": 1, "open_timestamp": 1594080000123, "expire_timestamp": 0,
+    "settle_timestamp": 0, "base_currency": "BTC", "quote_currency": "USDT", "last_price": "63521.4",
+    "volume_24h": "21874312", "turnover_24h": "1389412841.53", "index_price": "63518.93",
+    "index_name": "BTCUSDT", "contract_size": "0.001", "min_leverage": "1", "max_leverage": "125",
+    "price_precision": "0.1", "vol_precision": "1", "max_volume": "500000", "min_volume": "1",
+    "funding_rate": "0.0001", "expected_funding_rate": "0.00011", "open_interest": "4134180",
+    "open_interest_value": "262604521.74", "high_24h": "64200.0", "low_24h": "62810.5",
+    "change_24h": "0.0123", "funding_interval_hours": 8,
+}
+
+def reply(data):
+    return {"code": 1000, "message": "Ok", "data": data, "trace": "b15f261868b540889e57f826e0420621.62.17183372389154631"}
+
+REPLIES = (
+    [reply({"symbols": [CONTRACT]})] * 4  # Sizing, contract size, min volume, last price
+    + [reply({"symbol": "BTCUSDT", "leverage": "20", "open_type": "cross", "max_value": "1000000"})]
+    + [reply({"order_id": 23348123456789, "price": "63521.4"})]
+    + [reply({"order_id": "220906179895578", "symbol": "BTCUSDT", "side": 1, "type": "market",
+              "leverage": "20", "open_type": "cross", "deal_avg_price": "63522.1", "deal_size": "15",
+              "price": "0", "state": 4, "size": "15", "create_time": 1662368173000, "update_time": 1662368173000})]
+    + [reply({"order_id": 23348123456790 + i}) for i in range(5)]  # Trail, three TPs, SL
+)
+
+BODIES = [
+    {"symbol": "BTCUSDT", "leverage": "20", "open_type": "cross"},
+    {"symbol": "BTCUSDT", "side": 1, "mode": 1, "type": "market", "leverage": "20", "open_type": "cross",
+     "size": 15, "client_order_id": "BOT_1718337238_1"},
+    {"symbol": "BTCUSDT", "side": 3, "leverage": "20", "open_type": "cross", "size": 15,
+     "activation_price": "64500.0", "callback_rate": "2", "activation_price_type": 1},
+] + [
+    {"symbol": "BTCUSDT", "side": 3, "leverage": "20", "open_type": "cross", "type": "take_profit",
+     "size": 5, "mode": 1, "trigger_price": price, "executive_price": price, "price_way": 1,
+     "price_type": 1, "client_order_id": f"BOT_1718337238_{i}"}
+    for i, price in enumerate(("64500.0", "65500.0", "66500.0"), 2)
+] + [
+    {"symbol": "BTCUSDT", "side": 3, "type": "stop_loss", "size": 15, "trigger_price": "61000.0",
+     "executive_price": "61000.0", "price_type": 1, "plan_category": 1,
+     "client_order_id": "BOT_1718337238_5", "category": "market"},
+]
+
+SIGNAL = {
+    "symbol": "BTCUSDT", "side": 1, "leverage": "20", "size": 1, "entry_price": 63500.0,
+    "entry_zone": [63500.0, 63800.0], "take_profits": [64500.0, 65500.0, 66500.0],
+    "stop_loss": 61000.0, "is_short": False, "message_id": 48213,
+}
+
+def one_signal(codec: JsonCodec, encoded_replies, secret: bytes):
+    # Request bodies: encode once, sign, send
+    for body in BODIES:
+        body_str = codec.dumps(body)
+        hmac.new(secret, f"1718337238000#memo#{body_str}".encode('utf-8'), hashlib.sha256).hexdigest()
+    # Replies
+    decoded = [codec.loads(raw) for raw in encoded_replies]
+    # Logged signal and results
+    codec.dumps_pretty(SIGNAL)
+    for result in decoded[4:]:
+        codec.dumps_pretty(result)
+
+def bench(codec: JsonCodec, signals: int) -> float:
+    """Seconds per signal"""
+    encoded_replies = [codec.dumpb(r) for r in REPLIES]
+    secret = b"0" * 64
+    for _ in range(min(200, signals)):
+        one_signal(codec, encoded_replies, secret)
+    started = time.perf_counter()
+    for _ in range(signals):
+        one_signal(codec, encoded_replies, secret)
+    return (time.perf_counter() - started) / signals
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON codec backends on one signal's JSON work")
+    parser.add_argument('--signals', type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {'json': bench(JsonCodec('json'), args.signals)}
+    if orjson:
+        results['orjson'] = bench(JsonCodec('orjson'), args.signals)
+    for backend, seconds in results.items():
+        print(f"{backend:>7}: {seconds * 1e6:8.1f} us per signal")
+    if 'orjson' in results:
+        saved = results['json'] - results['orjson']
+        print(f"  saved: {saved * 1e6:8.1f} us per signal ({saved / results['json'] * 100:.0f}%)")
+    else:
+        print("orjson is not installed, only the stdlib backend was measured")
+
+if __name__ == "__main__":
+    main()
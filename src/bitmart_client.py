@@ -2,27 +2,171 @@ import hmac
 import hashlib
 import time
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 from config import BitmartConfig
+from metrics import metrics
+from json_codec import dumps, loads, pretty
 import logging
+import re
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Request limits per endpoint as (requests, window in seconds), following
+# BitMart's published futures limits
+RATE_LIMITS = {
+    "/system/time": (10, 1),
+    "/contract/public/details": (12, 2),
+    "/contract/public/kline": (12, 2),
+    "/contract/private/submit-order": (24, 2),
+    "/contract/private/submit-leverage": (24, 2),
+    "/contract/private/submit-plan-order": (24, 2),
+    "/contract/private/submit-tp-sl-order": (24, 2),
+    "/contract/private/submit-trail-order": (24, 2),
+    "/contract/private/modify-tp-sl-order": (24, 2),
+    "/contract/private/modify-plan-order": (24, 2),
+    "/contract/private/cancel-order": (40, 2),
+    "/contract/private/cancel-orders": (2, 2),
+    "/contract/private/cancel-plan-order": (40, 2),
+    "/contract/private/cancel-trail-order": (40, 2),
+    "/contract/private/order": (50, 2),
+    "/contract/private/position": (6, 2),
+    "/contract/private/assets-detail": (12, 2),
+    "/contract/private/get-open-orders": (50, 2),
+    "/contract/private/current-plan-order": (50, 2),
+    "/contract/private/trades": (6, 2),
+}
+DEFAULT_RATE_LIMIT = (10, 1)
+
+# Prefix of generated client order ids. Set per trade, so the fills of its
+# entry and bracket orders can be told apart from other trades' fills; the
+# value is copied into tasks and asyncio.to_thread calls started under it.
+order_tag: ContextVar[str] = ContextVar('order_tag', default='BOT')
+
+TAG_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+TRADE_TAG = re.compile(r'^([NS])([0-9A-Z]+)x([0-9A-Z]+)$')
+
+def _base36(n: int) -> str:
+    text = ""
+    while True:
+        n, digit = divmod(n, 36)
+        text = TAG_DIGITS[digit] + text
+        if not n:
+            return text
+
+def trade_tag(channel_id: int, message_id: int) -> str:
+    """Client order id prefix for the orders of one signal, at most 15 characters"""
+    return f"{'N' if channel_id < 0 else 'S'}{_base36(abs(channel_id))}x{_base36(message_id)}"
+
+def parse_trade_tag(client_order_id: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(channel id, message id) of a client order id with a trade tag, else None"""
+    match = TRADE_TAG.match((client_order_id or "").split('_', 1)[0])
+    if not match:
+        return None
+    sign = -1 if match.group(1) == 'N' else 1
+    return sign * int(match.group(2), 36), int(match.group(3), 36)
+
+def is_bot_order(client_order_id: Optional[str]) -> bool:
+    """Whether an order was placed by the bot, tagged for a trade or not"""
+    prefix = (client_order_id or "").split('_', 1)[0]
+    return prefix == 'BOT' or TRADE_TAG.match(prefix) is not None
+
+@contextmanager
+def tagged_orders(tag: str):
+    """Tag the client order ids of orders submitted in this block"""
+    token = order_tag.set(tag)
+    try:
+        yield
+    finally:
+        order_tag.reset(token)
+
+_connects = threading.local()  # Connections set up by this thread so far, see ConnectionCountingAdapter
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _connects.count = getattr(_connects, 'count', 0) + 1
+        super().connect()
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _connects.count = getattr(_connects, 'count', 0) + 1
+        super().connect()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+class ConnectionCountingAdapter(HTTPAdapter):
+    """HTTPAdapter that counts every connect, per thread
+
+    urllib3 reopens a pooled connection the server dropped on the same
+    connection object, so the pool's connection count doesn't move; counting
+    connect() calls catches those reconnects as well as new connections.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _CountingHTTPConnectionPool,
+                                                   'https': _CountingHTTPSConnectionPool}
+
+    @staticmethod
+    def connects() -> int:
+        """Connections set up by the calling thread so far"""
+        return getattr(_connects, 'count', 0)
+
+class RateLimiter:
+    """Thread-safe token bucket per endpoint"""
+
+    def __init__(self, limits: dict = None, default: tuple = DEFAULT_RATE_LIMIT):
+        self.limits = limits if limits is not None else RATE_LIMITS
+        self.default = default
+        self._buckets = {}  # endpoint -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: str):
+        """Block until a request to the endpoint is allowed"""
+        capacity, window = self.limits.get(endpoint, self.default)
+        rate = capacity / window
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(endpoint, (capacity, now))
+                tokens = min(capacity, tokens + (now - last) * rate)
+                if tokens >= 1:
+                    self._buckets[endpoint] = (tokens - 1, now)
+                    return
+                self._buckets[endpoint] = (tokens, now)
+                wait = (1 - tokens) / rate
+            metrics.inc('bitmart_rate_limited_total', endpoint=endpoint)
+            time.sleep(wait)
+
 class BitmartClient:
     BASE_URL = "https://api-cloud-v2.bitmart.com"
 
     def __init__(self, config: BitmartConfig):
         self.config = config
         self.session = requests.Session()
+        self.session.mount(self.BASE_URL, ConnectionCountingAdapter())
         self._order_counter = 0  # Add counter for unique order IDs
         self._tick_sizes = {}  # Cache for tick sizes
+        self.rate_limiter = RateLimiter()
+        self.time_offset = 0.0  # Server time minus local time, in seconds
+        self.rtt = None  # Round trip of the best calibration sample, in seconds
         self.logger = logging.getLogger(__name__)  # Add logger initialization
         
-    def _generate_signature(self, timestamp: str, body: dict = None) -> str:
-        """Generate signature for BitMart API authentication"""
-        body_str = json.dumps(body) if body else ''
+    def _generate_signature(self, timestamp: str, body_str: str = '') -> str:
+        """Generate signature for BitMart API authentication
+        
+        body_str must be the exact request body that is sent.
+        """
         message = f"{timestamp}#{self.config.memo}#{body_str}"
         signature = hmac.new(
             self.config.api_secret.encode('utf-8'),
@@ -31,46 +175,148 @@ class BitmartClient:
         ).hexdigest()
         return signature
 
-    def _get_headers(self, body: dict = None) -> dict:
+    def _timestamp(self) -> str:
+        """Current BitMart server time in milliseconds, corrected by the calibrated offset"""
+        return str(int((time.time() + self.time_offset) * 1000))
+
+    def calibrate_time(self, samples: int = 5) -> float:
+        """Measure the offset between local and BitMart server time
+        
+        Takes several samples of the system-time endpoint and keeps the one
+        with the shortest round trip, assuming the server stamped its reply
+        halfway through it (as NTP does).
+        
+        Returns:
+            Offset in seconds to add to local time
+        """
+        endpoint = "/system/time"
+        best = None
+        for _ in range(samples):
+            sent = time.time()
+            response = self._request('GET', endpoint, signed=False)
+            received = time.time()
+            
+            result = self._decode(response)
+            if result.get('code') != 1000:
+                self.logger.warning(f"Bad system time response: {result}")
+                continue
+                
+            rtt = received - sent
+            offset = result['data']['server_time'] / 1000 - (sent + received) / 2
+            if best is None or rtt < best[0]:
+                best = (rtt, offset)
+                
+        if best is None:
+            raise ValueError("Could not get BitMart server time")
+            
+        self.rtt, self.time_offset = best
+        metrics.set_gauge('bitmart_time_offset_seconds', self.time_offset)
+        metrics.set_gauge('bitmart_rtt_seconds', self.rtt)
+        self.logger.info(f"Server time offset: {self.time_offset * 1000:.1f} ms, RTT: {self.rtt * 1000:.1f} ms")
+        return self.time_offset
+
+    def _get_headers(self, body_str: str = '') -> dict:
         """Generate headers for BitMart API requests"""
-        timestamp = str(int(time.time() * 1000))
+        timestamp = self._timestamp()
         return {
             'Content-Type': 'application/json',
             'X-BM-KEY': self.config.api_key,
             'X-BM-TIMESTAMP': timestamp,
-            'X-BM-SIGN': self._generate_signature(timestamp, body)
+            'X-BM-SIGN': self._generate_signature(timestamp, body_str)
         }
 
+    def _request(self, method: str, endpoint: str, params: dict = None,
+                 body: dict = None, signed: bool = True) -> requests.Response:
+        """Send a request and record its latency, split by cold and warm connections"""
+        self.rate_limiter.acquire(endpoint)
+        # Encode once so the signed string is exactly the body sent
+        body_str = dumps(body) if body else ''
+        if signed:
+            headers = self._get_headers(body_str)
+        elif body_str:
+            headers = {'Content-Type': 'application/json'}
+        else:
+            headers = None
+        connects_before = ConnectionCountingAdapter.connects()
+        
+        started = time.perf_counter()
+        response = self.session.request(
+            method,
+            f"{self.BASE_URL}{endpoint}",
+            headers=headers,
+            params=params,
+            data=body_str.encode('utf-8') if body_str else None
+        )
+        elapsed = time.perf_counter() - started
+        
+        # A connect on this thread means the request paid DNS, TCP and TLS setup,
+        # whether on a new connection or reopening one the server dropped
+        conn = 'cold' if ConnectionCountingAdapter.connects() > connects_before else 'warm'
+        metrics.observe('bitmart_request_seconds', elapsed, endpoint=endpoint, conn=conn)
+        return response
+
+    @staticmethod
+    def _decode(response: requests.Response) -> dict:
+        return loads(response.content)
+
     def _generate_order_id(self) -> str:
         """Generate unique client order ID"""
         self._order_counter += 1
-        return f"BOT_{int(time.time())}_{self._order_counter}"
+        return f"{order_tag.get()}_{int(time.time())}_{self._order_counter}"
 
     def get_contract_details(self, symbol: Optional[str] = None) -> dict:
         """Get contract details for a symbol or all symbols"""
         endpoint = "/contract/public/details"
         params = {'symbol': symbol} if symbol else None
-        response = self.session.get(f"{self.BASE_URL}{endpoint}", params=params)
-        return response.json()
+        response = self._request('GET', endpoint, params=params, signed=False)
+        return self._decode(response)
+
+    def get_kline(self, symbol: str, step: int, start_time: int, end_time: int) -> dict:
+        """Get futures klines
+        
+        Args:
+            symbol: Trading pair
+            step: Candle interval in minutes
+            start_time: Start of the range, unix seconds
+            end_time: End of the range, unix seconds
+        """
+        endpoint = "/contract/public/kline"
+        params = {
+            'symbol': symbol,
+            'step': step,
+            'start_time': start_time,
+            'end_time': end_time
+        }
+        response = self._request('GET', endpoint, params=params, signed=False)
+        return self._decode(response)
 
     def submit_order(self, symbol: str, side: int, size: int, 
                     leverage: str, open_type: str,
                     preset_take_profit_price: str = None,
                     preset_stop_loss_price: str = None,
                     preset_take_profit_price_type: int = None,
-                    preset_stop_loss_price_type: int = None) -> dict:
-        """Submit a futures order"""
+                    preset_stop_loss_price_type: int = None,
+                    order_type: str = "market",
+                    price: str = None) -> dict:
+        """Submit a futures order
+        
+        Args:
+            order_type: 'market' or 'limit'
+            price: Limit price, required for limit orders
+        """
         endpoint = "/contract/private/submit-order"
         body = {
             "symbol": symbol,
             "side": side,
-            "mode": 1,
-            "type": "market",
+            "mode": 1,  # GTC
+            "type": order_type,
             "leverage": leverage, 
             "open_type": open_type,
             "size": size,
             "client_order_id": self._generate_order_id()
         }
+        if order_type == "limit":
+            body["price"] = self._format_price(symbol, price)
         
         # Add preset TP/SL if provided
         if preset_take_profit_price:
@@ -80,36 +326,98 @@ class BitmartClient:
             body["preset_stop_loss_price"] = preset_stop_loss_price
             body["preset_stop_loss_price_type"] = preset_stop_loss_price_type
         
-        response = self.session.post(
-            f"{self.BASE_URL}{endpoint}",
-            headers=self._get_headers(body),
-            json=body
-        )
-        return response.json()
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
+
+    def get_order(self, symbol: str, order_id: str) -> dict:
+        """Get an order's state and fills (deal_size, deal_avg_price)"""
+        endpoint = "/contract/private/order"
+        params = {'symbol': symbol, 'order_id': order_id}
+        response = self._request('GET', endpoint, params=params)
+        return self._decode(response)
+
+    def cancel_order(self, symbol: str, order_id: str) -> dict:
+        """Cancel an open order"""
+        endpoint = "/contract/private/cancel-order"
+        body = {'symbol': symbol, 'order_id': order_id}
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
+
+    def cancel_orders(self, symbol: str) -> dict:
+        """Cancel all open orders for a symbol"""
+        endpoint = "/contract/private/cancel-orders"
+        body = {'symbol': symbol}
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
+
+    def cancel_plan_order(self, symbol: str, order_id: str) -> dict:
+        """Cancel a plan or TP/SL order"""
+        endpoint = "/contract/private/cancel-plan-order"
+        body = {'symbol': symbol, 'order_id': order_id}
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
+
+    def cancel_trail_order(self, symbol: str, order_id: str) -> dict:
+        """Cancel a trailing stop order"""
+        endpoint = "/contract/private/cancel-trail-order"
+        body = {'symbol': symbol, 'order_id': order_id}
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
 
     def get_position(self, symbol: Optional[str] = None) -> dict:
         """Get current position details"""
         endpoint = "/contract/private/position"
         params = {'symbol': symbol} if symbol else None
-        response = self.session.get(
-            f"{self.BASE_URL}{endpoint}",
-            headers=self._get_headers(),
-            params=params
-        )
-        return response.json()
+        response = self._request('GET', endpoint, params=params)
+        return self._decode(response)
+
+    def get_open_orders(self, symbol: Optional[str] = None) -> dict:
+        """Get open (unfilled) orders for a symbol or all symbols"""
+        endpoint = "/contract/private/get-open-orders"
+        params = {'symbol': symbol} if symbol else None
+        response = self._request('GET', endpoint, params=params)
+        return self._decode(response)
+
+    def get_trades(self, symbol: str, start_time: Optional[int] = None, end_time: Optional[int] = None) -> dict:
+        """Get the account's fills for a symbol (price, vol, paid_fees, realised_profit)
+
+        Args:
+            start_time: Start of the range, unix seconds
+            end_time: End of the range, unix seconds
+        """
+        endpoint = "/contract/private/trades"
+        params = {'symbol': symbol}
+        if start_time is not None:
+            params['start_time'] = start_time
+        if end_time is not None:
+            params['end_time'] = end_time
+        response = self._request('GET', endpoint, params=params)
+        return self._decode(response)
+
+    def get_plan_orders(self, symbol: Optional[str] = None, plan_type: Optional[str] = None) -> dict:
+        """Get current plan orders
+        
+        Args:
+            symbol: Trading pair, or None for all symbols
+            plan_type: 'plan' for plan orders, 'profit_loss' for TP/SL orders
+        """
+        endpoint = "/contract/private/current-plan-order"
+        params = {}
+        if symbol:
+            params['symbol'] = symbol
+        if plan_type:
+            params['plan_type'] = plan_type
+        response = self._request('GET', endpoint, params=params or None)
+        return self._decode(response)
 
     def get_contract_assets(self) -> dict:
         """Get futures account balance"""
         endpoint = "/contract/private/assets-detail"
-        headers = self._get_headers()
-        logger.debug(f"Making request to {self.BASE_URL}{endpoint} with headers: {headers}")
-        response = self.session.get(
-            f"{self.BASE_URL}{endpoint}",
-            headers=headers
-        )
+        logger.debug(f"Making request to {self.BASE_URL}{endpoint}")
+        response = self._request('GET', endpoint)
         logger.debug(f"Response status: {response.status_code}")
         logger.debug(f"Response content: {response.text}")
-        return response.json()
+        return self._decode(response)
 
     def submit_leverage(self, symbol: str, leverage: str, open_type: str) -> dict:
         """Set leverage for a symbol"""
@@ -119,12 +427,8 @@ class BitmartClient:
             "leverage": leverage,
             "open_type": open_type
         }
-        response = self.session.post(
-            f"{self.BASE_URL}{endpoint}",
-            headers=self._get_headers(body),
-            json=body
-        )
-        return response.json() 
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response) 
 
     def submit_plan_order(self, symbol: str, side: int, size: int,
                          leverage: str, open_type: str, trigger_price: str,
@@ -164,14 +468,10 @@ class BitmartClient:
             "client_order_id": self._generate_order_id()
         }
             
-        logger.info(f"Submitting plan order with body: {json.dumps(body, indent=2)}")
+        logger.info("Submitting plan order with body: %s", pretty(body))
         
-        response = self.session.post(
-            f"{self.BASE_URL}{endpoint}",
-            headers=self._get_headers(body),
-            json=body
-        )
-        return response.json()
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
 
     def _get_tick_size(self, symbol: str) -> float:
         """Get tick size for a symbol from contract details"""
@@ -245,14 +545,67 @@ class BitmartClient:
             "category": "market"  # Always use market for stop loss
         }
             
-        logger.info(f"Submitting TP/SL order with body: {json.dumps(body, indent=2)}")
+        logger.info("Submitting TP/SL order with body: %s", pretty(body))
         
-        response = self.session.post(
-            f"{self.BASE_URL}{endpoint}",
-            headers=self._get_headers(body),
-            json=body
-        )
-        return response.json()
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
+
+    def modify_tp_sl_order(self, symbol: str, order_id: str, trigger_price: str,
+                           price_type: int = 1, plan_category: int = 1) -> dict:
+        """Move the trigger price of an existing TP/SL order
+        
+        Args:
+            symbol: Trading pair
+            order_id: Order ID returned by submit_tp_sl_order
+            trigger_price: New trigger price
+            price_type: 1=last_price, 2=fair_price
+            plan_category: 1=TP/SL, 2=Position TP/SL
+        """
+        endpoint = "/contract/private/modify-tp-sl-order"
+        formatted_price = self._format_price(symbol, trigger_price)
+        body = {
+            "symbol": symbol,
+            "order_id": order_id,
+            "trigger_price": formatted_price,
+            "executive_price": formatted_price,
+            "price_type": price_type,
+            "plan_category": plan_category,
+            "category": "market"
+        }
+        
+        logger.info("Modifying TP/SL order with body: %s", pretty(body))
+        
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
+
+    def modify_plan_order(self, symbol: str, order_id: str, trigger_price: str,
+                          order_type: str = 'market', execute_price: str = None,
+                          price_type: int = 1) -> dict:
+        """Move the trigger (and execution) price of an existing plan order
+
+        Args:
+            symbol: Trading pair
+            order_id: Order ID returned by submit_plan_order
+            trigger_price: New trigger price
+            order_type: 'limit' or 'market'
+            execute_price: New execution price for limit orders
+            price_type: 1=last_price, 2=fair_price
+        """
+        endpoint = "/contract/private/modify-plan-order"
+        formatted_trigger = self._format_price(symbol, trigger_price)
+        body = {
+            "symbol": symbol,
+            "order_id": order_id,
+            "trigger_price": formatted_trigger,
+            "executive_price": self._format_price(symbol, execute_price) if execute_price else formatted_trigger,
+            "price_type": price_type,
+            "type": order_type
+        }
+
+        logger.info("Modifying plan order with body: %s", pretty(body))
+
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
 
     def submit_trail_order(self, symbol: str, side: int, size: int,
                           leverage: str, open_type: str, activation_price: str,
@@ -285,40 +638,36 @@ class BitmartClient:
             "activation_price_type": activation_price_type
         }
             
-        logger.info(f"Submitting trail order with body: {json.dumps(body, indent=2)}")
+        logger.info("Submitting trail order with body: %s", pretty(body))
         
-        response = self.session.post(
-            f"{self.BASE_URL}{endpoint}",
-            headers=self._get_headers(body),
-            json=body
-        )
-        return response.json()
+        response = self._request('POST', endpoint, body=body)
+        return self._decode(response)
 
-    def calculate_position_size(self, symbol: str, entry_price: float, usdt_value: float = 15.0) -> int:
+    def get_contract(self, symbol: str) -> dict:
+        """Contract details of one symbol (contract_size, min_volume, last_price, ...)"""
+        details = self.get_contract_details(symbol)
+        if details.get('code') != 1000:
+            raise ValueError(f"Could not get contract details for {symbol}")
+        for contract in details.get('data', {}).get('symbols', []):
+            if contract['symbol'] == symbol:
+                return contract
+        raise ValueError(f"Could not find contract details for {symbol}")
+
+    def calculate_position_size(self, symbol: str, entry_price: float, usdt_value: float = 15.0,
+                                contract: Optional[dict] = None) -> int:
         """Calculate position size in contracts for desired USDT value
         
         Args:
             symbol: Trading pair
             entry_price: Current price
             usdt_value: Desired position value in USDT (default 15)
+            contract: Details from get_contract, fetched if not given
             
         Returns:
             Position size in contracts (rounded up to min_volume)
         """
         try:
-            details = self.get_contract_details(symbol)
-            if details.get('code') != 1000:
-                raise ValueError(f"Could not get contract details for {symbol}")
-            
-            # Find symbol details
-            symbol_data = None
-            for contract in details.get('data', {}).get('symbols', []):
-                if contract['symbol'] == symbol:
-                    symbol_data = contract
-                    break
-                    
-            if not symbol_data:
-                raise ValueError(f"Could not find contract details for {symbol}")
+            symbol_data = contract or self.get_contract(symbol)
             
             # Get contract specifications
             contract_size = float(symbol_data['contract_size'])
@@ -0,0 +1,141 @@
+from bitmart_client import BitmartClient
+from metrics import metrics
+from models import Trade
+from json_codec import pretty
+from dataclasses import dataclass
+from typing import List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LegChange:
+    """One bracket leg whose price differs from an edited signal"""
+    leg: str  # Bracket name: 'stop_loss', 'tp1'..'tpN' or 'trail'
+    old_price: float
+    new_price: Optional[float]  # None cancels the leg
+
+def same_price(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+def plan_changes(trade: Trade, signal: dict, trail_target: int) -> List[LegChange]:
+    """Diff an edited signal against the brackets placed for its trade
+
+    Only legs that exist are compared: a target added by the edit gets no
+    order, since the position size was already split over the original
+    targets, while a target removed by the edit cancels its leg.
+    """
+    changes = []
+    stop_loss = trade.brackets.get('stop_loss')
+    posted = trade.signal_stop_loss or (stop_loss or {}).get('price')
+    if stop_loss and not same_price(posted, float(signal['stop_loss'])):
+        stop = float(signal['stop_loss'])
+        if not same_price(stop_loss['price'], posted):
+            # The stop has trailed since it was posted; the edit may tighten it but not loosen it
+            stop = min(stop, stop_loss['price']) if trade.is_short else max(stop, stop_loss['price'])
+        if not same_price(stop, stop_loss['price']):
+            changes.append(LegChange('stop_loss', stop_loss['price'], stop))
+
+    targets = [float(price) for price in signal['take_profits']]
+    for leg, bracket in trade.brackets.items():
+        if not leg.startswith('tp'):
+            continue
+        index = int(leg[2:]) - 1
+        new_price = targets[index] if index < len(targets) else None
+        if new_price is None or not same_price(bracket['price'], new_price):
+            changes.append(LegChange(leg, bracket['price'], new_price))
+
+    trail = trade.brackets.get('trail')
+    if trail and targets:
+        activation = targets[min(trail_target, len(targets)) - 1]
+        if not same_price(trail['price'], activation):
+            changes.append(LegChange('trail', trail['price'], activation))
+    return changes
+
+class BracketAmender:
+    """Apply leg changes to the orders on the exchange without touching the position
+
+    A leg is amended in place where BitMart allows it (TP/SL and plan
+    orders) and cancelled and re-placed otherwise (trail orders, or an amend
+    the exchange refused). Legs are independent, so they are sent
+    concurrently.
+    """
+
+    def __init__(self, bitmart: BitmartClient):
+        self.bitmart = bitmart
+        self.logger = logging.getLogger(__name__)
+
+    async def apply(self, trade: Trade, changes: List[LegChange], callback_rate: float) -> List[tuple]:
+        """Returns (leg, action) per change, action one of modified/replaced/cancelled/failed"""
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._apply_leg, trade, change, callback_rate) for change in changes),
+            return_exceptions=True
+        )
+        outcome = []
+        for change, result in zip(changes, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error amending {change.leg} for {trade.symbol}: {result}")
+                result = 'failed'
+            metrics.inc('signal_amendments_total', leg=change.leg.rstrip('0123456789'), action=result)
+            outcome.append((change.leg, result))
+        return outcome
+
+    def _apply_leg(self, trade: Trade, change: LegChange, callback_rate: float) -> str:
+        bracket = trade.brackets[change.leg]
+        order_id = bracket.get('order_id')
+        price = None if change.new_price is None else str(change.new_price)
+
+        if change.new_price is None:
+            result = self.bitmart.cancel_plan_order(trade.symbol, order_id)
+            self.logger.info(f"Cancel {change.leg} result: %s", pretty(result))
+            if result.get('code') != 1000:
+                return 'failed'
+            del trade.brackets[change.leg]
+            return 'cancelled'
+
+        if change.leg == 'stop_loss':
+            result = self.bitmart.modify_tp_sl_order(trade.symbol, order_id, price)
+        elif change.leg.startswith('tp'):
+            result = self.bitmart.modify_plan_order(trade.symbol, order_id, price)
+        else:
+            result = None  # Trail orders can't be amended
+        if result is not None:
+            self.logger.info(f"Amend {change.leg} result: %s", pretty(result))
+        if result is not None and result.get('code') == 1000:
+            bracket['price'] = change.new_price
+            return 'modified'
+
+        # Replace: cancel first so the leg is never doubled
+        if change.leg == 'trail':
+            cancel = self.bitmart.cancel_trail_order(trade.symbol, order_id)
+        else:
+            cancel = self.bitmart.cancel_plan_order(trade.symbol, order_id)
+        if cancel.get('code') != 1000:
+            self.logger.error(f"Could not cancel {change.leg} for {trade.symbol} to replace it: {cancel}")
+            return 'failed'
+
+        if change.leg == 'stop_loss':
+            result = self.bitmart.submit_tp_sl_order(
+                symbol=trade.symbol, side=trade.close_side, type="stop_loss", size=bracket['size'],
+                trigger_price=price, price_type=1, plan_category=1
+            )
+        elif change.leg == 'trail':
+            result = self.bitmart.submit_trail_order(
+                symbol=trade.symbol, side=trade.close_side, size=bracket['size'], leverage=trade.leverage,
+                open_type='cross', activation_price=price, callback_rate=f"{callback_rate:g}",
+                activation_price_type=1
+            )
+        else:
+            result = self.bitmart.submit_plan_order(
+                symbol=trade.symbol, side=trade.close_side, size=bracket['size'], leverage=trade.leverage,
+                open_type='cross', trigger_price=price, order_type='market',
+                price_way=2 if trade.is_short else 1
+            )
+        self.logger.info(f"Replace {change.leg} result: %s", pretty(result))
+        if result.get('code') != 1000:
+            # The leg is gone; the reconciler re-places a missing stop loss
+            del trade.brackets[change.leg]
+            return 'failed'
+        bracket.update(order_id=result.get('data', {}).get('order_id'), price=change.new_price)
+        return 'replaced'
@@ -1,19 +1,220 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+import hashlib
+import json
 
 @dataclass
 class TelegramConfig:
     api_id: str
     api_hash: str
     phone: str
-    channel_username: str
+    channel_username: str  # Channel id, or several comma-separated
+    sessions: List[str] = field(default_factory=lambda: ['signal_monitor_session'])  # Listened to in parallel
 
 @dataclass
 class BitmartConfig:
     api_key: str
     api_secret: str
     memo: str  # Bitmart requires memo for authentication
+    time_sync_interval: float = 300.0  # Seconds between server time calibrations
+    time_sync_samples: int = 5
+
+@dataclass
+class ConnectionConfig:
+    warm_connections: int = 2  # Connections kept open to the API host
+    heartbeat_interval: float = 15.0  # Seconds between heartbeats, below the server idle timeout
+    retry_interval: float = 1.0  # Seconds before retrying a failed heartbeat
+    dns_ttl: float = 300.0
+
+@dataclass
+class DiagnosticsConfig:
+    enabled: bool = False  # Can also be toggled at runtime with SIGUSR1
+    stall_threshold: float = 0.1  # Report loop stalls longer than this, in seconds
+    heartbeat_interval: float = 0.05
+    profile_trades: bool = True  # cProfile each execute_trade while enabled
+    profile_dir: str = "profiles"
+    profile_keep: int = 50
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = False
+    host: str = "127.0.0.1"
+    port: int = 9108
+
+@dataclass
+class IngestConfig:
+    raw_queue_size: int = 100  # Messages waiting to be parsed
+    execution_queue_size: int = 20  # Signals and cancellations waiting to be executed
+    overflow: str = "drop_oldest"  # When full: 'drop_oldest' or 'reject' (with an alert)
+    workers: int = 1  # Concurrent executions
+    dedup_window: int = 1000  # Recent message ids remembered to drop copies from other sessions
+
+@dataclass
+class BridgeConfig:
+    role: str = "single"  # 'single', or 'ingest' / 'execute' to split Telegram and orders into two processes
+    socket_path: str = "data/signal_bridge.sock"  # Unix socket between the two processes
+    backlog: int = 20  # Records the ingest process holds while the execution process is down
+
+@dataclass
+class KillSwitchConfig:
+    concurrency: int = 8  # Cancels and closes in flight at once
+    retries: int = 2  # Retries of a failed request, with doubling delay
+    retry_delay: float = 0.2  # Seconds before the first retry
+    rounds: int = 3  # Cancel/close rounds before giving up on reaching flat
+    execution_wait: float = 10.0  # Seconds to wait for executions in flight to stop before flattening
+    admin_socket: str = "data/admin.sock"  # Unix socket taking 'flatten', 'halt', 'resume' and 'status'; "" disables
+    telegram_command: str = "/flatten"  # Sent to telegram_chat to flatten; "" disables
+    telegram_chat: str = "me"  # Chat the command is accepted from, Saved Messages by default
+
+@dataclass
+class ReconcileConfig:
+    tight_interval: float = 5.0  # Seconds between passes while brackets are pending
+    idle_interval: float = 30.0  # Seconds between passes when nothing is pending
+    close_orphans: bool = False  # Close exchange positions we have no record of, if they carry the bot's order tag
+
+@dataclass
+class SizingConfig:
+    mode: str = "fixed"  # 'fixed', 'percent_equity' or 'risk'
+    usdt_value: float = 15.0  # Position value for 'fixed' mode
+    equity_percent: float = 1.0  # Share of equity committed as margin in 'percent_equity' mode
+    risk_percent: float = 0.5  # Share of equity lost at the stop loss in 'risk' mode
+    max_leverage: int = 0  # Cap on the signal's leverage (0 = no cap)
+
+@dataclass
+class ExitConfig:
+    callback_rate: float = 2.0  # Trailing stop callback, percent
+    trail_activation_target: int = 1  # Target (1-based) at which the trailing stop activates
+    large_value_ratio: float = 1.0  # Single TP when the actual value exceeds the target value by this ratio
+    client_trailing: bool = False  # Trail the stop loss in-process instead of with a trail order
+    breakeven_after_tp: int = 1  # Client trailing: stop to entry once this many targets are hit (0 = never)
+    tighten_per_tp: float = 0.0  # Client trailing: points taken off the callback rate per further target
+    min_trail_percent: float = 0.5  # Client trailing: floor for the tightened callback rate
+
+@dataclass
+class EntryConfig:
+    mode: str = "market"  # 'market' or 'ladder' (limit orders across the entry zone)
+    rungs: int = 3  # Ladder orders, fewer if the size doesn't allow min_volume per rung
+    timeout: float = 30.0  # Seconds to wait for the ladder to fill
+    on_timeout: str = "market"  # Unfilled remainder: 'market' to fill it, 'cancel' to drop it
+    poll_interval: float = 1.0
+
+@dataclass
+class RiskConfig:
+    """Pre-trade limits; 0 disables a limit"""
+    max_positions: int = 0
+    max_total_notional: float = 0.0  # USDT across all positions
+    max_symbol_notional: float = 0.0  # USDT per symbol
+    max_side_notional: float = 0.0  # USDT per side (all longs, all shorts)
+    max_channel_notional: float = 0.0  # USDT opened from one signal channel
+    max_margin_percent: float = 0.0  # Margin in use as a share of equity
+    max_symbol_leverage: Dict[str, int] = field(default_factory=dict)  # Symbol -> highest accepted leverage
+    correlation_groups: Dict[str, str] = field(default_factory=dict)  # Symbol -> group, e.g. 'BTCUSDT': 'majors'
+    max_group_notional: float = 0.0  # USDT per correlation group and side
+
+@dataclass
+class TradingConfig:
+    """Parameters that can change at runtime, see runtime_config.py"""
+    sizing: SizingConfig = field(default_factory=SizingConfig)
+    exits: ExitConfig = field(default_factory=ExitConfig)
+    entry: EntryConfig = field(default_factory=EntryConfig)
+    risk: RiskConfig = field(default_factory=RiskConfig)
+    signal_timeout: float = 60.0  # Ignore duplicate signals for this many seconds
+    order_spacing: float = 1.0  # Seconds between a trade's bracket orders
+    version: str = "default"  # Content hash of the file it was loaded from
+
+def load_trading_config(path: str) -> TradingConfig:
+    """Load and validate trading parameters from a JSON file, e.g. one written by param_sweep.py"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    data.pop('version', None)
+    trading = TradingConfig(
+        sizing=SizingConfig(**data.pop('sizing', {})),
+        exits=ExitConfig(**data.pop('exits', {})),
+        entry=EntryConfig(**data.pop('entry', {})),
+        risk=RiskConfig(**data.pop('risk', {})),
+        version=hashlib.sha256(raw).hexdigest()[:12],
+        **data
+    )
+    validate_trading_config(trading)
+    return trading
+
+def validate_trading_config(trading: TradingConfig):
+    """Raise ValueError listing every invalid parameter"""
+    errors = []
+    sizing, exits, entry = trading.sizing, trading.exits, trading.entry
+    if sizing.mode not in ("fixed", "percent_equity", "risk"):
+        errors.append(f"sizing.mode: unknown mode {sizing.mode!r}")
+    for name in ("usdt_value", "equity_percent", "risk_percent"):
+        if getattr(sizing, name) <= 0:
+            errors.append(f"sizing.{name}: must be positive")
+    if sizing.max_leverage < 0:
+        errors.append("sizing.max_leverage: must be 0 (no cap) or positive")
+    # BitMart accepts trailing callback rates from 0.1 to 5 percent
+    if not 0.1 <= exits.callback_rate <= 5:
+        errors.append("exits.callback_rate: must be between 0.1 and 5")
+    if exits.trail_activation_target < 1:
+        errors.append("exits.trail_activation_target: must be at least 1")
+    if exits.large_value_ratio <= 0:
+        errors.append("exits.large_value_ratio: must be positive")
+    if exits.min_trail_percent <= 0 or exits.tighten_per_tp < 0:
+        errors.append("exits: min_trail_percent must be positive and tighten_per_tp not negative")
+    if entry.mode not in ("market", "ladder"):
+        errors.append(f"entry.mode: unknown mode {entry.mode!r}")
+    if entry.on_timeout not in ("market", "cancel"):
+        errors.append(f"entry.on_timeout: unknown action {entry.on_timeout!r}")
+    if entry.rungs < 1 or entry.timeout <= 0 or entry.poll_interval <= 0:
+        errors.append("entry: rungs, timeout and poll_interval must be positive")
+    risk = trading.risk
+    for name in ("max_positions", "max_total_notional", "max_symbol_notional", "max_side_notional",
+                 "max_channel_notional", "max_margin_percent", "max_group_notional"):
+        if getattr(risk, name) < 0:
+            errors.append(f"risk.{name}: must be 0 (no limit) or positive")
+    if any(leverage < 1 for leverage in risk.max_symbol_leverage.values()):
+        errors.append("risk.max_symbol_leverage: leverage caps must be at least 1")
+    if trading.signal_timeout < 0 or trading.order_spacing < 0:
+        errors.append("signal_timeout and order_spacing: must not be negative")
+    if errors:
+        raise ValueError("Invalid trading config: " + "; ".join(errors))
+
+def save_trading_config(trading: TradingConfig, path: str):
+    with open(path, 'w') as f:
+        json.dump(asdict(trading), f, indent=2)
+
+@dataclass
+class RuntimeConfig:
+    path: Optional[str] = None  # Trading config file, reloaded on change and on SIGHUP
+    watch_interval: float = 2.0  # Seconds between checks of the file's modification time
+    audit_path: str = "data/config_audit.jsonl"  # Applied versions and the version used by each trade
+
+@dataclass
+class ShadowConfig:
+    channels: List[int] = field(default_factory=list)  # Channels traded on paper only, not on the account
+    equity: float = 10000.0  # Starting paper equity of each shadow channel
+    taker_fee: float = 0.0006  # Fee rate charged on every simulated fill
+    price_interval: float = 1.0  # Seconds between live price polls that drive simulated triggers
+    price_max_age: float = 5.0  # Seconds a polled price serves shadow contract lookups before asking the live client
+    trading_path: Optional[str] = None  # Trading config for shadow channels; defaults to the live one
+    report_interval: float = 300.0  # Seconds between shadow PnL log lines
+
+@dataclass
+class AttributionConfig:
+    enabled: bool = True
+    path: str = "data/attribution"  # Daily rollup files; empty keeps the aggregates in memory only
+    exit_tolerance: float = 0.5  # Percent distance of a closing fill from a TP/SL leg to credit it to that leg
 
 @dataclass
 class Config:
     telegram: TelegramConfig
-    bitmart: BitmartConfig 
\ No newline at end of file
+    bitmart: BitmartConfig
+    reconcile: ReconcileConfig = field(default_factory=ReconcileConfig)
+    trading: TradingConfig = field(default_factory=TradingConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    connection: ConnectionConfig = field(default_factory=ConnectionConfig)
+    diagnostics: DiagnosticsConfig = field(default_factory=DiagnosticsConfig)
+    ingest: IngestConfig = field(default_factory=IngestConfig)
+    bridge: BridgeConfig = field(default_factory=BridgeConfig)
+    kill_switch: KillSwitchConfig = field(default_factory=KillSwitchConfig)
+    runtime: RuntimeConfig = field(default_factory=RuntimeConfig)
+    shadow: ShadowConfig = field(default_factory=ShadowConfig)
+    attribution: AttributionConfig = field(default_factory=AttributionConfig)
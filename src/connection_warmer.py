@@ -0,0 +1,107 @@
+from bitmart_client import BitmartClient, ConnectionCountingAdapter
+from config import ConnectionConfig
+from metrics import metrics
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import asyncio
+import logging
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+class DNSCache:
+    """Cache getaddrinfo results for a few hosts
+
+    Installed process-wide by wrapping socket.getaddrinfo, which is what
+    urllib3 resolves through. A stale entry is served if a refresh fails.
+    """
+
+    def __init__(self, hosts, ttl: float):
+        self.hosts = set(hosts)
+        self.ttl = ttl
+        self._cache = {}
+        self._original = None
+
+    def install(self):
+        if self._original is None:
+            self._original = socket.getaddrinfo
+            socket.getaddrinfo = self._getaddrinfo
+
+    def uninstall(self):
+        if self._original is not None:
+            socket.getaddrinfo = self._original
+            self._original = None
+
+    def _getaddrinfo(self, host, *args, **kwargs):
+        if host not in self.hosts:
+            return self._original(host, *args, **kwargs)
+
+        key = (host, args, tuple(sorted(kwargs.items())))
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        try:
+            result = self._original(host, *args, **kwargs)
+        except socket.gaierror:
+            if cached:
+                logger.warning(f"DNS lookup for {host} failed, using cached address")
+                return cached[1]
+            raise
+
+        self._cache[key] = (time.monotonic() + self.ttl, result)
+        return result
+
+class ConnectionWarmer:
+    """Keep pooled connections to the BitMart API open between signals
+
+    Sends cheap concurrent requests to the public system-time endpoint so that
+    `warm_connections` TLS connections stay open in the client's pool, and
+    retries straight away when a heartbeat fails so a dropped connection is
+    reopened before the next order needs it.
+    """
+
+    HEARTBEAT_ENDPOINT = "/system/time"
+
+    def __init__(self, bitmart: BitmartClient, config: ConnectionConfig):
+        self.bitmart = bitmart
+        self.config = config
+        self.dns_cache = DNSCache([urlparse(bitmart.BASE_URL).hostname], config.dns_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=config.warm_connections)
+        self.logger = logging.getLogger(__name__)
+
+    def install(self):
+        """Size the client's connection pool and enable DNS caching"""
+        adapter = ConnectionCountingAdapter(pool_connections=1, pool_maxsize=max(10, self.config.warm_connections))
+        self.bitmart.session.mount(self.bitmart.BASE_URL, adapter)
+        self.dns_cache.install()
+
+    def _heartbeat(self) -> bool:
+        response = self.bitmart._request('GET', self.HEARTBEAT_ENDPOINT, signed=False)
+        return response.status_code == 200
+
+    def warm(self) -> int:
+        """Send one heartbeat per warm connection concurrently
+
+        Returns:
+            Number of successful heartbeats
+        """
+        futures = [self._executor.submit(self._heartbeat) for _ in range(self.config.warm_connections)]
+        ok = 0
+        for future in futures:
+            try:
+                ok += bool(future.result())
+            except Exception as e:
+                self.logger.warning(f"Heartbeat failed: {e}")
+        metrics.set_gauge('bitmart_warm_connections', ok)
+        return ok
+
+    async def run(self):
+        """Heartbeat forever, retrying quickly while connections are down"""
+        while True:
+            ok = await asyncio.to_thread(self.warm)
+            if ok < self.config.warm_connections:
+                await asyncio.sleep(self.config.retry_interval)
+            else:
+                await asyncio.sleep(self.config.heartbeat_interval)
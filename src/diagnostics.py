@@ -0,0 +1,209 @@
+from config import DiagnosticsConfig
+from metrics import metrics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import List, Optional
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+class LoopStallDetector:
+    """Detect event loop stalls and record the stack that caused them
+
+    A coroutine on the loop stamps a heartbeat every `interval` seconds and a
+    watchdog thread checks it. When the heartbeat is older than `threshold`
+    the loop thread is stuck in blocking code, so the watchdog grabs that
+    thread's current stack.
+    """
+
+    def __init__(self, threshold: float, interval: float, history: int = 20):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=history)  # Recent stalls as (started_at, duration, stack)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None
+
+    def start(self):
+        """Start watching the running loop"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()  # Fresh event so a stopping watchdog can't be revived
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stop,), name="loop-stall-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._heartbeat_task.cancel()
+        self._heartbeat_task = None
+        self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - self._last_beat - self.interval
+            if lag > self.threshold:
+                metrics.observe('loop_stall_seconds', lag)
+            self._last_beat = now
+
+    def _watch(self, stop: threading.Event):
+        reported = None
+        while not stop.wait(self.interval / 2):
+            last_beat = self._last_beat
+            stalled_for = time.monotonic() - last_beat - self.interval
+            if stalled_for <= self.threshold or reported == last_beat:
+                continue
+
+            # Only report each stall once
+            reported = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            self.stalls.append((time.time(), stalled_for, stack))
+            metrics.inc('loop_stalls_total')
+            self.logger.warning(f"Event loop blocked for over {stalled_for * 1000:.0f} ms at:\n{stack}")
+
+# Finished worker-thread profiles of the trade being profiled, set only inside TradeProfiler.profile
+_thread_profiles: ContextVar[Optional[List[cProfile.Profile]]] = ContextVar('thread_profiles', default=None)
+
+class ProfilingExecutor(ThreadPoolExecutor):
+    """Default loop executor that profiles the calls a profiled trade hands to asyncio.to_thread
+
+    submit() runs on the loop thread in the calling task's context, so it can
+    tell the profiled trade's calls from everyone else's; the others run as is.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        profiles = _thread_profiles.get()
+        if profiles is None:
+            return super().submit(fn, *args, **kwargs)
+        return super().submit(self._profiled, profiles, fn, *args, **kwargs)
+
+    @staticmethod
+    def _profiled(profiles: List[cProfile.Profile], fn, *args, **kwargs):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiles.append(profiler)
+
+class TradeProfiler:
+    """Profile single execute_trade calls with cProfile into a rotating directory
+
+    Each profile merges the event loop thread with the worker threads the
+    trade's asyncio.to_thread calls ran on (signing, network and JSON), once
+    install() has made ProfilingExecutor the loop's default executor. The loop
+    thread part also includes whatever other coroutines ran while the trade
+    was awaiting, so read it for the trade's hot spots rather than its totals.
+    """
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._active = False
+        self._installed = False
+        self.logger = logging.getLogger(__name__)
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        """Route the loop's to_thread calls through a ProfilingExecutor"""
+        if not self._installed:
+            loop.set_default_executor(ProfilingExecutor(thread_name_prefix="asyncio"))
+            self._installed = True
+
+    @contextmanager
+    def profile(self, symbol: str, message_id: Optional[int] = None):
+        # cProfile covers the whole thread, so overlapping trades are not profiled
+        if self._active:
+            yield
+            return
+
+        self._active = True
+        thread_profiles = []
+        token = _thread_profiles.set(thread_profiles)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _thread_profiles.reset(token)
+            self._active = False
+            # Worker calls still running when the trade returned are left out
+            self._write([profiler] + list(thread_profiles), symbol, message_id)
+
+    def _write(self, profilers: List[cProfile.Profile], symbol: str, message_id: Optional[int]):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{int(time.time() * 1000)}_{symbol}_{message_id if message_id is not None else 'na'}.prof"
+            path = os.path.join(self.directory, name)
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(path)
+            self.logger.info(f"Trade profile written to {path}")
+            self._rotate()
+        except Exception as e:
+            self.logger.error(f"Error writing trade profile: {e}")
+
+    def _rotate(self):
+        """Delete the oldest profiles beyond `keep`"""
+        profiles = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))
+        for name in profiles[:-self.keep]:
+            os.remove(os.path.join(self.directory, name))
+
+class Diagnostics:
+    """Runtime-switchable stall detection and per-signal profiling
+
+    Disabled by default. When off, no watchdog thread or heartbeat runs and
+    profile() hands back a no-op context, so the trade path pays nothing.
+    """
+
+    def __init__(self, config: DiagnosticsConfig):
+        self.config = config
+        self.enabled = False
+        self.stall_detector = LoopStallDetector(config.stall_threshold, config.heartbeat_interval)
+        self.profiler = TradeProfiler(config.profile_dir, config.profile_keep)
+        self.logger = logging.getLogger(__name__)
+
+    def set_enabled(self, enabled: bool):
+        """Switch diagnostics on or off; must be called from the event loop"""
+        self.enabled = enabled
+        if enabled:
+            self.stall_detector.start()
+            if self.config.profile_trades:
+                self.profiler.install(asyncio.get_running_loop())
+        else:
+            self.stall_detector.stop()
+        self.logger.info(f"Diagnostics {'enabled' if enabled else 'disabled'}")
+
+    def toggle(self):
+        self.set_enabled(not self.enabled)
+
+    def profile(self, symbol: str, message_id: Optional[int] = None):
+        if self.enabled and self.config.profile_trades:
+            return self.profiler.profile(symbol, message_id)
+        return nullcontext()
@@ -0,0 +1,212 @@
+from bitmart_client import BitmartClient
+from config import EntryConfig
+from metrics import metrics
+from json_codec import pretty
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ORDER_FINISHED = 4  # BitMart order state: 2=check (open), 4=finish (filled or cancelled)
+
+@dataclass
+class EntryFill:
+    """Result of placing an entry"""
+    size: int = 0  # Contracts actually filled
+    avg_price: float = 0.0
+    market_price: float = 0.0  # Last price when the entry started
+    order_ids: List[str] = field(default_factory=list)
+    unconfirmed: List[str] = field(default_factory=list)  # Orders whose fill couldn't be read; may still fill
+
+    @property
+    def filled(self) -> bool:
+        return self.size > 0
+
+    def slippage(self, is_short: bool) -> float:
+        """Fill price against the market price at signal time, percent (positive = worse)"""
+        if not self.filled or not self.market_price:
+            return 0.0
+        direction = -1 if is_short else 1
+        return direction * (self.avg_price - self.market_price) / self.market_price * 100
+
+def ladder_prices(zone: Tuple[float, float], rungs: int, is_short: bool) -> List[float]:
+    """Evenly spaced limit prices across the entry zone, most likely to fill first"""
+    low, high = zone
+    if rungs == 1 or low == high:
+        return [low if is_short else high] * rungs
+    step = (high - low) / (rungs - 1)
+    prices = [low + i * step for i in range(rungs)]
+    # Longs fill from the top of the zone down, shorts from the bottom up
+    return prices if is_short else prices[::-1]
+
+def split_size(size: int, rungs: int, min_volume: int) -> List[int]:
+    """Split a size over at most `rungs` orders of at least min_volume each"""
+    rungs = max(1, min(rungs, size // max(1, min_volume)))
+    base, extra = divmod(size, rungs)
+    return [base + (1 if i < extra else 0) for i in range(rungs)]
+
+class EntryExecutor:
+    """Open a position with a market order or a ladder of limit orders
+
+    Once halted() returns True (the kill switch), no further entry order is
+    sent and a working ladder is cancelled. Only fills read back from the
+    exchange are counted; an order whose fill can't be read, or a ladder
+    order that can't be confirmed cancelled, goes to `unconfirmed` and no
+    market order tops up the ladder after it.
+    """
+
+    def __init__(self, bitmart: BitmartClient, halted: Callable[[], bool] = lambda: False):
+        self.bitmart = bitmart
+        self.halted = halted
+        self.logger = logging.getLogger(__name__)
+
+    async def execute(self, signal: dict, size: int, config: EntryConfig, market_price: float = 0.0) -> EntryFill:
+        """market_price is the last price read while sizing; looked up here only if not given"""
+        symbol = signal['symbol']
+        fill = EntryFill(market_price=market_price or await asyncio.to_thread(self._last_price, symbol))
+
+        if config.mode == "ladder":
+            await self._ladder(signal, size, config, fill)
+            remainder = size - fill.size
+            if fill.unconfirmed:
+                self.logger.error(f"Ladder for {symbol} has unconfirmed orders {fill.unconfirmed}, "
+                                  f"not sending a market order for the remainder")
+            elif remainder > 0 and config.on_timeout == "market" and not self.halted():
+                self.logger.info(f"Ladder for {symbol} timed out with {remainder} unfilled, sending market order")
+                await self._market(signal, remainder, fill)
+        else:
+            await self._market(signal, size, fill)
+
+        if fill.filled:
+            slippage = fill.slippage(signal['side'] == 4)
+            # Percent values don't suit the latency histogram buckets; sum and count give the mean
+            metrics.set_gauge('entry_last_slippage_percent', slippage, mode=config.mode)
+            metrics.inc('entry_slippage_percent_sum', slippage, mode=config.mode)
+            metrics.inc('entry_fills_total', mode=config.mode)
+            self.logger.info(
+                f"Entry for {symbol}: {fill.size}/{size} filled at {fill.avg_price} "
+                f"(market {fill.market_price}, slippage {slippage:.4f}%)"
+            )
+        return fill
+
+    async def _market(self, signal: dict, size: int, fill: EntryFill):
+        if self.halted():
+            self.logger.warning(f"Trading halted, not sending the {signal['symbol']} entry")
+            return
+        result = await asyncio.to_thread(
+            self.bitmart.submit_order,
+            symbol=signal['symbol'],
+            side=signal['side'],
+            size=size,
+            leverage=signal['leverage'],
+            open_type='cross'
+        )
+        self.logger.info("Main order result: %s", pretty(result))
+        if result.get('code') != 1000:
+            return
+
+        order_id = result.get('data', {}).get('order_id')
+        fill.order_ids.append(order_id)
+        # Market orders fill at once; the order query gives the size and average price
+        for _ in range(3):
+            state = await asyncio.to_thread(self._order_fill, signal['symbol'], order_id)
+            if state and state[2]:
+                self._add_fill(fill, state[0], state[1] or fill.market_price)
+                return
+            await asyncio.sleep(0.2)
+        self.logger.error(f"Could not read the fill of {signal['symbol']} entry order {order_id}")
+        fill.unconfirmed.append(order_id)
+
+    async def _ladder(self, signal: dict, size: int, config: EntryConfig, fill: EntryFill):
+        symbol = signal['symbol']
+        is_short = signal['side'] == 4
+        min_volume = await asyncio.to_thread(self.bitmart._get_min_volume, symbol)
+        sizes = split_size(size, config.rungs, min_volume)
+        prices = ladder_prices(signal['entry_zone'], len(sizes), is_short)
+
+        orders = {}  # order_id -> size
+        for rung_size, price in zip(sizes, prices):
+            if self.halted():
+                break
+            result = await asyncio.to_thread(
+                self.bitmart.submit_order,
+                symbol=symbol,
+                side=signal['side'],
+                size=rung_size,
+                leverage=signal['leverage'],
+                open_type='cross',
+                order_type='limit',
+                price=str(price)
+            )
+            self.logger.info(f"Ladder order {rung_size} @ {price} result: %s", pretty(result))
+            if result.get('code') == 1000:
+                orders[result.get('data', {}).get('order_id')] = rung_size
+
+        deadline = time.monotonic() + config.timeout
+        fills = {}  # order_id -> (filled size, avg price)
+        pending = set(orders)
+        while pending and time.monotonic() < deadline and not self.halted():
+            await asyncio.sleep(config.poll_interval)
+            for order_id in list(pending):
+                state = await asyncio.to_thread(self._order_fill, symbol, order_id)
+                if state:
+                    fills[order_id] = state[:2]
+                    if state[2]:
+                        pending.discard(order_id)
+
+        for order_id in pending:
+            try:
+                result = await asyncio.to_thread(self.bitmart.cancel_order, symbol, order_id)
+            except Exception as e:
+                result = {'error': str(e)}
+            if result.get('code') != 1000:
+                self.logger.error(f"Error cancelling ladder order {order_id}: {result}")
+            # Read the final fill; the order may have filled while cancelling
+            state = await asyncio.to_thread(self._order_fill, symbol, order_id)
+            if state and state[2]:
+                fills[order_id] = state[:2]
+            else:
+                # Still resting, or its state is unknown: only what was read so far counts as filled
+                fill.unconfirmed.append(order_id)
+
+        fill.order_ids.extend(orders)
+        for filled, price in fills.values():
+            self._add_fill(fill, filled, price)
+
+    def _order_fill(self, symbol: str, order_id: str) -> Optional[Tuple[int, float, bool]]:
+        """Filled size, average price and whether the order is done"""
+        try:
+            result = self.bitmart.get_order(symbol, order_id)
+            if result.get('code') != 1000:
+                self.logger.error(f"Error getting order {order_id}: {result}")
+                return None
+            data = result.get('data') or {}
+            return (
+                int(float(data.get('deal_size') or 0)),
+                float(data.get('deal_avg_price') or 0),
+                int(data.get('state') or 0) == ORDER_FINISHED
+            )
+        except Exception as e:
+            self.logger.error(f"Error getting order {order_id}: {e}")
+            return None
+
+    def _last_price(self, symbol: str) -> float:
+        try:
+            details = self.bitmart.get_contract_details(symbol)
+            for contract in details.get('data', {}).get('symbols', []):
+                if contract['symbol'] == symbol:
+                    return float(contract.get('last_price') or 0)
+        except Exception as e:
+            self.logger.error(f"Error getting last price for {symbol}: {e}")
+        return 0.0
+
+    @staticmethod
+    def _add_fill(fill: EntryFill, size: int, price: float):
+        if size <= 0:
+            return
+        total = fill.size + size
+        fill.avg_price = (fill.avg_price * fill.size + price * size) / total
+        fill.size = total
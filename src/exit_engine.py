@@ -0,0 +1,286 @@
+from bitmart_client import BitmartClient
+from metrics import metrics
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ExitPolicy:
+    trail_percent: float = 2.0  # Stop distance from the best price, percent
+    activate_after_tp: int = 1  # Start trailing once this many targets are hit (0 = from entry)
+    breakeven_after_tp: int = 1  # Move the stop to entry once this many targets are hit (0 = never)
+    tighten_per_tp: float = 0.0  # Percentage points taken off trail_percent per target hit after activation
+    min_trail_percent: float = 0.5
+
+class TrackedPosition:
+    """Stop state of one position
+
+    Prices are kept in "long space": shorts store negated prices so a higher
+    value is always better and the stop only ever moves up.
+    """
+
+    __slots__ = ('key', 'symbol', 'direction', 'entry', 'stop', 'best', 'targets', 'tps_hit',
+                 'trail', 'policy', 'sent_stop', 'context')
+
+    def __init__(self, key: str, symbol: str, is_long: bool, entry: float, stop: float,
+                 targets: List[float], policy: ExitPolicy, context=None):
+        self.key = key
+        self.symbol = symbol
+        self.direction = 1.0 if is_long else -1.0
+        self.entry = self.direction * entry
+        self.stop = self.direction * stop
+        self.best = self.entry
+        self.targets = [self.direction * target for target in targets]
+        self.tps_hit = 0
+        self.trail = policy.trail_percent / 100
+        self.policy = policy
+        self.sent_stop = self.stop  # Last stop the exchange knows about
+        self.context = context  # Caller data, e.g. the Trade and its SL order id
+
+    @property
+    def stop_price(self) -> float:
+        return self.direction * self.stop
+
+class ExitEngine:
+    """Client-side stop management for many open positions
+
+    on_tick updates every position of the ticked symbol in O(1) and marks it
+    dirty only if its stop moved by at least min_move_percent. flush() then
+    sends one stop update per dirty position, so all moves inside a
+    coalesce window cost a single amend request. In run() only the sends
+    go to a worker thread; the engine's state is changed on the event loop.
+    """
+
+    def __init__(self, send_stop: Callable[[TrackedPosition, float], bool],
+                 coalesce_window: float = 0.5, min_move_percent: float = 0.05,
+                 on_stop_hit: Optional[Callable[[TrackedPosition, float], None]] = None,
+                 on_stop_moved: Optional[Callable[[TrackedPosition, float], None]] = None):
+        self.send_stop = send_stop  # Returns True when the exchange accepted the new stop; must not change state
+        self.on_stop_hit = on_stop_hit
+        self.on_stop_moved = on_stop_moved  # Called with each accepted stop, where the engine runs
+        self.coalesce_window = coalesce_window
+        self.min_move = min_move_percent / 100
+        self.positions: Dict[str, TrackedPosition] = {}
+        self._by_symbol: Dict[str, Dict[str, TrackedPosition]] = {}
+        self._dirty: Dict[str, TrackedPosition] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, key: str, symbol: str, is_long: bool, entry: float, stop: float,
+            targets: List[float], policy: ExitPolicy = None, context=None) -> TrackedPosition:
+        position = TrackedPosition(key, symbol, is_long, entry, stop, targets, policy or ExitPolicy(), context)
+        self.positions[key] = position
+        self._by_symbol.setdefault(symbol, {})[key] = position
+        return position
+
+    def remove(self, key: str):
+        position = self.positions.pop(key, None)
+        if position:
+            self._by_symbol[position.symbol].pop(key, None)
+            if not self._by_symbol[position.symbol]:
+                del self._by_symbol[position.symbol]
+            self._dirty.pop(key, None)
+
+    def amend(self, key: str, stop: float = None, targets: List[float] = None):
+        """Take a new stop or targets, e.g. from an edited signal"""
+        position = self.positions.get(key)
+        if not position:
+            return
+        if stop is not None:
+            position.stop = position.sent_stop = position.direction * stop
+        if targets is not None:
+            position.targets = [position.direction * target for target in targets]
+            position.tps_hit = min(position.tps_hit, len(position.targets))
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._by_symbol)
+
+    def on_tick(self, symbol: str, price: float):
+        positions = self._by_symbol.get(symbol)
+        if not positions:
+            return
+        for position in list(positions.values()):
+            self._update(position, price)
+
+    def _update(self, position: TrackedPosition, price: float):
+        value = position.direction * price
+        policy = position.policy
+
+        if value <= position.sent_stop:
+            # The exchange-side stop fires; stop tracking the position
+            self.remove(position.key)
+            if self.on_stop_hit:
+                self.on_stop_hit(position, price)
+            return
+        if value <= position.stop:
+            # Only the local stop is crossed: the exchange still holds a looser one (amend pending,
+            # failed or under min_move), so the position stays open and tracked until that fires
+            return
+
+        if value > position.best:
+            position.best = value
+
+        # Each target is crossed once, so this loop is amortized O(1)
+        while position.tps_hit < len(position.targets) and value >= position.targets[position.tps_hit]:
+            position.tps_hit += 1
+            if policy.tighten_per_tp and position.tps_hit > policy.activate_after_tp:
+                tightened = position.trail * 100 - policy.tighten_per_tp
+                position.trail = max(policy.min_trail_percent, tightened) / 100
+
+        candidate = position.stop
+        if policy.breakeven_after_tp and position.tps_hit >= policy.breakeven_after_tp:
+            candidate = max(candidate, position.entry)
+        if position.tps_hit >= policy.activate_after_tp:
+            candidate = max(candidate, position.best - abs(position.best) * position.trail)
+
+        if candidate > position.stop:
+            position.stop = candidate
+            if candidate - position.sent_stop >= abs(position.sent_stop) * self.min_move:
+                self._dirty[position.key] = position
+
+    def flush(self) -> int:
+        """Send the latest stop of every dirty position
+
+        Returns:
+            Number of stop updates sent
+        """
+        return self._apply(self._send(self._take()))
+
+    async def run(self):
+        """Flush coalesced stop updates every window"""
+        while True:
+            await asyncio.sleep(self.coalesce_window)
+            if self._dirty:
+                batch = self._take()
+                self._apply(await asyncio.to_thread(self._send, batch))
+
+    def _take(self) -> List[Tuple[TrackedPosition, float]]:
+        dirty, self._dirty = self._dirty, {}
+        return [(position, position.stop_price) for position in dirty.values()]
+
+    def _send(self, batch: List[Tuple[TrackedPosition, float]]) -> List[Tuple[TrackedPosition, float, bool]]:
+        """Send each stop; touches no engine state, so it can run off the event loop"""
+        results = []
+        for position, stop in batch:
+            try:
+                accepted = self.send_stop(position, stop)
+            except Exception as e:
+                self.logger.error(f"Error moving stop for {position.key}: {e}")
+                accepted = False
+            results.append((position, stop, accepted))
+        return results
+
+    def _apply(self, results: List[Tuple[TrackedPosition, float, bool]]) -> int:
+        sent = 0
+        for position, stop, accepted in results:
+            if self.positions.get(position.key) is not position:
+                continue  # Removed, or replaced by a new position, while the send was out
+            if accepted:
+                position.sent_stop = position.direction * stop
+                sent += 1
+                if self.on_stop_moved:
+                    self.on_stop_moved(position, stop)
+            if position.stop - position.sent_stop >= abs(position.sent_stop) * self.min_move:
+                # Failed, or moved again since: retry with the latest stop next window
+                self._dirty[position.key] = position
+        if sent:
+            metrics.inc('exit_engine_stop_updates_total', sent)
+        return sent
+
+class TickerFeed:
+    """Poll last prices for all contracts with one public request
+
+    Stands in for a streaming feed; any source that calls engine.on_tick
+    per price update works the same way. The engine can be anything with
+    `symbols` (those it wants prices for) and `on_tick(symbol, price)`. An
+    engine that also has `on_details(details)` gets every poll whole, and
+    is polled even while it wants no symbol.
+    """
+
+    def __init__(self, bitmart: BitmartClient, engine: ExitEngine, interval: float = 1.0):
+        self.bitmart = bitmart
+        self.engine = engine
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+
+    async def run(self):
+        while True:
+            if self.engine.symbols or hasattr(self.engine, 'on_details'):
+                try:
+                    details = await asyncio.to_thread(self.bitmart.get_contract_details)
+                    self._dispatch(details)
+                except Exception as e:
+                    self.logger.error(f"Error polling prices: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _dispatch(self, details: dict):
+        # Ticks are applied on the event loop, where the engine lives
+        if details.get('code') != 1000:
+            raise ValueError(f"Could not get contract prices: {details}")
+        if hasattr(self.engine, 'on_details'):
+            self.engine.on_details(details)
+        wanted = set(self.engine.symbols)
+        for contract in details.get('data', {}).get('symbols', []):
+            if contract['symbol'] in wanted and contract.get('last_price'):
+                self.engine.on_tick(contract['symbol'], float(contract['last_price']))
+
+class ExitSimulator:
+    """Drive an ExitEngine with random-walk prices to check and time it"""
+
+    def __init__(self, positions: int = 500, symbols: int = 50, volatility: float = 0.001,
+                 policy: ExitPolicy = None, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.volatility = volatility
+        self.prices = {f"SIM{i}USDT": 100.0 for i in range(symbols)}
+        self.updates = []  # (key, stop) for every stop sent
+        self.stops_hit = []
+        self.engine = ExitEngine(self._send, on_stop_hit=lambda p, price: self.stops_hit.append(p.key))
+        self.history = {}  # key -> stops sent, to check they never loosen
+
+        names = list(self.prices)
+        for i in range(positions):
+            symbol = names[i % symbols]
+            is_long = i % 2 == 0
+            entry = self.prices[symbol]
+            step = entry * 0.01
+            direction = 1 if is_long else -1
+            self.engine.add(
+                f"pos{i}", symbol, is_long, entry,
+                stop=entry - direction * 2 * step,
+                targets=[entry + direction * k * step for k in (1, 2, 3)],
+                policy=policy
+            )
+
+    def _send(self, position: TrackedPosition, stop: float) -> bool:
+        self.updates.append((position.key, stop))
+        self.history.setdefault(position.key, []).append(position.direction * stop)
+        return True
+
+    def run(self, ticks: int, flush_every: int = 100) -> dict:
+        """Feed `ticks` price updates round-robin over the symbols"""
+        names = list(self.prices)
+        started = time.perf_counter()
+        for i in range(ticks):
+            symbol = names[i % len(names)]
+            self.prices[symbol] *= 1 + self.rng.gauss(0, self.volatility)
+            self.engine.on_tick(symbol, self.prices[symbol])
+            if i % flush_every == 0:
+                self.engine.flush()
+        self.engine.flush()
+        elapsed = time.perf_counter() - started
+
+        monotonic = all(b >= a for stops in self.history.values() for a, b in zip(stops, stops[1:]))
+        return {
+            'ticks': ticks,
+            'seconds': elapsed,
+            'ticks_per_second': ticks / elapsed if elapsed else float('inf'),
+            'stop_updates': len(self.updates),
+            'stops_hit': len(self.stops_hit),
+            'open_positions': len(self.engine.positions),
+            'stops_monotonic': monotonic,
+        }
@@ -0,0 +1,112 @@
+"""Bulk-ingest channel history into the columnar signal store
+
+Usage:
+    python history_ingest.py CHANNEL_ID [CHANNEL_ID ...] [--store data/signals] [--batch 5000]
+
+Safe to interrupt and re-run: each channel resumes after the last message of
+its last committed batch.
+"""
+from telethon import TelegramClient
+from signal_parser import parse_signal, parse_cancellation
+from signal_store import SignalStore, empty_batch, KIND_SIGNAL, KIND_CANCELLATION, MAX_TARGETS
+from dotenv import load_dotenv
+from typing import List, Tuple
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+def parse_batch(store: SignalStore, channel_id: int, messages: List[Tuple[int, int, str]]) -> dict:
+    """Parse (message_id, timestamp, text) tuples into store columns
+
+    Messages that are neither signals nor cancellations are skipped.
+    """
+    batch = empty_batch(len(messages))
+    row = 0
+    for message_id, timestamp, text in messages:
+        if not text:
+            continue
+        try:
+            symbol = parse_cancellation(text)
+            signal = None if symbol else parse_signal(text)
+        except Exception as e:
+            logger.debug(f"Skipping malformed message {message_id}: {e}")
+            continue
+
+        if signal:
+            symbol = signal['symbol']
+            targets = signal['take_profits'][:MAX_TARGETS]
+            batch['kind'][row] = KIND_SIGNAL
+            batch['side'][row] = signal['side']
+            batch['leverage'][row] = int(signal['leverage'])
+            batch['entry'][row] = signal['entry_price']
+            batch['targets'][row, :len(targets)] = targets
+            batch['stop_loss'][row] = signal['stop_loss']
+        elif symbol:
+            batch['kind'][row] = KIND_CANCELLATION
+        else:
+            continue
+
+        batch['channel_id'][row] = channel_id
+        batch['message_id'][row] = message_id
+        batch['timestamp'][row] = timestamp
+        batch['symbol_id'][row] = store.symbol_id(symbol)
+        row += 1
+
+    return {name: values[:row] for name, values in batch.items()}
+
+async def ingest_channel(client: TelegramClient, store: SignalStore, channel_id: int, batch_size: int):
+    """Page a channel's history oldest-first from the last ingested message"""
+    channel = await client.get_entity(channel_id)
+    min_id = store.last_message_id(channel_id)
+    logger.info(f"Ingesting {channel_id} after message {min_id}")
+
+    started = time.time()
+    scanned = 0
+    messages = []
+    async for message in client.iter_messages(channel, min_id=min_id, reverse=True, wait_time=1):
+        messages.append((message.id, int(message.date.timestamp()), message.text))
+        if len(messages) >= batch_size:
+            scanned += _commit(store, channel_id, messages)
+            messages = []
+
+    if messages:
+        scanned += _commit(store, channel_id, messages)
+
+    elapsed = time.time() - started
+    logger.info(f"Channel {channel_id}: {scanned} messages in {elapsed:.1f}s, store has {store.rows} rows")
+
+def _commit(store: SignalStore, channel_id: int, messages: List[Tuple[int, int, str]]) -> int:
+    columns = parse_batch(store, channel_id, messages)
+    store.append(columns, channel_id, last_message_id=messages[-1][0])
+    logger.info(f"Channel {channel_id}: stored {len(columns['message_id'])} of {len(messages)} messages up to {messages[-1][0]}")
+    return len(messages)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ingest channel history into the signal store")
+    parser.add_argument('channels', nargs='+', type=int, help="Channel ids")
+    parser.add_argument('--store', default=os.path.join('data', 'signals'))
+    parser.add_argument('--batch', type=int, default=5000, help="Messages parsed and committed per batch")
+    parser.add_argument('--session', default='history_session', help="Telethon session (separate from the live monitor's)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    store = SignalStore(args.store)
+    client = TelegramClient(args.session, os.getenv("TELEGRAM_API_ID"), os.getenv("TELEGRAM_API_HASH"))
+    await client.start(phone=os.getenv("TELEGRAM_PHONE"))
+    try:
+        for channel_id in args.channels:
+            await ingest_channel(client, store, channel_id, args.batch)
+    finally:
+        await client.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
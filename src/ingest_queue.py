@@ -0,0 +1,199 @@
+from config import IngestConfig
+from metrics import metrics
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Execution priorities, lower runs first
+PRIORITY_CANCELLATION = 0
+PRIORITY_SIGNAL = 1
+
+@dataclass
+class RawMessage:
+    message_id: int
+    text: str
+    received_at: float = field(default_factory=time.time)
+    channel_id: int = 0
+    session: str = ""  # Telegram session that delivered it
+    edit_date: float = 0.0  # Set for an edit of an earlier message
+
+class BoundedPriorityQueue:
+    """Bounded asyncio queue with priority levels and an overflow policy
+
+    When full, a new item evicts the oldest item of a lower priority if there
+    is one. Otherwise 'drop_oldest' evicts the oldest item of the lowest
+    non-empty level at or below the new item's, and 'reject' refuses the new
+    item.
+    """
+
+    def __init__(self, name: str, maxsize: int, overflow: str = "drop_oldest", levels: int = 1,
+                 on_overflow: Optional[Callable[[str, Any], None]] = None):
+        if overflow not in ("drop_oldest", "reject"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.name = name
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.on_overflow = on_overflow  # Called with (reason, item) for every dropped or rejected item
+        self._levels = [deque() for _ in range(levels)]
+        self._size = 0
+        self._not_empty = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def put_nowait(self, item, priority: int = 0) -> bool:
+        """Enqueue an item; returns False if it was rejected"""
+        if self._size >= self.maxsize:
+            victim_level = self._victim_level(priority)
+            if victim_level is None:
+                self._drop("rejected", item)
+                return False
+            _, victim = self._levels[victim_level].popleft()
+            self._size -= 1
+            self._drop("dropped", victim)
+
+        self._levels[priority].append((time.monotonic(), item))
+        self._size += 1
+        self._not_empty.set()
+        metrics.set_gauge('ingest_queue_depth', self._size, queue=self.name)
+        return True
+
+    async def get(self):
+        while not self._size:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        level = next(level for level in self._levels if level)
+        enqueued_at, item = level.popleft()
+        self._size -= 1
+        metrics.set_gauge('ingest_queue_depth', self._size, queue=self.name)
+        metrics.observe('ingest_queue_wait_seconds', time.monotonic() - enqueued_at, queue=self.name)
+        return item
+
+    def discard(self, predicate: Callable[[Any], bool], priority: int) -> list:
+        """Remove and return the queued items of a level that match predicate"""
+        kept, removed = deque(), []
+        for entry in self._levels[priority]:
+            if predicate(entry[1]):
+                removed.append(entry[1])
+            else:
+                kept.append(entry)
+        if removed:
+            self._levels[priority] = kept
+            self._size -= len(removed)
+            metrics.set_gauge('ingest_queue_depth', self._size, queue=self.name)
+        return removed
+
+    def _victim_level(self, priority: int) -> Optional[int]:
+        for level in range(len(self._levels) - 1, priority, -1):
+            if self._levels[level]:
+                return level
+        if self.overflow == "drop_oldest":
+            for level in range(priority, -1, -1):
+                if self._levels[level]:
+                    return level
+        return None
+
+    def _drop(self, reason: str, item):
+        metrics.inc('ingest_queue_overflow_total', queue=self.name, reason=reason)
+        logger.warning(f"Queue {self.name} full ({self.maxsize}), {reason} {item!r}")
+        if self.on_overflow:
+            self.on_overflow(reason, item)
+
+class IngestPipeline:
+    """Staged message processing: enqueue -> parse -> execute
+
+    The Telegram handler only calls submit(), which keeps the first copy of
+    each message id and drops copies delivered by other sessions. The parse
+    stage classifies raw messages into (kind, payload, priority) and the
+    execution stage runs the handler registered for each kind, cancellations
+    first. A cancellation also drops the queued signals it supersedes, so a
+    signal can't open the position its provider already cancelled.
+    """
+
+    def __init__(self, config: IngestConfig,
+                 classify: Callable[[RawMessage], Optional[Tuple[str, Any, int]]],
+                 handlers: Dict[str, Callable[[Any], Awaitable[None]]],
+                 on_overflow: Optional[Callable[[str, Any], None]] = None,
+                 forward: Optional[Callable[[str, Any, int, float], None]] = None,
+                 supersedes: Optional[Callable[[Tuple[str, Any], Tuple[str, Any]], bool]] = None,
+                 on_superseded: Optional[Callable[[Tuple[str, Any]], None]] = None):
+        self.config = config
+        self.classify = classify
+        self.handlers = handlers
+        # Set in the ingest process of a split deployment: called with (kind, payload,
+        # priority, received_at) instead of queueing for local execution
+        self.forward = forward
+        # Called with (cancellation, queued signal) as (kind, payload) pairs; True drops the signal
+        self.supersedes = supersedes
+        self.on_superseded = on_superseded
+        self.raw = BoundedPriorityQueue("raw", config.raw_queue_size, config.overflow,
+                                        on_overflow=on_overflow)
+        self.work = BoundedPriorityQueue("execution", config.execution_queue_size, config.overflow,
+                                         levels=PRIORITY_SIGNAL + 1, on_overflow=on_overflow)
+        self.logger = logging.getLogger(__name__)
+        self._tasks = []
+        self._seen = OrderedDict()  # (channel id, message id) of recent messages, oldest first
+
+    def submit(self, message: RawMessage) -> bool:
+        """Enqueue a message; returns False for duplicates and rejected messages"""
+        # Each edit is a new version of the message, copies of it are still duplicates
+        key = (message.channel_id, message.message_id, message.edit_date)
+        if key in self._seen:
+            metrics.inc('ingest_duplicates_total', session=message.session)
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.config.dedup_window:
+            self._seen.popitem(last=False)
+        return self.raw.put_nowait(message)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._parse_stage())]
+        if not self.forward:
+            self._tasks += [asyncio.create_task(self._execution_stage()) for _ in range(self.config.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _parse_stage(self):
+        while True:
+            message = await self.raw.get()
+            try:
+                classified = self.classify(message)
+            except Exception as e:
+                self.logger.error(f"Error classifying message {message.message_id}: {e}")
+                continue
+            if classified:
+                kind, payload, priority = classified
+                metrics.inc('ingest_messages_total', kind=kind)
+                if self.forward:
+                    self.forward(kind, payload, priority, message.received_at)
+                else:
+                    self.enqueue(kind, payload, priority)
+
+    def enqueue(self, kind: str, payload: Any, priority: int) -> bool:
+        """Queue classified work for the execution stage"""
+        if priority == PRIORITY_CANCELLATION and self.supersedes:
+            work = (kind, payload)
+            for queued in self.work.discard(lambda item: self.supersedes(work, item), PRIORITY_SIGNAL):
+                metrics.inc('ingest_superseded_total', kind=queued[0])
+                self.logger.info(f"Dropping queued {queued[0]} superseded by {kind} {payload!r}")
+                if self.on_superseded:
+                    self.on_superseded(queued)
+        return self.work.put_nowait((kind, payload), priority)
+
+    async def _execution_stage(self):
+        while True:
+            kind, payload = await self.work.get()
+            try:
+                await self.handlers[kind](payload)
+            except Exception as e:
+                self.logger.error(f"Error handling {kind}: {e}")
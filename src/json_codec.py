@@ -0,0 +1,62 @@
+"""JSON encoding for the exchange client, logs and journals
+
+Uses orjson when it is installed and the standard library otherwise. Both
+backends produce compact output, so a signed request body is byte-for-byte
+what gets sent.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class JsonCodec:
+    def __init__(self, backend: str = None):
+        self.backend = backend or ('orjson' if orjson else 'json')
+        if self.backend == 'orjson' and not orjson:
+            raise ValueError("orjson is not installed")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        if self.backend == 'orjson':
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Compact encoding as bytes, e.g. for a request body"""
+        if self.backend == 'orjson':
+            return orjson.dumps(obj)
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode('utf-8')
+
+    def dumps_pretty(self, obj: Any) -> str:
+        if self.backend == 'orjson':
+            # orjson can't encode non-str keys or arbitrary objects; fall back for those
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+            except TypeError:
+                pass
+        return json.dumps(obj, indent=2, default=str)
+
+class Pretty:
+    """Indented JSON rendered only if a log record is actually emitted
+
+    Pass it as a logging argument rather than in an f-string:
+    logger.info("Result: %s", pretty(result))
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj: Any):
+        self.obj = obj
+
+    def __str__(self) -> str:
+        return codec.dumps_pretty(self.obj)
+
+codec = JsonCodec()
+loads = codec.loads
+dumps = codec.dumps
+dumpb = codec.dumpb
+pretty = Pretty
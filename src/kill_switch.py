@@ -0,0 +1,179 @@
+from bitmart_client import BitmartClient
+from config import KillSwitchConfig
+from metrics import metrics
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FlattenReport:
+    reason: str
+    started_at: float  # Unix time
+    seconds: float = 0.0  # Time to flat, or until giving up
+    flat: bool = False  # No positions or open orders left at the last check
+    positions_closed: int = 0
+    orders_cancelled: int = 0
+    rounds: int = 0
+    failures: List[str] = field(default_factory=list)  # Requests that failed after every retry
+    remaining: List[str] = field(default_factory=list)  # What was still open at the last check
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        state = "flat" if self.flat else f"NOT flat, still open: {', '.join(self.remaining)}"
+        return (f"Kill switch ({self.reason}): {state} after {self.seconds:.2f}s, "
+                f"{self.positions_closed} position(s) closed, {self.orders_cancelled} order(s) cancelled, "
+                f"{len(self.failures)} failure(s) in {self.rounds} round(s)")
+
+class KillSwitch:
+    """Close every position and cancel every order on the account at once
+
+    Each round fetches positions, open orders and plan/TP-SL orders with one
+    request each, then sends every cancel and close concurrently. The rate
+    limiter spaces requests per endpoint, and each request is retried on
+    failure. Rounds repeat until a check finds nothing open, or the round
+    limit is reached. Executions still placing orders are waited for before
+    each round, so none of their orders lands after the check that reports
+    flat.
+    """
+
+    def __init__(self, bitmart: BitmartClient, config: KillSwitchConfig,
+                 trail_orders: Callable[[], Iterable[Tuple[str, str]]] = lambda: (),
+                 in_flight: Callable[[], Iterable[Awaitable]] = lambda: ()):
+        self.bitmart = bitmart
+        self.config = config
+        # Trail orders aren't listed by current-plan-order; (symbol, order id) of the ones we placed
+        self.trail_orders = trail_orders
+        # Futures of the executions placing orders right now; they stop at their next halted check
+        self.in_flight = in_flight
+        self.running: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    async def flatten(self, reason: str) -> FlattenReport:
+        """Flatten the account; a second call while one runs waits for the same run"""
+        if self.running is None or self.running.done():
+            self.running = asyncio.create_task(self._flatten(reason))
+        return await asyncio.shield(self.running)
+
+    async def _flatten(self, reason: str) -> FlattenReport:
+        report = FlattenReport(reason=reason, started_at=time.time())
+        started = time.monotonic()
+        self.logger.warning(f"Kill switch triggered: {reason}")
+        metrics.inc('kill_switch_runs_total')
+        semaphore = asyncio.Semaphore(self.config.concurrency)
+        settle_by = time.monotonic() + self.config.execution_wait
+
+        # One snapshot per round, plus a last one to confirm the result
+        for round_number in range(self.config.rounds + 1):
+            await self._settle(report, settle_by)
+            if round_number == 0:
+                # Read after settling, so trails placed by a finishing execution are included
+                trail_orders = list(self.trail_orders())
+            try:
+                positions, orders, plans = await self._snapshot()
+            except Exception as e:
+                self.logger.error(f"Kill switch could not fetch account state: {e}")
+                report.failures.append(f"snapshot: {e}")
+                continue
+            report.remaining = ([f"position {p['symbol']}" for p in positions] +
+                                [f"order {o['symbol']} {o['order_id']}" for o in orders] +
+                                [f"plan {p['symbol']} {p['order_id']}" for p in plans])
+            if not (report.remaining or trail_orders):
+                report.flat = True
+                break
+            if round_number == self.config.rounds:
+                break
+            report.rounds = round_number + 1
+
+            jobs = [self._attempt(semaphore, report, f"close {p['symbol']}",
+                                  self.bitmart.close_position, p['symbol'], p)
+                    for p in positions]
+            jobs += [self._attempt(semaphore, report, f"cancel orders {symbol}",
+                                   self.bitmart.cancel_orders, symbol, cancel=True)
+                     for symbol in sorted({o['symbol'] for o in orders})]
+            jobs += [self._attempt(semaphore, report, f"cancel plan {p['symbol']} {p['order_id']}",
+                                   self.bitmart.cancel_plan_order, p['symbol'], p['order_id'], cancel=True)
+                     for p in plans]
+            jobs += [self._attempt(semaphore, report, f"cancel trail {symbol} {order_id}",
+                                   self.bitmart.cancel_trail_order, symbol, order_id, cancel=True)
+                     for symbol, order_id in trail_orders]
+            results = await asyncio.gather(*jobs)
+            report.positions_closed += sum(results[:len(positions)])
+            report.orders_cancelled += sum(results[len(positions):])
+            # Trail orders can't be listed, so they get a single round of cancels
+            trail_orders = []
+
+        report.seconds = time.monotonic() - started
+        metrics.set_gauge('kill_switch_time_to_flat_seconds', report.seconds)
+        metrics.set_gauge('kill_switch_flat', 1 if report.flat else 0)
+        metrics.inc('kill_switch_failures_total', len(report.failures))
+        (self.logger.warning if report.flat else self.logger.error)(str(report))
+        return report
+
+    async def _settle(self, report: FlattenReport, deadline: float):
+        """Wait, until the deadline, for executions that are still placing orders"""
+        pending = list(self.in_flight())
+        if not pending:
+            return
+        self.logger.warning(f"Kill switch waiting for {len(pending)} execution(s) in flight")
+        _, running = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+        if running:
+            self.logger.error(f"{len(running)} execution(s) still running, flattening anyway")
+            failure = f"{len(running)} execution(s) still running"
+            if failure not in report.failures:
+                report.failures.append(failure)
+
+    async def _snapshot(self) -> Tuple[List[dict], List[dict], List[dict]]:
+        """Open positions, open orders and plan/TP-SL orders, fetched concurrently"""
+        responses = await asyncio.gather(
+            self._retry(self.bitmart.get_position),
+            self._retry(self.bitmart.get_open_orders),
+            self._retry(self.bitmart.get_plan_orders, plan_type='plan'),
+            self._retry(self.bitmart.get_plan_orders, plan_type='profit_loss'),
+            return_exceptions=True
+        )
+        lists = []
+        for response in responses:
+            # Can't tell what is open; an empty list here would report flat too early
+            if isinstance(response, Exception):
+                raise response
+            data = response.get('data') or []
+            lists.append(data if isinstance(data, list) else data.get('orders', []))
+        positions = [p for p in lists[0] if int(p.get('current_amount', 0)) > 0]
+        return positions, lists[1], lists[2] + lists[3]
+
+    async def _attempt(self, semaphore: asyncio.Semaphore, report: FlattenReport, label: str, call, *args,
+                       cancel: bool = False) -> bool:
+        async with semaphore:
+            try:
+                result = await self._retry(call, *args, retry_codes=not cancel)
+                if result.get('code') != 1000:
+                    # Usually already filled or cancelled with its position; the next check tells
+                    self.logger.info(f"Kill switch could not {label}: {result}")
+                    return False
+                return True
+            except Exception as e:
+                self.logger.error(f"Kill switch could not {label}: {e}")
+                report.failures.append(f"{label}: {e}")
+                return False
+
+    async def _retry(self, call, *args, retry_codes: bool = True, **kwargs) -> dict:
+        """Run a client call in a thread, retrying errors and, if retry_codes, non-1000 codes"""
+        delay = self.config.retry_delay
+        for attempt in range(self.config.retries + 1):
+            try:
+                result = await asyncio.to_thread(call, *args, **kwargs)
+                if result.get('code') == 1000 or not retry_codes:
+                    return result
+                error = ValueError(f"code {result.get('code')}: {result.get('message')}")
+            except Exception as e:
+                error = e
+            if attempt < self.config.retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+        raise error
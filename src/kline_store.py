@@ -0,0 +1,190 @@
+"""Local store of BitMart futures klines
+
+Usage:
+    python kline_store.py SYMBOL [SYMBOL ...] --step 1 --days 365 [--store data/klines]
+"""
+from bitmart_client import BitmartClient
+from config import BitmartConfig
+from dotenv import load_dotenv
+from typing import List, Optional, Tuple
+import argparse
+import logging
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fixed-width candle record; the timestamp column is the time index
+KLINE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),  # Candle open time, unix seconds
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+PAGE_SIZE = 500  # Candles requested per kline call
+
+class KlineStore:
+    """One memory-mapped candle file per symbol and interval
+
+    Files only ever hold closed candles in ascending time order, so later
+    runs only fetch what is missing before the first or after the last
+    stored candle. The earliest start already requested is kept next to
+    the file, so the empty range before a symbol was listed is asked for
+    once rather than on every run.
+    """
+
+    def __init__(self, bitmart: BitmartClient, directory: str):
+        self.bitmart = bitmart
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.logger = logging.getLogger(__name__)
+
+    def path(self, symbol: str, step: int) -> str:
+        return os.path.join(self.directory, f"{symbol}_{step}.bin")
+
+    def requested_from(self, symbol: str, step: int) -> Optional[int]:
+        """Earliest start already downloaded for the file, whether or not it had candles"""
+        try:
+            with open(f"{self.path(symbol, step)}.start") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _set_requested_from(self, symbol: str, step: int, start: int):
+        requested = self.requested_from(symbol, step)
+        if requested is not None and requested <= start:
+            return
+        path = f"{self.path(symbol, step)}.start"
+        with open(f"{path}.tmp", 'w') as f:
+            f.write(str(start))
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, symbol: str, step: int) -> np.ndarray:
+        """Memory-map all stored candles for a symbol and interval"""
+        path = self.path(symbol, step)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        return np.memmap(path, dtype=KLINE_DTYPE, mode='r')
+
+    def window(self, symbol: str, step: int, start: int, end: int) -> np.ndarray:
+        """Zero-copy view of the candles opened in [start, end)"""
+        candles = self.load(symbol, step)
+        timestamps = candles['timestamp']
+        lo = np.searchsorted(timestamps, start, side='left')
+        hi = np.searchsorted(timestamps, end, side='left')
+        return candles[lo:hi]
+
+    def missing_ranges(self, symbol: str, step: int, start: int, end: int) -> List[Tuple[int, int]]:
+        """Ranges of [start, end) not covered by the stored candles"""
+        candles = self.load(symbol, step)
+        if len(candles) == 0:
+            return [(start, end)]
+
+        interval = step * 60
+        first, last = int(candles['timestamp'][0]), int(candles['timestamp'][-1])
+        requested = self.requested_from(symbol, step)
+        # Before the first candle, only what was never asked for; it may predate the listing
+        head = first if requested is None else min(first, requested)
+        ranges = []
+        if start < head:
+            ranges.append((start, head))
+        if end > last + interval:
+            ranges.append((last + interval, end))
+        return ranges
+
+    def fetch(self, symbol: str, step: int, start: int, end: int) -> int:
+        """Download the candles of [start, end) that aren't stored yet
+
+        Returns:
+            Number of candles added
+        """
+        interval = step * 60
+        # Never store the candle that is still forming
+        end = min(end, (int(time.time()) // interval) * interval)
+
+        added = 0
+        for range_start, range_end in self.missing_ranges(symbol, step, start, end):
+            candles = self._download(symbol, step, range_start, range_end)
+            stored = self.load(symbol, step)
+            if not len(stored) or range_start < stored['timestamp'][0]:
+                self._set_requested_from(symbol, step, range_start)
+            if len(candles) == 0:
+                continue
+            if len(stored) and candles['timestamp'][0] < stored['timestamp'][0]:
+                self._prepend(symbol, step, candles, stored)
+            else:
+                with open(self.path(symbol, step), 'ab') as f:
+                    candles.tofile(f)
+            added += len(candles)
+
+        self.logger.info(f"{symbol} {step}m: added {added} candles")
+        return added
+
+    def _download(self, symbol: str, step: int, start: int, end: int) -> np.ndarray:
+        """Page klines for [start, end) into a candle array"""
+        interval = step * 60
+        pages = []
+        page_start = start
+        while page_start < end:
+            page_end = min(end, page_start + PAGE_SIZE * interval)
+            result = self.bitmart.get_kline(symbol, step, page_start, page_end)
+            if result.get('code') != 1000:
+                raise ValueError(f"Could not get klines for {symbol}: {result}")
+
+            rows = [
+                (int(k['timestamp']), float(k['open_price']), float(k['high_price']),
+                 float(k['low_price']), float(k['close_price']), float(k['volume']))
+                for k in result.get('data') or []
+                if start <= int(k['timestamp']) < end
+            ]
+            if rows:
+                pages.append(np.array(rows, dtype=KLINE_DTYPE))
+            page_start = page_end
+
+        if not pages:
+            return np.empty(0, dtype=KLINE_DTYPE)
+
+        # Pages may overlap at their edges
+        candles = np.concatenate(pages)
+        _, unique = np.unique(candles['timestamp'], return_index=True)
+        return candles[unique]
+
+    def _prepend(self, symbol: str, step: int, candles: np.ndarray, stored: np.ndarray):
+        """Rewrite the file with older candles in front"""
+        merged = np.concatenate([candles[candles['timestamp'] < stored['timestamp'][0]], np.asarray(stored)])
+        path = self.path(symbol, step)
+        tmp = f"{path}.tmp"
+        merged.tofile(tmp)
+        os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch BitMart futures klines into the local store")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--step', type=int, default=1, help="Candle interval in minutes")
+    parser.add_argument('--days', type=float, default=30, help="History to keep, counted back from now")
+    parser.add_argument('--store', default=os.path.join('data', 'klines'))
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    bitmart = BitmartClient(BitmartConfig(
+        api_key=os.getenv("BITMART_API_KEY"),
+        api_secret=os.getenv("BITMART_API_SECRET"),
+        memo=os.getenv("BITMART_MEMO")
+    ))
+    store = KlineStore(bitmart, args.store)
+    end = int(time.time())
+    start = end - int(args.days * 86400)
+    for symbol in args.symbols:
+        store.fetch(symbol, args.step, start, end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""Burst-load test of the signal pipeline against an offline exchange
+
+Usage:
+    python load_generator.py [--rates 1 2 5 10 20] [--step-seconds 10] \\
+        [--symbols 30] [--duplicate-ratio 0.1] [--cancel-ratio 0.2] \\
+        [--latency 0.05] [--order-spacing 1.0] [--latency-limit 10] \\
+        [--min-completion 0.9]
+
+Builds signal and cancellation messages in the channel's format and feeds
+them into SignalMonitor the way the Telegram handler does, one rate step
+after the other. Orders go to an OfflineExchange. For each step it reports
+the offered and completed rates and the latency from message to finished
+execution, then the throughput the monitor sustained, the rate at which it
+broke down, the monitor's own memory after each step (the offline
+exchange's is left out) and the overall peak. A step breaks down when p95
+latency passes the limit, the queue overflows or doesn't drain, or
+completions fall below --min-completion of the messages the monitor
+executes; repeats of a recent signal and signals superseded by a queued
+cancellation are dropped by the monitor and not waited for.
+"""
+from config import Config, TelegramConfig, TradingConfig, RuntimeConfig
+from ingest_queue import RawMessage
+from metrics import metrics
+from offline_exchange import OfflineExchange
+from signal_monitor import SignalMonitor
+from collections import defaultdict, deque
+from typing import Dict, List
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import resource
+import string
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+def make_symbols(count: int, rng: random.Random) -> Dict[str, float]:
+    """Symbols with letters only (the cancellation format allows no digits) and starting prices"""
+    names = set()
+    while len(names) < count:
+        names.add(''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 5))))
+    return {f"{name}USDT": 10 ** rng.uniform(-2, 4) for name in sorted(names)}
+
+class MessageFactory:
+    """Messages in the formats parse_signal and parse_cancellation accept"""
+
+    def __init__(self, exchange: OfflineExchange, duplicate_ratio: float, cancel_ratio: float,
+                 zone_ratio: float = 0.5, skew: float = 1.1, seed: int = 0):
+        self.exchange = exchange
+        self.symbols = list(exchange.prices)
+        # Zipf-like symbol mix: a few symbols get most of the signals
+        self.weights = [1 / (rank + 1) ** skew for rank in range(len(self.symbols))]
+        self.duplicate_ratio = duplicate_ratio
+        self.cancel_ratio = cancel_ratio
+        self.zone_ratio = zone_ratio
+        self.rng = random.Random(seed)
+        self.recent = deque(maxlen=50)  # (symbol, text) of recent signals
+
+    def next(self):
+        """Returns (kind, symbol, text) with kind 'signal', 'duplicate' or 'cancellation'"""
+        roll = self.rng.random()
+        if self.recent and roll < self.cancel_ratio:
+            symbol, _ = self.rng.choice(self.recent)
+            return 'cancellation', symbol, f"#{symbol[:-4]}/USDT Manually Cancelled"
+        if self.recent and roll < self.cancel_ratio + self.duplicate_ratio:
+            symbol, text = self.recent[-1]
+            return 'duplicate', symbol, text
+
+        symbol = self.rng.choices(self.symbols, self.weights)[0]
+        text = self.signal_text(symbol)
+        self.recent.append((symbol, text))
+        return 'signal', symbol, text
+
+    def signal_text(self, symbol: str) -> str:
+        price = self.exchange.prices[symbol]
+        is_short = self.rng.random() < 0.5
+        direction = -1 if is_short else 1
+        digits = max(2, 6 - len(str(int(price))))
+        fmt = lambda value: f"{value:.{digits}f}"
+        if self.rng.random() < self.zone_ratio:
+            entry = f"Entry zone: {fmt(price * 0.998)} - {fmt(price * 1.002)}"
+        else:
+            entry = f"Entry: {fmt(price)}"
+        targets = "\n".join(f"Target {i}: {fmt(price * (1 + direction * 0.01 * i))}" for i in (1, 2, 3))
+        return (
+            f"{symbol} {'SHORT' if is_short else 'LONG'}\n"
+            f"Leverage: Cross {self.rng.choice((10, 20, 25))}x\n"
+            f"{entry}\n{targets}\n"
+            f"Stoploss: {fmt(price * (1 - direction * 0.02))}"
+        )
+
+class LoadTest:
+    def __init__(self, monitor: SignalMonitor, factory: MessageFactory):
+        self.monitor = monitor
+        self.factory = factory
+        self.ids = itertools.count(1)
+        self.pending_signals = {}  # message id -> submit time
+        self.pending_cancellations = defaultdict(deque)  # symbol -> submit times
+        self.latencies = []  # Completed executions of the current step
+        self.completions = []  # Their completion times
+        self.dropped = 0  # Signals of the current step the monitor dropped without executing
+        self._wrap_handlers()
+
+    def _wrap_handlers(self):
+        handlers = self.monitor.pipeline.handlers
+        execute, cancel = handlers['signal'], handlers['cancellation']
+
+        async def timed_signal(signal):
+            try:
+                await execute(signal)
+            finally:
+                submitted = self.pending_signals.pop(signal.get('message_id'), None)
+                if submitted is not None:
+                    self.record(submitted)
+
+        async def timed_cancellation(symbol):
+            try:
+                await cancel(symbol)
+            finally:
+                if self.pending_cancellations[symbol]:
+                    self.record(self.pending_cancellations[symbol].popleft())
+
+        handlers['signal'], handlers['cancellation'] = timed_signal, timed_cancellation
+
+        # Signals the monitor drops never complete: repeats of a recent signal, and
+        # signals superseded by a cancellation while queued
+        pipeline = self.monitor.pipeline
+        classify = pipeline.classify
+
+        def counted_classify(message):
+            classified = classify(message)
+            if classified is None:
+                self.drop(message.message_id)
+            return classified
+
+        pipeline.classify = counted_classify
+        pipeline.on_superseded = lambda work: self.drop(work[1].get('message_id'))
+
+    def drop(self, message_id: int):
+        if self.pending_signals.pop(message_id, None) is not None:
+            self.dropped += 1
+
+    def record(self, submitted: float):
+        now = time.monotonic()
+        self.latencies.append(now - submitted)
+        self.completions.append(now)
+
+    def backlog(self) -> int:
+        return len(self.pending_signals) + sum(len(q) for q in self.pending_cancellations.values())
+
+    async def run_step(self, rate: float, seconds: float, drain: float) -> dict:
+        self.latencies = []
+        self.completions = []
+        self.dropped = 0
+        backlog_before = self.backlog()
+        offered = expected = 0
+        started = time.monotonic()
+        deadline = started + seconds
+        next_at = started
+        while next_at < deadline:
+            kind, symbol, text = self.factory.next()
+            message_id = next(self.ids)
+            now = time.monotonic()
+            if kind == 'signal':
+                self.pending_signals[message_id] = now
+                expected += 1
+            elif kind == 'cancellation':
+                self.pending_cancellations[symbol].append(now)
+                expected += 1
+            # Same call the Telegram handler makes
+            self.monitor._on_message(RawMessage(message_id, text))
+            offered += 1
+            next_at += 1 / rate
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        elapsed = time.monotonic() - started
+
+        # Let the queue drain so the next step starts clean
+        drain_deadline = time.monotonic() + drain
+        while self.backlog() and time.monotonic() < drain_deadline:
+            await asyncio.sleep(0.1)
+
+        expected -= self.dropped
+        latencies = sorted(self.latencies)
+        return {
+            'rate': rate,
+            'offered_per_second': offered / elapsed,
+            'completed_per_second': self.throughput(elapsed / max(expected, 1)),
+            'expected_per_second': expected / elapsed,  # Offered less what the monitor drops unexecuted
+            'dropped': self.dropped,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'max': latencies[-1] if latencies else None,
+            'backlog': self.backlog() - backlog_before,
+        }
+
+    def throughput(self, interval: float) -> float:
+        """Completions per second over the span they finished in, drain included
+
+        Measured from the first completion rather than the step start, so a
+        constant per-message latency doesn't read as lost throughput; a paced
+        run that keeps up completes one message per submit interval.
+        """
+        if not self.completions:
+            return 0.0
+        return len(self.completions) / (self.completions[-1] - self.completions[0] + interval)
+
+def percentile(values: List[float], q: float):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+def monitor_memory() -> int:
+    """Traced bytes held right now, less what the offline exchange and the message factory hold"""
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, OfflineExchange.__init__.__code__.co_filename, all_frames=True),
+        tracemalloc.Filter(False, __file__),
+    ])
+    return sum(stat.size for stat in snapshot.statistics('filename'))
+
+def overflows() -> int:
+    return int(sum(value for (name, _), value in metrics.counters.items() if name == 'ingest_queue_overflow_total'))
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    exchange = OfflineExchange(prices=make_symbols(args.symbols, rng), latency=args.latency, seed=args.seed)
+    if args.no_rate_limit:
+        exchange.rate_limiter.limits = {}
+        exchange.rate_limiter.default = (1e9, 1)
+
+    config = Config(
+        telegram=TelegramConfig(api_id="0", api_hash="offline", phone="", channel_username="0"),
+        bitmart=exchange.config,
+        trading=TradingConfig(order_spacing=args.order_spacing),
+        runtime=RuntimeConfig(audit_path="")
+    )
+    config.ingest.workers = args.workers
+    monitor = SignalMonitor(config, bitmart=exchange)
+    factory = MessageFactory(exchange, args.duplicate_ratio, args.cancel_ratio, seed=args.seed)
+    test = LoadTest(monitor, factory)
+
+    await asyncio.to_thread(monitor.balance.seed)
+    monitor.pipeline.start()
+    reconciler = asyncio.create_task(monitor.reconciler.run())
+
+    steps = []
+    breakdown = None
+    try:
+        for rate in args.rates:
+            dropped_before = overflows()
+            step = await test.run_step(rate, args.step_seconds, args.drain)
+            step['overflows'] = overflows() - dropped_before
+            step['monitor_memory'] = monitor_memory()
+            steps.append(step)
+            p95 = step['p95'] if step['p95'] is not None else float('inf')
+            logger.warning(
+                f"rate {rate:>6g}/s: offered {step['offered_per_second']:.2f}/s "
+                f"({step['expected_per_second']:.2f}/s to execute, {step['dropped']} dropped), "
+                f"completed {step['completed_per_second']:.2f}/s, p50 {fmt(step['p50'])}, "
+                f"p95 {fmt(step['p95'])}, left over {step['backlog']}, overflows {step['overflows']}"
+            )
+            # Completions falling behind what was offered is a breakdown even if the queue drains later
+            lagging = step['completed_per_second'] < args.min_completion * step['expected_per_second']
+            if p95 > args.latency_limit or step['overflows'] or step['backlog'] > 0 or lagging:
+                breakdown = rate
+                break
+    finally:
+        reconciler.cancel()
+        await monitor.pipeline.stop()
+
+    sustained = [s for s in steps if s['rate'] != breakdown]
+    return {
+        'steps': steps,
+        'sustained_rate': max((s['rate'] for s in sustained), default=None),
+        'sustained_completed_per_second': max((s['completed_per_second'] for s in sustained), default=None),
+        'breakdown_rate': breakdown,
+        'exchange_requests': exchange.requests,
+        'monitor_memory': max((s['monitor_memory'] for s in steps), default=0),
+    }
+
+def fmt(seconds) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}s"
+
+def main():
+    parser = argparse.ArgumentParser(description="Burst-load the signal pipeline against an offline exchange")
+    parser.add_argument('--rates', type=float, nargs='+', default=[0.5, 1, 2, 5, 10, 20], help="Messages per second, one step each")
+    parser.add_argument('--step-seconds', type=float, default=10.0)
+    parser.add_argument('--drain', type=float, default=30.0, help="Seconds to wait for the backlog after each step")
+    parser.add_argument('--symbols', type=int, default=30)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--cancel-ratio', type=float, default=0.2)
+    parser.add_argument('--latency', type=float, default=0.05, help="Simulated seconds per exchange request")
+    parser.add_argument('--no-rate-limit', action='store_true', help="Ignore BitMart's request limits")
+    parser.add_argument('--order-spacing', type=float, default=TradingConfig.order_spacing)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--latency-limit', type=float, default=10.0, help="p95 seconds above which a step counts as broken down")
+    parser.add_argument('--min-completion', type=float, default=0.9,
+                        help="Share of the offered rate a step must complete within the step to count as sustained")
+    parser.add_argument('--log-level', default='WARNING', help="Level for the monitor's own logging")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # force: signal_monitor configures logging at import
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', force=True)
+    logger.setLevel(logging.WARNING)
+
+    # Deep enough stacks that allocations made inside the offline exchange can be told apart
+    tracemalloc.start(32)
+    result = asyncio.run(run(args))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Sustained: {result['sustained_completed_per_second'] or 0:.2f} msg/s completed "
+          f"(step offering {result['sustained_rate']} msg/s)")
+    print(f"Broke down at: {result['breakdown_rate'] or 'not reached'} msg/s")
+    print(f"Exchange requests: {result['exchange_requests']}")
+    # ru_maxrss is in kilobytes on Linux
+    print(f"Monitor memory after a step: {result['monitor_memory'] / 1e6:.1f} MB at most, "
+          f"peak Python memory: {peak / 1e6:.1f} MB (includes the offline exchange), "
+          f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3:.1f} MB")
+
+if __name__ == "__main__":
+    main()
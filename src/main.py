@@ -1,9 +1,9 @@
-from config import Config, TelegramConfig, BitmartConfig
+from config import Config, TelegramConfig, BitmartConfig, TradingConfig, SizingConfig, EntryConfig, MetricsConfig, DiagnosticsConfig, RuntimeConfig, ShadowConfig, BridgeConfig, KillSwitchConfig, AttributionConfig, load_trading_config, validate_trading_config
 from signal_monitor import SignalMonitor
+from signal_bridge import run_event_loop
 from dotenv import load_dotenv
 import os
 import logging
-import asyncio
 
 async def main():
     # Load environment variables
@@ -17,23 +17,80 @@ async def main():
     logger = logging.getLogger(__name__)
     
     try:
+        # Trading parameters come from a file (e.g. written by param_sweep.py) if one is given;
+        # the file is then reloaded on change and on SIGHUP
+        if os.getenv("TRADING_CONFIG"):
+            trading = load_trading_config(os.getenv("TRADING_CONFIG"))
+        else:
+            trading = TradingConfig(
+                sizing=SizingConfig(
+                    mode=os.getenv("SIZING_MODE", "fixed"),
+                    usdt_value=float(os.getenv("SIZING_USDT_VALUE", "15")),
+                    equity_percent=float(os.getenv("SIZING_EQUITY_PERCENT", "1")),
+                    risk_percent=float(os.getenv("SIZING_RISK_PERCENT", "0.5"))
+                ),
+                entry=EntryConfig(
+                    mode=os.getenv("ENTRY_MODE", "market"),
+                    timeout=float(os.getenv("ENTRY_TIMEOUT", "30")),
+                    on_timeout=os.getenv("ENTRY_ON_TIMEOUT", "market")
+                )
+            )
+            validate_trading_config(trading)
+
         # Create config
         config = Config(
             telegram=TelegramConfig(
                 api_id=os.getenv("TELEGRAM_API_ID"),
                 api_hash=os.getenv("TELEGRAM_API_HASH"),
                 phone=os.getenv("TELEGRAM_PHONE"),
-                channel_username=os.getenv("TELEGRAM_CHANNEL")
+                channel_username=os.getenv("TELEGRAM_CHANNEL"),  # One or more comma-separated channel ids
+                # Comma-separated session names, each logged in separately
+                sessions=[s.strip() for s in os.getenv("TELEGRAM_SESSIONS", "signal_monitor_session").split(",")]
             ),
             bitmart=BitmartConfig(
                 api_key=os.getenv("BITMART_API_KEY"),
                 api_secret=os.getenv("BITMART_API_SECRET"),
                 memo=os.getenv("BITMART_MEMO")
+            ),
+            trading=trading,
+            metrics=MetricsConfig(
+                enabled=bool(os.getenv("METRICS_PORT")),
+                port=int(os.getenv("METRICS_PORT", "9108"))
+            ),
+            diagnostics=DiagnosticsConfig(
+                enabled=os.getenv("DIAGNOSTICS", "0") == "1"
+            ),
+            runtime=RuntimeConfig(
+                path=os.getenv("TRADING_CONFIG")
+            ),
+            shadow=ShadowConfig(
+                # Comma-separated channel ids traded on paper alongside the live channels
+                channels=[int(c) for c in os.getenv("SHADOW_CHANNELS", "").split(",") if c.strip()],
+                equity=float(os.getenv("SHADOW_EQUITY", "10000")),
+                trading_path=os.getenv("SHADOW_TRADING_CONFIG")
+            ),
+            bridge=BridgeConfig(
+                # 'ingest' and 'execute' run Telegram and order execution as two processes
+                role=os.getenv("PROCESS_ROLE", "single"),
+                socket_path=os.getenv("BRIDGE_SOCKET", "data/signal_bridge.sock")
+            ),
+            kill_switch=KillSwitchConfig(
+                admin_socket=os.getenv("ADMIN_SOCKET", "data/admin.sock"),
+                telegram_command=os.getenv("KILL_SWITCH_COMMAND", "/flatten")
+            ),
+            attribution=AttributionConfig(
+                path=os.getenv("ATTRIBUTION_PATH", "data/attribution")
             )
         )
+        if config.bridge.role not in ("single", "ingest", "execute"):
+            raise ValueError(f"Unknown PROCESS_ROLE: {config.bridge.role}")
         
         # Create and start monitor
         monitor = SignalMonitor(config)
+        if config.bridge.role == "execute":
+            logger.info("Starting execution process...")
+            await monitor.run_executor()
+            return
         logger.info("Connecting to Telegram...")
         await monitor.connect()
         logger.info("Starting channel monitor...")
@@ -44,4 +101,5 @@ async def main():
         raise
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    # Each process of a split deployment gets its own loop, on uvloop when installed
+    run_event_loop(main(), use_uvloop=os.getenv("UVLOOP", "1") == "1")
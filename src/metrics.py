@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# For in-host handoffs that take microseconds
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 1.0)
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+class Metrics:
+    """In-process metrics registry rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.gauges: Dict[tuple, float] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        key = self._key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+
+    def get_gauge(self, name: str, **labels) -> float:
+        return self.gauges.get(self._key(name, labels), 0.0)
+
+    @staticmethod
+    def _format(name: str, labels: tuple, extra: tuple = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return name
+        label_str = ",".join(f'{k}="{v}"' for k, v in pairs)
+        return f"{name}{{{label_str}}}"
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        lines = []
+        for (name, labels), value in sorted(self.gauges.items()):
+            lines.append(f"{self._format(name, labels)} {value}")
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{self._format(name, labels)} {value}")
+        for (name, labels), hist in sorted(self.histograms.items(), key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f"{self._format(name + '_bucket', labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{self._format(name + '_bucket', labels, (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"{self._format(name + '_count', labels)} {hist.count}")
+            lines.append(f"{self._format(name + '_sum', labels)} {hist.sum}")
+        return "\n".join(lines) + "\n"
+
+# Shared registry for the whole process
+metrics = Metrics()
+
+async def serve_metrics(host: str, port: int) -> asyncio.AbstractServer:
+    """Serve the registry over plain HTTP on a local port"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # We answer every request with the metrics page, so just drain the headers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = metrics.render().encode('utf-8')
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode('utf-8')
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error serving metrics: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
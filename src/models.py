@@ -1,11 +1,17 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from enum import Enum
+import time
 
 class PositionSide(Enum):
     LONG = "LONG"
     SHORT = "SHORT"
 
+class TradeStatus(Enum):
+    OPENING = "opening"  # Entry or brackets still being submitted
+    OPEN = "open"
+    CLOSED = "closed"
+
 @dataclass
 class TrailingConfig:
     stop: str
@@ -25,4 +31,36 @@ class Signal:
         """Convert position side to BitMart API format"""
         if self.side == PositionSide.LONG:
             return 1  # buy_open_long
-        return 4  # sell_open_short 
\ No newline at end of file
+        return 4  # sell_open_short
+
+@dataclass
+class Trade:
+    """Local record of a position opened by the bot and its bracket orders"""
+    symbol: str
+    side: int  # 1=buy_open_long, 4=sell_open_short
+    size: int
+    leverage: str
+    entry_price: float
+    stop_loss: float
+    take_profits: List[float]
+    notional: float = 0.0  # Position value in USDT at entry
+    status: TradeStatus = TradeStatus.OPENING
+    opened_at: float = field(default_factory=time.time)
+    brackets: Dict[str, dict] = field(default_factory=dict)  # leg name -> order info
+    market_price: float = 0.0  # Last price when the entry started
+    slippage: float = 0.0  # Average fill against market_price, percent (positive = worse)
+    config_version: str = ""  # Trading config version the trade was opened with
+    channel_id: int = 0  # Signal channel the trade came from
+    message_id: int = 0  # Signal message, so edits of it can amend the brackets
+    signal_stop_loss: float = 0.0  # Stop loss as posted; stop_loss moves when the stop trails
+    filled_at: float = 0.0  # Unix time the entry filled
+    protected_at: float = 0.0  # Unix time the stop loss order was accepted
+
+    @property
+    def is_short(self) -> bool:
+        return self.side == 4
+
+    @property
+    def close_side(self) -> int:
+        """Side used by closing orders (2=buy_close_short, 3=sell_close_long)"""
+        return 2 if self.is_short else 3
@@ -0,0 +1,274 @@
+from bitmart_client import BitmartClient
+from config import BitmartConfig
+from json_codec import dumpb, dumps, loads
+from collections import deque
+from typing import Dict
+import itertools
+import random
+import threading
+import time
+
+class OfflineResponse:
+    """The parts of requests.Response the client uses"""
+
+    def __init__(self, payload: dict, status_code: int = 200):
+        self.status_code = status_code
+        self.content = dumpb(payload)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8')
+
+    def json(self) -> dict:
+        return loads(self.content)
+
+class OfflineExchange(BitmartClient):
+    """BitmartClient answered by an in-memory exchange instead of the API
+
+    Only the transport is replaced: every client method, the rate limiter,
+    signing and JSON handling run as in production, and each request costs
+    `latency` seconds. Market orders and marketable limit orders fill at the
+    last price, which random-walks on every price read. Plan, trail and TP/SL
+    orders are recorded but never trigger. Fills are logged in the shape of
+    BitMart's trade history, charged at `taker_fee`.
+    """
+
+    def __init__(self, config: BitmartConfig = None, prices: Dict[str, float] = None,
+                 latency: float = 0.05, equity: float = 10000.0, volatility: float = 0.0005,
+                 seed: int = 0):
+        super().__init__(config or BitmartConfig(api_key="offline", api_secret="offline", memo="offline"))
+        self.prices = dict(prices or {"BTCUSDT": 60000.0, "ETHUSDT": 3000.0})
+        # Contract specs are fixed from the starting prices
+        self.specs = {
+            symbol: (self.contract_size(price), 10 ** (len(str(int(price))) - 6))
+            for symbol, price in self.prices.items()
+        }
+        self.latency = latency
+        self.volatility = volatility
+        self.equity = equity
+        self.rng = random.Random(seed)
+        self.orders = {}  # order_id -> order, the most recent max_orders only
+        self.max_orders = 10000
+        self.plan_orders = {}  # order_id -> plan, trail or TP/SL order
+        self.positions = {}  # (symbol, position_type) -> {'size', 'entry_price', 'leverage', 'opened_at'}
+        self.taker_fee = 0.0
+        self.trade_log = deque(maxlen=self.max_orders)  # Fills, oldest first
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()  # Requests arrive from worker threads too
+        self._routes = {
+            "/system/time": self._system_time,
+            "/contract/public/details": self._details,
+            "/contract/public/kline": lambda params, body: (1000, []),
+            "/contract/private/submit-leverage": self._submit_leverage,
+            "/contract/private/submit-order": self._submit_order,
+            "/contract/private/order": self._order,
+            "/contract/private/cancel-order": self._cancel_order,
+            "/contract/private/cancel-orders": self._cancel_orders,
+            "/contract/private/cancel-plan-order": self._cancel_plan,
+            "/contract/private/cancel-trail-order": self._cancel_plan,
+            "/contract/private/get-open-orders": self._open_orders,
+            "/contract/private/position": self._position,
+            "/contract/private/assets-detail": self._assets,
+            "/contract/private/submit-plan-order": self._submit_plan,
+            "/contract/private/submit-tp-sl-order": self._submit_plan,
+            "/contract/private/submit-trail-order": self._submit_plan,
+            "/contract/private/modify-tp-sl-order": self._modify_plan,
+            "/contract/private/modify-plan-order": self._modify_plan,
+            "/contract/private/current-plan-order": self._current_plans,
+            "/contract/private/trades": self._trades,
+        }
+
+    @staticmethod
+    def contract_size(price: float) -> float:
+        """Contract size giving a notional of roughly 1-10 USDT per contract"""
+        size = 1.0
+        while price * size > 10:
+            size /= 10
+        while price * size < 1:
+            size *= 10
+        return size
+
+    def _request(self, method: str, endpoint: str, params: dict = None,
+                 body: dict = None, signed: bool = True) -> OfflineResponse:
+        self.rate_limiter.acquire(endpoint)
+        if signed:
+            # Keep the client-side cost of a signed request
+            self._get_headers(dumps(body) if body else '')
+        if self.latency:
+            time.sleep(self.latency)
+
+        handler = self._routes.get(endpoint)
+        if handler is None:
+            return OfflineResponse({"code": 30000, "message": f"Not found: {endpoint}"}, 404)
+        with self._lock:
+            self.requests += 1
+            code, data = handler(params or {}, body or {})
+        return OfflineResponse({"code": code, "message": "Ok" if code == 1000 else "Error", "data": data})
+
+    def _next_id(self) -> str:
+        return str(next(self._ids))
+
+    def _system_time(self, params, body):
+        return 1000, {"server_time": int(time.time() * 1000)}
+
+    def _details(self, params, body):
+        symbol = params.get('symbol')
+        symbols = [symbol] if symbol else list(self.prices)
+        contracts = []
+        for name in symbols:
+            if name not in self.prices:
+                continue
+            price = self.prices[name] = self.prices[name] * (1 + self.rng.gauss(0, self.volatility))
+            contract_size, precision = self.specs[name]
+            contracts.append({
+                "symbol": name,
+                "last_price": f"{price:.8g}",
+                "contract_size": f"{contract_size:g}",
+                "min_volume": "1",
+                "price_precision": f"{precision:g}",
+                "vol_precision": "1",
+            })
+        return 1000, {"symbols": contracts}
+
+    def _submit_leverage(self, params, body):
+        return 1000, {"symbol": body['symbol'], "leverage": body['leverage'], "open_type": body['open_type']}
+
+    def _submit_order(self, params, body):
+        symbol, side, size = body['symbol'], int(body['side']), int(body['size'])
+        if symbol not in self.prices:
+            return 40004, None
+        order_id = self._next_id()
+        order = {
+            "order_id": order_id, "symbol": symbol, "side": side, "type": body['type'],
+            "leverage": body['leverage'], "size": str(size), "price": body.get('price', "0"),
+            "deal_size": "0", "deal_avg_price": "0", "state": 2,
+            "client_order_id": body.get('client_order_id', ""),
+        }
+        self.orders[order_id] = order
+        if len(self.orders) > self.max_orders:
+            del self.orders[next(iter(self.orders))]
+        price = self.prices[symbol]
+        buys = side in (1, 2)
+        limit = float(order['price'])
+        if body['type'] == 'market' or (limit >= price if buys else limit <= price):
+            self._fill(order, price if body['type'] == 'market' else limit)
+        return 1000, {"order_id": order_id, "price": order['price']}
+
+    def _fill(self, order: dict, price: float):
+        order.update(deal_size=order['size'], deal_avg_price=f"{price:.8g}", state=4)
+        side, size = order['side'], int(order['size'])
+        position_type = 1 if side in (1, 3) else 2
+        key = (order['symbol'], position_type)
+        position = self.positions.get(key)
+        contract_size = self.specs.get(order['symbol'], (1.0, 0))[0]
+        profit = 0.0
+        if side in (2, 3) and position:
+            direction = 1 if side == 3 else -1
+            profit = direction * (price - position['entry_price']) * min(size, position['size']) * contract_size
+        self.trade_log.append({
+            "order_id": order['order_id'], "client_order_id": order.get('client_order_id', ""),
+            "symbol": order['symbol'], "side": side, "price": f"{price:.8g}", "vol": str(size),
+            "paid_fees": f"{price * size * contract_size * self.taker_fee:.8f}",
+            "realised_profit": f"{profit:.8f}", "create_time": int(time.time() * 1000),
+        })
+        if side in (1, 4):
+            if position:
+                total = position['size'] + size
+                position['entry_price'] = (position['entry_price'] * position['size'] + price * size) / total
+                position['size'] = total
+            else:
+                self.positions[key] = {"size": size, "entry_price": price, "leverage": order['leverage'],
+                                       "opened_at": int(time.time() * 1000)}
+        elif position:
+            position['size'] -= min(size, position['size'])
+            if position['size'] == 0:
+                del self.positions[key]
+                # The exchange cancels a closed position's brackets
+                for order_id, plan in list(self.plan_orders.items()):
+                    if plan['symbol'] == order['symbol']:
+                        del self.plan_orders[order_id]
+
+    def _order(self, params, body):
+        order = self.orders.get(params.get('order_id'))
+        return (1000, order) if order else (40035, None)
+
+    def _cancel_order(self, params, body):
+        order = self.orders.get(body.get('order_id'))
+        if not order or order['state'] == 4:
+            return 40035, None
+        order['state'] = 4
+        return 1000, None
+
+    def _cancel_orders(self, params, body):
+        for order in self.orders.values():
+            if order['state'] == 2 and order['symbol'] == body.get('symbol'):
+                order['state'] = 4
+        return 1000, None
+
+    def _cancel_plan(self, params, body):
+        plan = self.plan_orders.pop(body.get('order_id'), None)
+        return (1000, None) if plan else (40035, None)
+
+    def _open_orders(self, params, body):
+        return 1000, [
+            order for order in self.orders.values()
+            if order['state'] == 2 and params.get('symbol') in (None, order['symbol'])
+        ]
+
+    def _position(self, params, body):
+        return 1000, [
+            {
+                "symbol": symbol, "position_type": position_type, "current_amount": str(position['size']),
+                "entry_price": f"{position['entry_price']:.8g}", "leverage": position['leverage'],
+                "margin_type": "Cross",
+                "position_value": f"{position['size'] * position['entry_price'] * self.specs[symbol][0]:.8f}",
+                "open_timestamp": position['opened_at'],
+            }
+            for (symbol, position_type), position in self.positions.items()
+            if params.get('symbol') in (None, symbol)
+        ]
+
+    def _assets(self, params, body):
+        margin = sum(
+            p['size'] * p['entry_price'] * self.specs[symbol][0] / float(p['leverage'])
+            for (symbol, _), p in self.positions.items()
+        )
+        return 1000, [{
+            "currency": "USDT", "equity": f"{self.equity:.2f}",
+            "available_balance": f"{self.equity - margin:.2f}", "position_deposit": f"{margin:.2f}",
+        }]
+
+    def _trades(self, params, body):
+        start = params.get('start_time', 0) * 1000
+        end = params.get('end_time', float('inf')) * 1000
+        return 1000, [
+            fill for fill in self.trade_log
+            if fill['symbol'] == params.get('symbol') and start <= fill['create_time'] <= end
+        ]
+
+    def _submit_plan(self, params, body):
+        order_id = self._next_id()
+        self.plan_orders[order_id] = {
+            **body,
+            "order_id": order_id,
+            "type": body.get('type', 'plan' if 'trigger_price' in body else 'trail'),
+            "size": str(body['size']),
+            "trigger_price": body.get('trigger_price') or body.get('activation_price'),
+        }
+        return 1000, {"order_id": order_id}
+
+    def _modify_plan(self, params, body):
+        plan = self.plan_orders.get(body.get('order_id'))
+        if not plan:
+            return 40035, None
+        plan['trigger_price'] = body['trigger_price']
+        return 1000, {"order_id": plan['order_id']}
+
+    def _current_plans(self, params, body):
+        plan_type = params.get('plan_type')
+        return 1000, [
+            plan for plan in self.plan_orders.values()
+            if params.get('symbol') in (None, plan['symbol'])
+            and (plan_type is None or (plan['type'] in ('take_profit', 'stop_loss')) == (plan_type == 'profit_loss'))
+        ]
@@ -0,0 +1,167 @@
+"""Parallel sweep of sizing and exit parameters over historical signals
+
+Usage:
+    python param_sweep.py --channel CHANNEL_ID \\
+        --usdt-value 10 15 25 --callback-rate 1 2 3 --activation 1 2 --large-ratio 1 1.5 \\
+        [--random 200] [--rank-by total_pnl] [--workers 8] \\
+        [--table sweep_results.csv] [--output-config trading.json]
+
+The best row is written as a trading config the live bot loads with
+TRADING_CONFIG=trading.json.
+"""
+from backtester import Backtester, BacktestParams, load_contract_specs, summarize
+from bitmart_client import BitmartClient
+from config import BitmartConfig, save_trading_config
+from kline_store import KlineStore
+from signal_store import SignalStore
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from dotenv import load_dotenv
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+import argparse
+import csv
+import itertools
+import logging
+import os
+import random
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], dict]:
+    """Copy arrays into shared memory once
+
+    Returns:
+        The shared memory blocks (keep them alive and unlink them when done)
+        and a picklable spec workers use to attach to them
+    """
+    blocks, spec = [], {}
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        blocks.append(block)
+        spec[name] = (block.name, values.shape, values.dtype.str)
+    return blocks, spec
+
+# Per-worker state, set by _init_worker
+_worker_blocks = []
+_worker_backtester = None
+
+def _init_worker(spec: dict, step: int):
+    """Attach to the shared arrays without copying them"""
+    global _worker_backtester
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    _worker_backtester = Backtester(arrays, step)
+
+def _evaluate(params: BacktestParams) -> dict:
+    summary = summarize(_worker_backtester.run(params))
+    return {**asdict(params), **summary}
+
+def build_grid(args) -> List[BacktestParams]:
+    """Full grid of the given values, or random draws within their ranges"""
+    axes = {
+        'usdt_value': args.usdt_value,
+        'callback_rate': args.callback_rate,
+        'trail_activation_target': args.activation,
+        'large_value_ratio': args.large_ratio,
+    }
+    if not args.random:
+        names = list(axes)
+        return [
+            BacktestParams(**dict(zip(names, values)), horizon=args.horizon)
+            for values in itertools.product(*axes.values())
+        ]
+
+    rng = random.Random(args.seed)
+    grid = []
+    for _ in range(args.random):
+        grid.append(BacktestParams(
+            usdt_value=rng.uniform(min(args.usdt_value), max(args.usdt_value)),
+            # The exchange accepts callback rates with one decimal
+            callback_rate=round(rng.uniform(min(args.callback_rate), max(args.callback_rate)), 1),
+            trail_activation_target=rng.choice(args.activation),
+            large_value_ratio=rng.uniform(min(args.large_ratio), max(args.large_ratio)),
+            horizon=args.horizon
+        ))
+    return grid
+
+def run_sweep(backtester: Backtester, grid: List[BacktestParams], workers: int, rank_by: str) -> List[dict]:
+    """Evaluate every parameter set on a process pool sharing the backtest arrays"""
+    blocks, spec = share_arrays(backtester.arrays())
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(spec, backtester.step)) as pool:
+            rows = list(pool.map(_evaluate, grid, chunksize=max(1, len(grid) // (workers * 4))))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return sorted(rows, key=lambda row: row.get(rank_by) if row.get(rank_by) is not None else float('-inf'), reverse=True)
+
+def write_table(rows: List[dict], path: str):
+    columns = [key for key in rows[0] if key != 'tp_hit_rates'] + ['tp1_rate', 'tp2_rate', 'tp3_rate']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            rates = row.get('tp_hit_rates') or [None, None, None]
+            writer.writerow({**row, 'tp1_rate': rates[0], 'tp2_rate': rates[1], 'tp3_rate': rates[2]})
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep sizing and exit parameters over stored signals")
+    parser.add_argument('--channel', type=int, action='append', help="Channel ids (default: all)")
+    parser.add_argument('--signals', default=os.path.join('data', 'signals'))
+    parser.add_argument('--klines', default=os.path.join('data', 'klines'))
+    parser.add_argument('--step', type=int, default=1, help="Candle interval in minutes")
+    parser.add_argument('--since', type=int)
+    parser.add_argument('--until', type=int)
+    parser.add_argument('--usdt-value', type=float, nargs='+', default=[15.0])
+    parser.add_argument('--callback-rate', type=float, nargs='+', default=[2.0])
+    parser.add_argument('--activation', type=int, nargs='+', default=[1], help="Targets activating the trailing stop")
+    parser.add_argument('--large-ratio', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--horizon', type=int, default=BacktestParams.horizon)
+    parser.add_argument('--random', type=int, default=0, help="Random draws instead of the full grid")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rank-by', default='total_pnl')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--table', default='sweep_results.csv')
+    parser.add_argument('--output-config', default='trading.json')
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    bitmart = BitmartClient(BitmartConfig(
+        api_key=os.getenv("BITMART_API_KEY"),
+        api_secret=os.getenv("BITMART_API_SECRET"),
+        memo=os.getenv("BITMART_MEMO")
+    ))
+    store = SignalStore(args.signals)
+    specs = load_contract_specs(bitmart, os.path.join(args.klines, 'contract_specs.json'))
+    signals = store.load(channels=args.channel, since=args.since, until=args.until)
+    backtester = Backtester.from_stores(signals, store.symbols, KlineStore(bitmart, args.klines), args.step, specs)
+
+    grid = build_grid(args)
+    started = time.time()
+    rows = run_sweep(backtester, grid, args.workers, args.rank_by)
+    logger.info(f"Evaluated {len(grid)} parameter sets on {len(signals['timestamp'])} signals in {time.time() - started:.1f}s")
+
+    write_table(rows, args.table)
+    best = rows[0]
+    save_trading_config(BacktestParams(**{k: best[k] for k in asdict(BacktestParams())}).to_trading_config(), args.output_config)
+    logger.info(f"Best by {args.rank_by}: {best}")
+    logger.info(f"Results in {args.table}, live config in {args.output_config}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+from balance import BalanceCache
+from bitmart_client import BitmartClient, is_bot_order, parse_trade_tag
+from config import ReconcileConfig
+from models import Trade, TradeStatus
+from json_codec import pretty
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class PositionReconciler:
+    """Periodically diff exchange positions and orders against local trade state
+
+    Each pass makes one unfiltered get_position call and one TP/SL order query,
+    compares the result with the trades opened by the bot and repairs drift:
+    closed positions are dropped, orphan positions are closed (if enabled,
+    and only when their orders carry the bot's client order id tag) and
+    missing stop losses are re-placed. Positions already open at startup
+    are adopted by adopt() rather than treated as orphans. The last position snapshot is kept so the
+    signal handlers don't need their own per-symbol position requests, and
+    the account balance is refreshed into the balance cache.
+    """
+
+    def __init__(self, bitmart: BitmartClient, trades: Dict[str, Trade], config: ReconcileConfig,
+                 balance: Optional[BalanceCache] = None,
+                 on_trade_closed: Optional[Callable[[Trade], None]] = None,
+                 on_trade_reduced: Optional[Callable[[Trade, int], None]] = None):
+        self.bitmart = bitmart
+        self.trades = trades  # Shared with SignalMonitor, keyed by symbol
+        self.config = config
+        self.balance = balance
+        self.on_trade_closed = on_trade_closed
+        self.on_trade_reduced = on_trade_reduced  # Called with (trade, contracts still held) after partial closes
+        self.positions = {}  # symbol -> list of open positions from the last pass
+        self.last_sync = 0.0
+        self._repairs_pending = False
+        self.halted = False  # Set by the kill switch: keep tracking closes, but place and close nothing
+        self._wakeup = asyncio.Event()
+        self.logger = logging.getLogger(__name__)
+
+    async def run(self):
+        """Reconcile forever on an adaptive schedule"""
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                self.logger.error(f"Error reconciling positions: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_interval())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def poke(self):
+        """Run the next pass immediately"""
+        self._wakeup.set()
+
+    def _next_interval(self) -> float:
+        """Poll tightly while brackets are pending, relax when idle"""
+        pending = any(t.status == TradeStatus.OPENING for t in self.trades.values())
+        if pending or self._repairs_pending:
+            return self.config.tight_interval
+        return self.config.idle_interval
+
+    def positions_for(self, symbol: str) -> List[dict]:
+        """Open positions for a symbol from the last snapshot"""
+        return self.positions.get(symbol, [])
+
+    async def refresh(self) -> Dict[str, List[dict]]:
+        """Fetch all open positions with a single unfiltered request"""
+        started = time.time()
+        position = await asyncio.to_thread(self.bitmart.get_position)
+        if position.get('code') != 1000:
+            raise ValueError(f"Error getting positions: {position}")
+
+        positions = {}
+        for pos in position.get('data') or []:
+            if int(pos['current_amount']) > 0:
+                positions.setdefault(pos['symbol'], []).append(pos)
+
+        self.positions = positions
+        # The snapshot may predate anything that happened while the request was in flight
+        self.last_sync = started
+        return positions
+
+    async def reconcile(self):
+        """Run one reconciliation pass"""
+        positions = await self.refresh()
+
+        orders = await asyncio.to_thread(self.bitmart.get_plan_orders, plan_type='profit_loss')
+        if orders.get('code') != 1000:
+            raise ValueError(f"Error getting TP/SL orders: {orders}")
+
+        stop_losses = set()
+        tagged = set()  # Symbols with an order placed by the bot
+        for order in orders.get('data') or []:
+            if order.get('type') == 'stop_loss':
+                stop_losses.add(order['symbol'])
+            if is_bot_order(order.get('client_order_id')):
+                tagged.add(order['symbol'])
+
+        if self.balance:
+            assets = await asyncio.to_thread(self.bitmart.get_contract_assets)
+            if not self.balance.update_from_assets(assets):
+                self.logger.error(f"Error refreshing balance: {assets}")
+
+        self._repairs_pending = False
+        for symbol in set(positions) | set(self.trades):
+            trade = self.trades.get(symbol)
+            held = positions.get(symbol)
+
+            if trade and trade.status == TradeStatus.OPENING:
+                # execute_trade is still placing orders for this symbol
+                continue
+
+            if trade and not held:
+                if trade.filled_at > self.last_sync:
+                    # Filled after the snapshot was taken; the next pass will see the position
+                    continue
+                self.logger.info(f"Position for {symbol} is closed on the exchange, dropping local trade")
+                trade.status = TradeStatus.CLOSED
+                del self.trades[symbol]
+                if self.on_trade_closed:
+                    self.on_trade_closed(trade)
+                continue
+
+            if trade and self.on_trade_reduced:
+                remaining = sum(int(pos['current_amount']) for pos in held)
+                if remaining < trade.size:
+                    # Take profits closed part of it
+                    self.on_trade_reduced(trade, remaining)
+
+            if self.halted:
+                continue
+            elif not trade:
+                await self._handle_orphan(symbol, held, symbol in tagged)
+            elif symbol not in stop_losses:
+                await self._replace_stop_loss(trade, held)
+
+    async def _handle_orphan(self, symbol: str, held: List[dict], tagged: bool):
+        """Close a position we have no local record of, if the bot's orders show it opened it"""
+        if not self.config.close_orphans:
+            self.logger.warning(f"Orphan position for {symbol} left open (close_orphans disabled)")
+            return
+        if not tagged:
+            self.logger.warning(f"Orphan position for {symbol} left open: no order of the bot's on it")
+            return
+
+        for pos in held:
+            self.logger.warning("Closing orphan position: %s", pretty(pos))
+            result = await asyncio.to_thread(self.bitmart.close_position, symbol, pos)
+            self.logger.info("Orphan close result: %s", pretty(result))
+        self._repairs_pending = True
+
+    async def adopt(self) -> List[Trade]:
+        """Take over positions opened by the bot before a restart, with their brackets
+
+        A position is the bot's if one of its plan or TP/SL orders carries the
+        bot's client order id tag; the tag also gives the signal it came from.
+        Other positions are left to whoever opened them.
+        """
+        positions = await self.refresh()
+        orders = []
+        for plan_type in ('plan', 'profit_loss'):
+            response = await asyncio.to_thread(self.bitmart.get_plan_orders, plan_type=plan_type)
+            if response.get('code') != 1000:
+                raise ValueError(f"Error getting {plan_type} orders: {response}")
+            data = response.get('data') or []
+            orders += data if isinstance(data, list) else data.get('orders', [])
+
+        adopted = []
+        for symbol, held in positions.items():
+            if symbol in self.trades:
+                continue
+            symbol_orders = [order for order in orders if order.get('symbol') == symbol]
+            if not any(is_bot_order(order.get('client_order_id')) for order in symbol_orders):
+                self.logger.info(f"Position for {symbol} has no order of the bot's, not adopting it")
+                continue
+            trade = self._adopted_trade(symbol, held, symbol_orders)
+            self.trades[symbol] = trade
+            adopted.append(trade)
+            self.logger.info(f"Adopted {symbol} position of {trade.size} contracts "
+                             f"(message {trade.message_id}) with brackets {sorted(trade.brackets)}")
+        return adopted
+
+    @staticmethod
+    def _adopted_trade(symbol: str, held: List[dict], orders: List[dict]) -> Trade:
+        position = held[0]
+        position_type = int(position['position_type'])
+        held = [pos for pos in held if int(pos['position_type']) == position_type]
+        size = sum(int(pos['current_amount']) for pos in held)
+        entry_price = float(position['entry_price'])
+        opened_at = float(position.get('open_timestamp') or 0) / 1000 or time.time()
+        channel_id, message_id = next(
+            (tag for tag in map(parse_trade_tag, (order.get('client_order_id') for order in orders)) if tag),
+            (0, 0)
+        )
+
+        brackets = {'entry': {'order_id': None, 'price': entry_price, 'size': size}}
+        stop_loss = 0.0
+        targets = []
+        for order in orders:
+            bracket = {'order_id': order['order_id'], 'price': float(order.get('trigger_price') or 0),
+                       'size': int(order.get('size') or 0)}
+            if order.get('type') == 'stop_loss':
+                stop_loss = bracket['price']
+                brackets['stop_loss'] = bracket
+            elif 'callback_rate' in order:
+                brackets['trail'] = bracket
+            else:
+                targets.append(bracket)
+        targets.sort(key=lambda bracket: bracket['price'], reverse=position_type == 2)
+        for i, bracket in enumerate(targets, 1):
+            brackets[f'tp{i}'] = bracket
+
+        return Trade(
+            symbol=symbol,
+            side=1 if position_type == 1 else 4,
+            size=size,
+            leverage=str(position['leverage']),
+            entry_price=entry_price,
+            stop_loss=stop_loss,
+            signal_stop_loss=stop_loss,
+            take_profits=[bracket['price'] for bracket in targets],
+            notional=sum(float(pos.get('position_value') or 0) for pos in held),
+            status=TradeStatus.OPEN,
+            opened_at=opened_at,
+            brackets=brackets,
+            config_version="adopted",
+            channel_id=channel_id,
+            message_id=message_id,
+            filled_at=opened_at
+        )
+
+    async def _replace_stop_loss(self, trade: Trade, held: List[dict]):
+        """Re-place a stop loss that is missing on the exchange"""
+        if trade.stop_loss <= 0:
+            # Adopted without a stop loss order: a trigger at 0 would fire at once on a short
+            self.logger.warning(f"Position for {trade.symbol} has no stop loss and no known level to restore, "
+                                f"leaving it unprotected")
+            return
+        size = sum(int(pos['current_amount']) for pos in held)
+        self.logger.warning(f"Stop loss missing for {trade.symbol}, re-placing at {trade.stop_loss} for {size} contracts")
+
+        sl_result = await asyncio.to_thread(
+            self.bitmart.submit_tp_sl_order,
+            symbol=trade.symbol,
+            side=trade.close_side,
+            type="stop_loss",
+            size=size,
+            trigger_price=trade.stop_loss,
+            price_type=1,
+            plan_category=1
+        )
+        self.logger.info("Stop Loss repair result: %s", pretty(sl_result))
+        if sl_result.get('code') == 1000:
+            trade.brackets['stop_loss'] = {
+                'order_id': sl_result.get('data', {}).get('order_id'),
+                'price': trade.stop_loss,
+                'size': size
+            }
+        self._repairs_pending = True
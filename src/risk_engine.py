@@ -0,0 +1,145 @@
+from balance import BalanceCache
+from config import RiskConfig
+from metrics import metrics
+from models import Trade
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RiskRejection:
+    """Why a trade was not admitted"""
+    reason: str  # Limit name, e.g. 'max_symbol_notional'
+    scope: str  # What the limit applies to, e.g. 'BTCUSDT' or 'long'
+    limit: float
+    value: float  # Exposure the trade would have brought the scope to
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        return f"{self.reason} for {self.scope}: {self.value:.2f} > {self.limit:g}"
+
+class RiskEngine:
+    """Running exposure aggregates and pre-trade limit checks
+
+    admit() checks a trade against every limit using only the aggregates
+    and the cached balance, then books its exposure; update() rebooks it
+    after the fill, reduce() as take profits close part of it, and
+    release() removes it on close. Each of these is a
+    constant number of dict updates.
+    """
+
+    def __init__(self, balance: BalanceCache):
+        self.balance = balance
+        self.positions = 0
+        self.total_notional = 0.0
+        self.margin = 0.0
+        self.by_symbol: Dict[str, float] = defaultdict(float)
+        self.by_side: Dict[str, float] = defaultdict(float)
+        self.by_channel: Dict[int, float] = defaultdict(float)
+        self.by_group: Dict[tuple, float] = defaultdict(float)
+        self._booked: Dict[int, tuple] = {}  # id(trade) -> (trade, booked exposure)
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _side(trade: Trade) -> str:
+        return 'short' if trade.is_short else 'long'
+
+    def admit(self, trade: Trade, limits: RiskConfig, replacing: Optional[Trade] = None) -> Optional[RiskRejection]:
+        """Check a trade about to be opened; books it and returns None if it is within limits
+
+        replacing is a booked trade the new one closes first; its exposure is
+        left out of the check, and stays booked until it is released.
+        """
+        booked = self._booked.get(id(replacing)) if replacing is not None else None
+        if booked:
+            self._apply(booked[1], -1)
+        try:
+            rejection = self.check(trade, limits)
+        finally:
+            if booked:
+                self._apply(booked[1], 1)
+        if rejection:
+            metrics.inc('risk_rejections_total', reason=rejection.reason)
+            return rejection
+        self._book(trade, limits.correlation_groups.get(trade.symbol))
+        return None
+
+    def check(self, trade: Trade, limits: RiskConfig) -> Optional[RiskRejection]:
+        notional = trade.notional
+        side = self._side(trade)
+        group = limits.correlation_groups.get(trade.symbol)
+
+        checks = [
+            ('max_positions', 'account', limits.max_positions, self.positions + 1),
+            ('max_total_notional', 'account', limits.max_total_notional, self.total_notional + notional),
+            ('max_symbol_notional', trade.symbol, limits.max_symbol_notional, self.by_symbol[trade.symbol] + notional),
+            ('max_side_notional', side, limits.max_side_notional, self.by_side[side] + notional),
+            ('max_channel_notional', str(trade.channel_id), limits.max_channel_notional,
+             self.by_channel[trade.channel_id] + notional),
+            ('max_symbol_leverage', trade.symbol, limits.max_symbol_leverage.get(trade.symbol, 0),
+             float(trade.leverage)),
+        ]
+        if group:
+            checks.append(('max_group_notional', f"{group}:{side}", limits.max_group_notional,
+                           self.by_group[(group, side)] + notional))
+        if limits.max_margin_percent and self.balance.seeded and self.balance.equity > 0:
+            margin = self.margin + notional / float(trade.leverage)
+            checks.append(('max_margin_percent', 'account', limits.max_margin_percent,
+                           margin / self.balance.equity * 100))
+
+        for reason, scope, limit, value in checks:
+            if limit and value > limit:
+                return RiskRejection(reason, scope, limit, value)
+        return None
+
+    def add(self, trade: Trade, limits: RiskConfig):
+        """Book a trade that is already open, e.g. one adopted at startup, without checking limits"""
+        if id(trade) not in self._booked:
+            self._book(trade, limits.correlation_groups.get(trade.symbol))
+
+    def update(self, trade: Trade):
+        """Rebook a trade whose size or notional changed, e.g. after a partial fill"""
+        booked = self._booked.get(id(trade))
+        if booked:
+            self._apply(booked[1], -1)
+            self._book(trade, booked[1][2])
+
+    def reduce(self, trade: Trade, notional: float):
+        """Rebook a trade with the notional still open, e.g. after a take profit filled"""
+        booked = self._booked.get(id(trade))
+        if booked and notional < booked[1][4]:
+            self._apply(booked[1], -1)
+            self._book(trade, booked[1][2], notional)
+
+    def release(self, trade: Trade):
+        """Remove a closed trade's exposure; safe to call more than once"""
+        booked = self._booked.pop(id(trade), None)
+        if booked:
+            self._apply(booked[1], -1)
+
+    def _book(self, trade: Trade, group: Optional[str], notional: Optional[float] = None):
+        notional = trade.notional if notional is None else notional
+        exposure = (trade.symbol, self._side(trade), group, trade.channel_id,
+                    notional, notional / float(trade.leverage))
+        # Keep the trade referenced so its id can't be reused while booked
+        self._booked[id(trade)] = (trade, exposure)
+        self._apply(exposure, 1)
+
+    def _apply(self, exposure: tuple, sign: int):
+        symbol, side, group, channel_id, notional, margin = exposure
+        self.positions += sign
+        self.total_notional += sign * notional
+        self.margin += sign * margin
+        self.by_symbol[symbol] += sign * notional
+        self.by_side[side] += sign * notional
+        self.by_channel[channel_id] += sign * notional
+        if group:
+            self.by_group[(group, side)] += sign * notional
+        metrics.set_gauge('risk_open_positions', self.positions)
+        metrics.set_gauge('risk_open_notional', self.total_notional)
+        metrics.set_gauge('risk_margin_in_use', self.margin)
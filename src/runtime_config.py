@@ -0,0 +1,91 @@
+from config import Config, RuntimeConfig, TradingConfig, load_trading_config
+from json_codec import dumps
+from metrics import metrics
+from dataclasses import asdict
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class RuntimeConfigManager:
+    """Reload config.trading from a file without a restart
+
+    A new file is only applied if it parses and validates; otherwise the old
+    values stay in place. The swap is a single attribute assignment, and
+    execute_trade reads config.trading once at its start, so a trade in
+    flight finishes on the values it started with.
+    """
+
+    def __init__(self, config: Config, runtime: RuntimeConfig):
+        self.config = config
+        self.runtime = runtime
+        self._mtime = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """Record the config loaded at startup as the first version"""
+        if self.runtime.path:
+            try:
+                self._mtime = os.path.getmtime(self.runtime.path)
+            except OSError as e:
+                self.logger.error(f"Can't watch {self.runtime.path}: {e}")
+        self.audit('config', version=self.config.trading.version, previous=None,
+                   trading=asdict(self.config.trading))
+
+    def reload(self) -> bool:
+        """Load, validate and apply the config file; returns True if a new version was applied"""
+        if not self.runtime.path:
+            return False
+        try:
+            self._mtime = os.path.getmtime(self.runtime.path)
+            trading = load_trading_config(self.runtime.path)
+        except Exception as e:
+            metrics.inc('runtime_config_reload_errors_total')
+            self.logger.error(f"Keeping trading config {self.config.trading.version}, could not load {self.runtime.path}: {e}")
+            return False
+
+        if trading.version == self.config.trading.version:
+            return False
+        self.apply(trading)
+        return True
+
+    def apply(self, trading: TradingConfig):
+        previous = self.config.trading.version
+        self.config.trading = trading
+        metrics.inc('runtime_config_reloads_total')
+        self.logger.info(f"Applied trading config {trading.version} (was {previous})")
+        self.audit('config', version=trading.version, previous=previous, trading=asdict(trading))
+
+    def audit(self, event: str, **fields):
+        """Append a record to the audit log"""
+        if not self.runtime.audit_path:
+            return
+        record = {'time': time.time(), 'event': event, **fields}
+        try:
+            directory = os.path.dirname(self.runtime.audit_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.runtime.audit_path, 'a') as f:
+                f.write(dumps(record) + '\n')
+        except OSError as e:
+            self.logger.error(f"Error writing audit record: {e}")
+
+    def audit_trade(self, trade, message_id=None):
+        """Record which config version a trade was opened with"""
+        self.audit('trade', version=trade.config_version, symbol=trade.symbol,
+                   side=trade.side, size=trade.size, message_id=message_id)
+
+    async def watch(self):
+        """Reload whenever the file's modification time changes"""
+        while True:
+            await asyncio.sleep(self.runtime.watch_interval)
+            if not self.runtime.path:
+                continue
+            try:
+                mtime = os.path.getmtime(self.runtime.path)
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                self.reload()
@@ -0,0 +1,230 @@
+from bitmart_client import BitmartClient
+from config import ShadowConfig
+from metrics import metrics
+from offline_exchange import OfflineExchange, OfflineResponse
+from typing import Dict, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_ENDPOINTS = ("/system/time", "/contract/public/")
+
+class ShadowExchange(OfflineExchange):
+    """Paper-trading client fed by live prices
+
+    Public requests (contract details, klines, server time) go to the live
+    client, so contract specs and prices are real. Contract details are
+    answered from the prices ShadowBooks learns from the shared live poll
+    while they are fresh, so a shadow entry normally makes no live request
+    and spends none of the live client's rate limit. Private requests are
+    answered from an in-memory book with no latency: market orders fill at
+    the last live price, and limit, plan, TP/SL and trail orders trigger on
+    on_tick() price updates. Every fill pays the taker fee; realized PnL and
+    fees are kept per shadow book, i.e. per channel.
+    """
+
+    def __init__(self, live: BitmartClient, config: ShadowConfig, channel_id: int):
+        super().__init__(live.config, latency=0.0, equity=config.equity)
+        # Prices and contract specs are learned from the live client's public responses
+        self.prices = {}
+        self.specs = {}
+        self.priced_at = {}  # symbol -> monotonic time of its last live price
+        self.price_max_age = config.price_max_age
+        self.live = live
+        self.taker_fee = config.taker_fee
+        self.channel = str(channel_id)
+        self.starting_equity = config.equity
+        self.realized_pnl = 0.0
+        self.fees = 0.0
+        self.fills = 0
+        self.closed_trades = 0
+        self.resting = {}  # order_id -> limit order waiting for the price
+        self._contracts = {}  # symbol -> last contract details seen
+        self._trail_extremes = {}  # trail order id -> best price since activation
+        # Private calls never leave the process, so don't throttle them
+        self.rate_limiter.limits = {}
+        self.rate_limiter.default = (1e9, 1)
+
+    def _request(self, method: str, endpoint: str, params: dict = None,
+                 body: dict = None, signed: bool = True):
+        if endpoint == "/contract/public/details":
+            cached = self._cached_details((params or {}).get('symbol'))
+            if cached is not None:
+                return OfflineResponse({"code": 1000, "message": "Ok", "data": cached})
+        if endpoint.startswith(PUBLIC_ENDPOINTS):
+            response = self.live._request(method, endpoint, params=params, body=body, signed=signed)
+            if endpoint == "/contract/public/details":
+                self._learn(self._decode(response))
+            return response
+        return super()._request(method, endpoint, params=params, body=body, signed=signed)
+
+    def _learn(self, details: dict):
+        """Keep the last price and contract details of every symbol we have seen"""
+        now = time.monotonic()
+        for contract in (details.get('data') or {}).get('symbols', []):
+            symbol = contract['symbol']
+            if contract.get('last_price'):
+                self.prices[symbol] = float(contract['last_price'])
+                self.priced_at[symbol] = now
+            self.specs[symbol] = (float(contract['contract_size']), float(contract.get('price_precision') or 0))
+            self._contracts[symbol] = contract
+
+    def _cached_details(self, symbol: Optional[str]):
+        """Details from the learned prices, or None if a price asked for is missing or stale"""
+        now = time.monotonic()
+        symbols = [symbol] if symbol else list(self._contracts)
+        if not symbols or any(s not in self._contracts or now - self.priced_at.get(s, 0.0) > self.price_max_age
+                              for s in symbols):
+            return None
+        metrics.inc('shadow_cached_details_total')
+        return {"symbols": [{**self._contracts[s], "last_price": f"{self.prices[s]:.8g}"} for s in symbols]}
+
+    @property
+    def symbols(self) -> List[str]:
+        """Symbols with a position or a working order, which need price updates"""
+        symbols = {symbol for symbol, _ in self.positions}
+        symbols.update(order['symbol'] for order in self.resting.values())
+        symbols.update(plan['symbol'] for plan in self.plan_orders.values())
+        return list(symbols)
+
+    def on_tick(self, symbol: str, price: float):
+        with self._lock:
+            self.prices[symbol] = price
+            self.priced_at[symbol] = time.monotonic()
+            for order in list(self.resting.values()):
+                if order['state'] != 2:
+                    del self.resting[order['order_id']]  # Cancelled
+                elif order['symbol'] == symbol:
+                    limit = float(order['price'])
+                    if (limit >= price) if order['side'] in (1, 2) else (limit <= price):
+                        self._fill(order, limit)
+            for plan in list(self.plan_orders.values()):
+                if plan['symbol'] == symbol and self._triggered(plan, price):
+                    self.plan_orders.pop(plan['order_id'], None)
+                    self._trail_extremes.pop(plan['order_id'], None)
+                    self._execute_plan(plan, price)
+        self._publish()
+
+    def _submit_order(self, params, body):
+        code, data = super()._submit_order(params, body)
+        if code == 1000 and self.orders[data['order_id']]['state'] == 2:
+            self.resting[data['order_id']] = self.orders[data['order_id']]
+        return code, data
+
+    def _triggered(self, plan: dict, price: float) -> bool:
+        closes_long = int(plan['side']) == 3
+        if 'callback_rate' in plan:
+            activation = float(plan['trigger_price'])
+            key = plan['order_id']
+            best = self._trail_extremes.get(key)
+            if best is None:
+                if (price >= activation) if closes_long else (price <= activation):
+                    self._trail_extremes[key] = price
+                return False
+            best = max(best, price) if closes_long else min(best, price)
+            self._trail_extremes[key] = best
+            callback = float(plan['callback_rate']) / 100
+            return price <= best * (1 - callback) if closes_long else price >= best * (1 + callback)
+
+        trigger = float(plan['trigger_price'])
+        if 'price_way' in plan:
+            # price_way 1 triggers on a rise, 2 on a fall
+            return price >= trigger if int(plan.get('price_way', 1)) == 1 else price <= trigger
+        if plan['type'] == 'stop_loss':
+            return price <= trigger if closes_long else price >= trigger
+        return price >= trigger if closes_long else price <= trigger  # take_profit
+
+    def _execute_plan(self, plan: dict, price: float):
+        side = int(plan['side'])
+        position = self.positions.get((plan['symbol'], 1 if side in (1, 3) else 2))
+        size = int(plan['size'])
+        if side in (2, 3):
+            if not position:
+                return
+            size = min(size, position['size'])
+        if size <= 0:
+            return
+        order_id = self._next_id()
+        order = {
+            "order_id": order_id, "symbol": plan['symbol'], "side": side, "type": "market",
+            "leverage": plan.get('leverage', position['leverage'] if position else "1"), "size": str(size),
+            "price": "0", "deal_size": "0", "deal_avg_price": "0", "state": 2,
+            "client_order_id": plan.get('client_order_id', ""),
+        }
+        self.orders[order_id] = order
+        self._fill(order, price)
+
+    def _fill(self, order: dict, price: float):
+        self.resting.pop(order['order_id'], None)
+        side, size = order['side'], int(order['size'])
+        symbol = order['symbol']
+        contract_size = self.specs.get(symbol, (1.0, 0))[0]
+        fee = price * size * contract_size * self.taker_fee
+        self.fees += fee
+        self.fills += 1
+
+        if side in (2, 3):
+            position = self.positions.get((symbol, 1 if side == 3 else 2))
+            if position:
+                closed = min(size, position['size'])
+                direction = 1 if side == 3 else -1
+                self.realized_pnl += direction * (price - position['entry_price']) * closed * contract_size
+                if closed == position['size']:
+                    self.closed_trades += 1
+        super()._fill(order, price)
+        # Equity follows realized results so percent sizing compounds as it would live
+        self.equity = self.starting_equity + self.realized_pnl - self.fees
+        for order_id in [key for key in self._trail_extremes if key not in self.plan_orders]:
+            del self._trail_extremes[order_id]
+
+    def unrealized_pnl(self) -> float:
+        total = 0.0
+        for (symbol, position_type), position in self.positions.items():
+            price = self.prices.get(symbol, position['entry_price'])
+            direction = 1 if position_type == 1 else -1
+            total += direction * (price - position['entry_price']) * position['size'] * self.specs.get(symbol, (1.0, 0))[0]
+        return total
+
+    def summary(self) -> dict:
+        return {
+            'channel': self.channel,
+            'realized_pnl': self.realized_pnl,
+            'unrealized_pnl': self.unrealized_pnl(),
+            'fees': self.fees,
+            'net_pnl': self.realized_pnl + self.unrealized_pnl() - self.fees,
+            'open_positions': len(self.positions),
+            'closed_trades': self.closed_trades,
+            'fills': self.fills,
+        }
+
+    def _publish(self):
+        summary = self.summary()
+        for name in ('realized_pnl', 'unrealized_pnl', 'fees', 'net_pnl', 'open_positions'):
+            metrics.set_gauge(f'shadow_{name}', summary[name], channel=self.channel)
+
+class ShadowBooks:
+    """All shadow exchanges behind one price feed
+
+    Has the `symbols`/`on_tick`/`on_details` interface TickerFeed drives,
+    so a single live price poll serves every shadow channel, and every
+    contract in it feeds the shadows' cached contract lookups.
+    """
+
+    def __init__(self, exchanges: Dict[int, ShadowExchange] = None):
+        self.exchanges = dict(exchanges or {})  # channel id -> ShadowExchange
+
+    @property
+    def symbols(self) -> List[str]:
+        return list({symbol for exchange in self.exchanges.values() for symbol in exchange.symbols})
+
+    def on_tick(self, symbol: str, price: float):
+        for exchange in self.exchanges.values():
+            exchange.on_tick(symbol, price)
+
+    def on_details(self, details: dict):
+        for exchange in self.exchanges.values():
+            exchange._learn(details)
+
+    def report(self) -> List[dict]:
+        return [exchange.summary() for exchange in self.exchanges.values()]
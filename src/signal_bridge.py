@@ -0,0 +1,174 @@
+"""Hand-off of parsed signals from the ingest process to the execution process
+
+In split mode Telegram ingestion and parsing run in one process and order
+execution in another, each with its own event loop and GIL. The ingest
+process sends every classified message as a compact binary record over a
+local unix socket; the execution process puts it on its execution queue.
+Records carry the send time, so the handoff latency is measured on arrival.
+"""
+from config import BridgeConfig
+from metrics import metrics, FAST_BUCKETS
+from collections import deque
+from typing import Any, Callable, Tuple
+import asyncio
+import logging
+import os
+import struct
+import time
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+# 'admin' carries an admin command name, e.g. the Telegram kill switch command
+KINDS = ('signal', 'cancellation', 'shadow_signal', 'shadow_cancellation', 'admin', 'amendment', 'shadow_amendment')
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+SIGNAL_KINDS = {'signal', 'shadow_signal', 'amendment', 'shadow_amendment'}  # Payload is a signal dict
+
+FRAME = struct.Struct('<H')  # Length of the record that follows
+# kind, priority, message id, channel id, received at, sent at
+HEADER = struct.Struct('<BBqqdd')
+# side, leverage, entry price, entry zone low and high, stop loss, number of take profits
+SIGNAL = struct.Struct('<BHddddB')
+
+def encode_record(kind: str, payload: Any, priority: int, received_at: float = 0.0) -> bytes:
+    """Frame one classified message: a signal dict, a symbol or command, or (channel id, symbol)"""
+    if kind in SIGNAL_KINDS:
+        signal = payload
+        low, high = signal['entry_zone']
+        body = SIGNAL.pack(signal['side'], int(signal['leverage']), signal['entry_price'], low, high,
+                           signal['stop_loss'], len(signal['take_profits']))
+        body += struct.pack(f"<{len(signal['take_profits'])}d", *signal['take_profits'])
+        body += signal['symbol'].encode()
+        message_id, channel_id = signal.get('message_id') or 0, signal.get('channel_id') or 0
+    else:
+        channel_id, symbol = payload if kind == 'shadow_cancellation' else (0, payload)
+        body = symbol.encode()
+        message_id = 0
+    record = HEADER.pack(KIND_CODES[kind], priority, message_id, channel_id, received_at, time.time()) + body
+    return FRAME.pack(len(record)) + record
+
+def decode_record(record: bytes) -> Tuple[str, Any, int, float, float]:
+    """Returns (kind, payload, priority, received_at, sent_at) for a record without its frame"""
+    code, priority, message_id, channel_id, received_at, sent_at = HEADER.unpack_from(record)
+    kind = KINDS[code]
+    offset = HEADER.size
+    if kind in SIGNAL_KINDS:
+        side, leverage, entry_price, low, high, stop_loss, count = SIGNAL.unpack_from(record, offset)
+        offset += SIGNAL.size
+        take_profits = list(struct.unpack_from(f"<{count}d", record, offset))
+        offset += 8 * count
+        payload = {
+            'symbol': record[offset:].decode(),
+            'side': side,
+            'leverage': str(leverage),
+            'size': 1,
+            'entry_price': entry_price,
+            'entry_zone': (low, high),
+            'take_profits': take_profits,
+            'stop_loss': stop_loss,
+            'is_short': side == 4,
+            'message_id': message_id,
+            'channel_id': channel_id,
+        }
+    else:
+        symbol = record[offset:].decode()
+        payload = (channel_id, symbol) if kind == 'shadow_cancellation' else symbol
+    return kind, payload, priority, received_at, sent_at
+
+class BridgeSender:
+    """Ingest side: sends records, holding the latest few while disconnected"""
+
+    def __init__(self, config: BridgeConfig):
+        self.config = config
+        self.pending = deque(maxlen=config.backlog)  # Frames waiting for a connection
+        self._writer = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def send(self, kind: str, payload: Any, priority: int, received_at: float = 0.0):
+        frame = encode_record(kind, payload, priority, received_at)
+        if not self.connected:
+            if len(self.pending) == self.pending.maxlen:
+                metrics.inc('bridge_dropped_total')
+            self.pending.append(frame)
+            return
+        self._writer.write(frame)
+        metrics.inc('bridge_records_sent_total', kind=kind)
+
+    async def run(self):
+        """Keep connected to the execution process until cancelled"""
+        delay = 0.5
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.config.socket_path)
+            except OSError as e:
+                self.logger.warning(f"Execution process not reachable at {self.config.socket_path}: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+                continue
+            self.logger.info(f"Connected to execution process at {self.config.socket_path}")
+            metrics.set_gauge('bridge_connected', 1)
+            delay = 0.5
+            while self.pending:
+                self._writer.write(self.pending.popleft())
+            # The executor never writes back; EOF means it went away
+            await reader.read()
+            self._writer.close()
+            self._writer = None
+            metrics.set_gauge('bridge_connected', 0)
+            self.logger.warning("Execution process disconnected")
+
+class BridgeReceiver:
+    """Execution side: accepts the ingest process and hands records to on_record"""
+
+    def __init__(self, config: BridgeConfig, on_record: Callable[[str, Any, int], Any]):
+        self.config = config
+        self.on_record = on_record  # Called with (kind, payload, priority)
+        self.server = None
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        if os.path.exists(self.config.socket_path):
+            os.unlink(self.config.socket_path)  # Left over from a previous run
+        directory = os.path.dirname(self.config.socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.server = await asyncio.start_unix_server(self._handle, self.config.socket_path)
+        # Records are trusted as signals, so only the bot's own user may connect
+        os.chmod(self.config.socket_path, 0o600)
+        self.logger.info(f"Waiting for the ingest process on {self.config.socket_path}")
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.logger.info("Ingest process connected")
+        try:
+            while True:
+                length, = FRAME.unpack(await reader.readexactly(FRAME.size))
+                record = await reader.readexactly(length)
+                kind, payload, priority, received_at, sent_at = decode_record(record)
+                now = time.time()
+                metrics.observe('bridge_handoff_seconds', max(0.0, now - sent_at), buckets=FAST_BUCKETS)
+                if received_at:
+                    metrics.observe('bridge_arrival_to_queue_seconds', max(0.0, now - received_at))
+                self.on_record(kind, payload, priority)
+        except asyncio.IncompleteReadError:
+            self.logger.warning("Ingest process disconnected")
+        except Exception as e:
+            self.logger.error(f"Error reading from ingest process: {e}")
+        finally:
+            writer.close()
+
+def run_event_loop(coroutine, use_uvloop: bool = True):
+    """asyncio.run on uvloop when it is installed and wanted"""
+    if use_uvloop and uvloop:
+        uvloop.install()
+    return asyncio.run(coroutine)
@@ -1,10 +1,32 @@
-from telethon import TelegramClient, events
-from config import Config
-from bitmart_client import BitmartClient
-from models import Signal, PositionSide, TrailingConfig
+from config import AttributionConfig, BridgeConfig, Config, RuntimeConfig, load_trading_config
+from bitmart_client import BitmartClient, tagged_orders
+from balance import BalanceCache
+from models import Trade, TradeStatus
+from signal_parser import SignalParsingError
+import signal_parser
+from reconciler import PositionReconciler
+from metrics import metrics, serve_metrics
+from json_codec import pretty
+from connection_warmer import ConnectionWarmer
+from diagnostics import Diagnostics
+from entry_executor import EntryExecutor, EntryFill
+from telegram_sessions import SessionGroup
+from ingest_queue import IngestPipeline, RawMessage, PRIORITY_CANCELLATION, PRIORITY_SIGNAL
+from exit_engine import ExitEngine, ExitPolicy, TickerFeed, TrackedPosition
+from runtime_config import RuntimeConfigManager
+from risk_engine import RiskEngine
+from shadow_exchange import ShadowBooks, ShadowExchange
+from signal_bridge import BridgeReceiver, BridgeSender
+from kill_switch import KillSwitch
+from bracket_amender import BracketAmender, plan_changes
+from admin_socket import AdminServer
+from attribution import Attribution, trade_tag
+from telethon import events
+from signal import SIGHUP, SIGUSR1
 import asyncio
+import contextlib
+import dataclasses
 import logging
-import json
 import re
 from typing import Optional
 import time
@@ -12,39 +34,96 @@ import time
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class SignalParsingError(Exception):
-    pass
-
 class SignalMonitor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, bitmart: BitmartClient = None):
         self.config = config
         self.client = None
         self.channel = None
         self.logger = logging.getLogger(__name__)
-        self.bitmart = BitmartClient(config.bitmart)  # Initialize BitMart client
+        # An offline exchange can be passed in for load tests
+        self.bitmart = bitmart or BitmartClient(config.bitmart)
+        self.warmer = ConnectionWarmer(self.bitmart, config.connection)
+        if bitmart is None:
+            self.warmer.install()
+        self.diagnostics = Diagnostics(config.diagnostics)
         self.recent_signals = {}  # Cache for recent signals
-        self.signal_timeout = 60  # Ignore duplicate signals for 60 seconds
+        self.runtime_config = RuntimeConfigManager(config, config.runtime)
+        self.trades = {}  # Trades opened by the bot, keyed by symbol
+        self.balance = BalanceCache(self.bitmart)
+        self.risk = RiskEngine(self.balance)
+        self.entry_executor = EntryExecutor(self.bitmart, halted=lambda: self.halted)
+        self.amender = BracketAmender(self.bitmart)
+        self.exit_engine = ExitEngine(self._move_stop, on_stop_moved=self._stop_moved)
+        # Results of closed trades per channel and symbol, from the fills of their tagged orders
+        self.attribution = Attribution(config.attribution) if config.attribution.enabled else None
+        self.ticker_feed = TickerFeed(self.bitmart, self.exit_engine)
+        self.reconciler = PositionReconciler(
+            self.bitmart, self.trades, config.reconcile, self.balance,
+            on_trade_closed=self._on_trade_closed,
+            on_trade_reduced=self._on_trade_reduced
+        )
+        # Channels traded on paper: each gets a monitor of its own on a shadow exchange
+        self.shadows = {channel_id: self._make_shadow(channel_id) for channel_id in config.shadow.channels}
+        self.shadow_books = ShadowBooks({channel_id: shadow.bitmart for channel_id, shadow in self.shadows.items()})
+        self.shadow_feed = TickerFeed(self.bitmart, self.shadow_books, config.shadow.price_interval)
+        self._background_tasks = set()
+        self.sessions = SessionGroup(config.telegram, on_message=self._on_message,
+                                     extra_channels=config.shadow.channels)
+        # Split deployment: the ingest process forwards classified messages to the execution process
+        self.bridge_sender = BridgeSender(config.bridge) if config.bridge.role == "ingest" else None
+        self.pipeline = IngestPipeline(
+            config.ingest,
+            classify=self.classify_message,
+            handlers={
+                'cancellation': self.handle_cancellation,
+                'signal': self.execute_trade,
+                'shadow_cancellation': self._shadow_cancellation,
+                'shadow_signal': self._shadow_signal,
+                'amendment': self.amend_trade,
+                'shadow_amendment': self._shadow_amendment,
+            },
+            on_overflow=self._on_queue_overflow,
+            forward=self.bridge_sender.send if self.bridge_sender else None,
+            supersedes=self._supersedes
+        )
+        self.bridge_receiver = None
+        if config.bridge.role == "execute":
+            self.bridge_receiver = BridgeReceiver(config.bridge, self._on_bridge_record)
+        self.halted = False  # Set by the kill switch; no new trades until resumed
+        self._executions = set()  # Futures of the executions and amendments placing orders right now
+        self.kill_switch = KillSwitch(self.bitmart, config.kill_switch, trail_orders=self._trail_orders,
+                                      in_flight=lambda: self._executions)
+        self.admin = None
+        if config.kill_switch.admin_socket and config.bridge.role != "ingest":
+            self.admin = AdminServer(config.kill_switch.admin_socket, {
+                'flatten': lambda: self.run_admin_command('flatten', reason="admin socket"),
+                'halt': lambda: self.run_admin_command('halt'),
+                'resume': lambda: self.run_admin_command('resume'),
+                'status': lambda: self.run_admin_command('status'),
+            })
+
+    def _make_shadow(self, channel_id: int) -> 'SignalMonitor':
+        shadow = self.config.shadow
+        trading = load_trading_config(shadow.trading_path) if shadow.trading_path else self.config.trading
+        config = dataclasses.replace(
+            self.config,
+            trading=trading,
+            runtime=RuntimeConfig(path=shadow.trading_path or self.config.runtime.path, audit_path=""),
+            shadow=dataclasses.replace(shadow, channels=[]),
+            bridge=BridgeConfig(),
+            # Shadow PnL has its own gauges; attribution covers the account
+            attribution=AttributionConfig(enabled=False)
+        )
+        return SignalMonitor(config, bitmart=ShadowExchange(self.bitmart, shadow, channel_id))
         
     async def connect(self):
-        """Connect to Telegram and find the channel"""
+        """Connect every Telegram session and find the channel"""
         try:
-            # Connect to Telegram
-            self.client = TelegramClient(
-                'signal_monitor_session',
-                self.config.telegram.api_id,
-                self.config.telegram.api_hash
-            )
-            await self.client.start(phone=self.config.telegram.phone)
-            
-            # Get channel by ID
-            channel_id = int(self.config.telegram.channel_username)
-            self.channel = await self.client.get_entity(channel_id)
-            
-            if self.channel:
-                self.logger.info(f"Connected to channel: {self.channel.title}")
-                return True
-            else:
-                raise ValueError(f"Could not find channel with ID {channel_id}")
+            self.channel = await self.sessions.connect()
+            self.client = self.sessions.client
+            titles = ", ".join(channel.title for channel in self.sessions.channels)
+            self.logger.info(f"Connected to channel(s): {titles} with {len(self.sessions.clients)} session(s)")
+            return True
             
         except Exception as e:
             self.logger.error(f"Error connecting to channel: {e}")
@@ -53,78 +132,334 @@ class SignalMonitor:
     async def monitor_channel(self):
         """Monitor channel for new messages"""
         try:
-            @self.client.on(events.NewMessage(chats=self.channel))
-            async def handle_new_message(event):
-                try:
-                    message = event.message.text
-                    self.logger.info(f"New message received: {message}")
-                    
-                    # Check for cancellation message first
-                    symbol = self.parse_cancellation(message)
-                    if symbol:
-                        await self.handle_cancellation(symbol)
-                        return
-                    
-                    # If not a cancellation, try to parse as a signal
-                    signal = self.parse_signal(message)
-                    if signal:
-                        # Create a unique key for the signal
-                        signal_key = f"{signal['symbol']}_{signal['side']}_{signal['entry_price']}"
-                        current_time = int(time.time())
-                        
-                        # Check if we've seen this signal recently
-                        if signal_key in self.recent_signals:
-                            last_time = self.recent_signals[signal_key]
-                            if current_time - last_time < self.signal_timeout:
-                                self.logger.info(f"Skipping duplicate signal for {signal['symbol']}, received within {self.signal_timeout} seconds")
-                                return
-                        
-                        # Store signal in cache and process it
-                        self.recent_signals[signal_key] = current_time
-                        self.logger.info(f"Valid signal detected: {json.dumps(signal, indent=2)}")
-                        await self.execute_trade(signal)
-                        
-                        # Clean up old signals from cache
-                        self._cleanup_signal_cache(current_time)
-                        
-                except Exception as e:
-                    self.logger.error(f"Error handling message: {e}")
+            # Handlers only enqueue; parsing and execution run in the pipeline
+            self.sessions.add_handlers()
+            self._add_kill_switch_command()
             
-            self.logger.info("Starting to monitor channel...")
-            await self.client.run_until_disconnected()
+            if self.config.metrics.enabled:
+                self._metrics_server = await serve_metrics(self.config.metrics.host, self.config.metrics.port)
+
+            if self.bridge_sender:
+                # Orders are placed by the execution process
+                self.logger.info("Starting to monitor channel, forwarding to the execution process...")
+                self.pipeline.start()
+                self._bridge_task = asyncio.create_task(self.bridge_sender.run())
+            else:
+                self.logger.info("Starting to monitor channel...")
+                await self._start_execution()
+            await self.sessions.run()
             
         except Exception as e:
             self.logger.error(f"Error monitoring channel: {e}")
             raise
 
+    async def run_executor(self):
+        """Execution process of a split deployment: take work from the ingest process"""
+        try:
+            if self.config.metrics.enabled:
+                self._metrics_server = await serve_metrics(self.config.metrics.host, self.config.metrics.port)
+            await self.bridge_receiver.start()
+            await self._start_execution()
+            await self.bridge_receiver.serve_forever()
+        except Exception as e:
+            self.logger.error(f"Error running executor: {e}")
+            raise
+
+    async def _start_execution(self):
+        """Start everything that places and looks after orders"""
+        # Calibrate the clock before the first signed request
+        try:
+            await asyncio.to_thread(self.bitmart.calibrate_time, self.config.bitmart.time_sync_samples)
+        except Exception as e:
+            self.logger.error(f"Error calibrating server time: {e}")
+
+        try:
+            await asyncio.to_thread(self.balance.seed)
+        except Exception as e:
+            self.logger.error(f"Error loading balance: {e}")
+
+        # Diagnostics can be switched on and off without a restart
+        if self.config.diagnostics.enabled:
+            self.diagnostics.set_enabled(True)
+        try:
+            asyncio.get_running_loop().add_signal_handler(SIGUSR1, self.diagnostics.toggle)
+        except (NotImplementedError, AttributeError):
+            self.logger.warning("SIGUSR1 not supported, diagnostics can't be toggled at runtime")
+
+        # Trading parameters reload on SIGHUP and when the file changes
+        self.runtime_config.start()
+        try:
+            asyncio.get_running_loop().add_signal_handler(SIGHUP, self.runtime_config.reload)
+        except (NotImplementedError, AttributeError):
+            self.logger.warning("SIGHUP not supported, trading config only reloads on file changes")
+
+        if self.attribution:
+            self.attribution.load()
+        await self._adopt_positions()
+        self.pipeline.start()
+        if self.admin:
+            await self.admin.start()
+        await self._start_shadows()
+        self._reconcile_task = asyncio.create_task(self.reconciler.run())
+        self._time_sync_task = asyncio.create_task(self._sync_time())
+        self._warmer_task = asyncio.create_task(self.warmer.run())
+        self._exit_engine_task = asyncio.create_task(self.exit_engine.run())
+        self._ticker_task = asyncio.create_task(self.ticker_feed.run())
+        self._config_watch_task = asyncio.create_task(self.runtime_config.watch())
+
+    async def _adopt_positions(self):
+        """Pick up the bot's positions left open by a previous run"""
+        try:
+            adopted = await self.reconciler.adopt()
+        except Exception as e:
+            self.logger.error(f"Error adopting open positions: {e}")
+            return
+        for trade in adopted:
+            self.risk.add(trade, self.config.trading.risk)
+            if self.config.trading.exits.client_trailing and trade.brackets.get('stop_loss'):
+                self._track_exit(trade, self.config.trading.exits)
+
+    def _on_bridge_record(self, kind: str, payload, priority: int):
+        if kind == 'admin':
+            # Doesn't wait behind queued executions
+            self._spawn(self.run_admin_command(payload, reason="telegram command"))
+        else:
+            self.pipeline.enqueue(kind, payload, priority)
+
+    def _add_kill_switch_command(self):
+        """Flatten when the configured command is posted in the admin chat"""
+        kill_switch = self.config.kill_switch
+        client = self.sessions.client
+        if not kill_switch.telegram_command or not client:
+            return
+
+        async def on_command(event):
+            if self.bridge_sender:
+                self.bridge_sender.send('admin', 'flatten', PRIORITY_CANCELLATION)
+                await event.reply("Kill switch sent to the execution process")
+                return
+            await event.reply("Kill switch: flattening...")
+            report = await self.run_admin_command('flatten', reason="telegram command")
+            await event.reply(report['summary'])
+
+        pattern = rf"^{re.escape(kill_switch.telegram_command)}\s*$"
+        client.add_event_handler(on_command, events.NewMessage(chats=kill_switch.telegram_chat, pattern=pattern))
+        self.logger.info(f"Kill switch command {kill_switch.telegram_command} enabled in {kill_switch.telegram_chat}")
+
+    async def run_admin_command(self, command: str, reason: str = "") -> dict:
+        """flatten, halt, resume or status; returns the reply for the operator"""
+        if command in ('flatten', 'halt'):
+            self.halted = True
+            self.reconciler.halted = True
+        elif command == 'resume':
+            self.halted = False
+            self.reconciler.halted = False
+        elif command != 'status':
+            return {'error': f"unknown command {command!r}"}
+        metrics.set_gauge('trading_halted', 1 if self.halted else 0)
+        self.logger.warning(f"Admin command {command}: trading {'halted' if self.halted else 'active'}")
+
+        reply = {'halted': self.halted, 'trades': sorted(self.trades)}
+        if command == 'status' and self.attribution:
+            reply['channels'] = self.attribution.summary('channel')
+        if command == 'flatten':
+            report = await self.kill_switch.flatten(reason or "admin")
+            self.reconciler.poke()
+            reply.update(report.as_dict(), summary=str(report))
+        return reply
+
+    def _trail_orders(self):
+        return [(trade.symbol, trade.brackets['trail']['order_id'])
+                for trade in self.trades.values() if trade.brackets.get('trail', {}).get('order_id')]
+
+    async def _sync_time(self):
+        """Periodically recalibrate the server time offset"""
+        while True:
+            await asyncio.sleep(self.config.bitmart.time_sync_interval)
+            try:
+                await asyncio.to_thread(self.bitmart.calibrate_time, self.config.bitmart.time_sync_samples)
+            except Exception as e:
+                self.logger.error(f"Error calibrating server time: {e}")
+
+    async def _start_shadows(self):
+        """Run the shadow channels' bookkeeping next to the live one"""
+        if not self.shadows:
+            return
+        for channel_id, shadow in self.shadows.items():
+            await asyncio.to_thread(shadow.balance.seed)
+            shadow.runtime_config.start()
+            for job in (shadow.reconciler.run(), shadow.exit_engine.run(),
+                        shadow.ticker_feed.run(), shadow.runtime_config.watch()):
+                self._spawn(job)
+        self._spawn(self.shadow_feed.run())
+        self._spawn(self._report_shadows())
+        self.logger.info(f"Shadow trading channels: {', '.join(map(str, self.shadows))}")
+
+    def _spawn(self, coroutine):
+        # Shadow executions and admin commands never hold up a live execution worker
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        task.add_done_callback(
+            lambda t: t.cancelled() or not t.exception() or self.logger.error(f"Background task failed: {t.exception()}")
+        )
+
+    async def _shadow_signal(self, signal: dict):
+        self._spawn(self.shadows[signal['channel_id']].execute_trade(signal))
+
+    async def _shadow_amendment(self, signal: dict):
+        self._spawn(self.shadows[signal['channel_id']].amend_trade(signal))
+
+    async def _shadow_cancellation(self, payload: tuple):
+        channel_id, symbol = payload
+        self._spawn(self.shadows[channel_id].handle_cancellation(symbol))
+
+    async def _report_shadows(self):
+        while True:
+            await asyncio.sleep(self.config.shadow.report_interval)
+            for summary in self.shadow_books.report():
+                self.logger.info(
+                    f"Shadow channel {summary['channel']}: net PnL {summary['net_pnl']:.2f} USDT "
+                    f"(realized {summary['realized_pnl']:.2f}, unrealized {summary['unrealized_pnl']:.2f}, "
+                    f"fees {summary['fees']:.2f}), {summary['open_positions']} open, "
+                    f"{summary['closed_trades']} closed"
+                )
+
+    def _on_message(self, message: RawMessage) -> bool:
+        return self.pipeline.submit(message)
+
+    def classify_message(self, message: RawMessage) -> Optional[tuple]:
+        """Parse stage: turn a raw message into (kind, payload, priority), or None to ignore it"""
+        self.logger.info(f"New message received: {message.text}")
+
+        # Check for cancellation message first
+        shadow = self.shadows.get(message.channel_id)
+        symbol = self.parse_cancellation(message.text)
+        if symbol:
+            if message.edit_date:
+                # An edit, even a typo fix, is not a new cancellation: acting on it could close a newer trade
+                self.logger.info(f"Ignoring edited cancellation for {symbol} (message {message.message_id})")
+                return None
+            if shadow:
+                return 'shadow_cancellation', (message.channel_id, symbol), PRIORITY_CANCELLATION
+            return 'cancellation', symbol, PRIORITY_CANCELLATION
+
+        # If not a cancellation, try to parse as a signal
+        signal = self.parse_signal(message.text)
+        if not signal:
+            return None
+        signal['message_id'] = message.message_id
+        signal['channel_id'] = message.channel_id
+
+        if message.edit_date:
+            # An edit changes the brackets of the trade it opened, it is never a new trade
+            self.logger.info("Edited signal: %s", pretty(signal))
+            return ('shadow_amendment' if shadow else 'amendment'), signal, PRIORITY_SIGNAL
+
+        # A shadow channel keeps its own duplicate cache, so it never suppresses a live signal
+        if (shadow or self).is_duplicate(signal):
+            return None
+        self.logger.info("Valid signal detected: %s", pretty(signal))
+        if shadow:
+            return 'shadow_signal', signal, PRIORITY_SIGNAL
+        return 'signal', signal, PRIORITY_SIGNAL
+
+    def is_duplicate(self, signal: dict) -> bool:
+        """Check a signal against the recent ones, remembering it if it is new"""
+        # Create a unique key for the signal
+        signal_key = f"{signal['symbol']}_{signal['side']}_{signal['entry_price']}"
+        current_time = int(time.time())
+
+        # Check if we've seen this signal recently
+        if signal_key in self.recent_signals:
+            last_time = self.recent_signals[signal_key]
+            signal_timeout = self.config.trading.signal_timeout
+            if current_time - last_time < signal_timeout:
+                self.logger.info(f"Skipping duplicate signal for {signal['symbol']}, received within {signal_timeout} seconds")
+                return True
+
+        # Store signal in cache and clean up old ones
+        self.recent_signals[signal_key] = current_time
+        self._cleanup_signal_cache(current_time)
+        return False
+
+    @staticmethod
+    def _supersedes(cancellation: tuple, queued: tuple) -> bool:
+        """Whether a cancellation makes a queued signal moot: same symbol, and same channel on paper"""
+        kind, payload = cancellation
+        queued_kind, signal = queued
+        if kind == 'cancellation':
+            return queued_kind == 'signal' and signal['symbol'] == payload
+        if kind == 'shadow_cancellation':
+            channel_id, symbol = payload
+            return queued_kind == 'shadow_signal' and (signal['channel_id'], signal['symbol']) == (channel_id, symbol)
+        return False
+
+    def _on_queue_overflow(self, reason: str, item):
+        """Alert on a rejected message through the account's Saved Messages"""
+        client = self.sessions.client
+        if reason != "rejected" or not client:
+            return
+        text = f"Signal bot queue full, rejected: {item!r}"[:4000]
+        task = asyncio.create_task(client.send_message('me', text))
+        task.add_done_callback(
+            lambda t: t.cancelled() or not t.exception() or self.logger.error(f"Error sending alert: {t.exception()}")
+        )
+
+    @contextlib.asynccontextmanager
+    async def _execution(self):
+        """Mark a block that places orders as in flight, so the kill switch can wait for it"""
+        done = asyncio.get_running_loop().create_future()
+        self._executions.add(done)
+        try:
+            yield
+        finally:
+            self._executions.discard(done)
+            done.set_result(None)
+
     async def execute_trade(self, signal: dict):
         """Execute the trade based on the signal"""
+        tag = trade_tag(signal.get('channel_id', 0), signal.get('message_id', 0))
+        async with self._execution():
+            with self.diagnostics.profile(signal['symbol'], signal.get('message_id')), tagged_orders(tag):
+                await self._execute_trade(signal)
+
+    async def _execute_trade(self, signal: dict):
         try:
+            # Read once: a config reload during this trade doesn't affect it
+            trading = self.config.trading
             symbol = signal['symbol']
+            if self.halted:
+                self.logger.warning(f"Trading halted by the kill switch, ignoring signal for {symbol}")
+                return
+            if trading.sizing.max_leverage and int(signal['leverage']) > trading.sizing.max_leverage:
+                self.logger.info(f"Capping leverage {signal['leverage']} at {trading.sizing.max_leverage}")
+                signal = {**signal, 'leverage': str(trading.sizing.max_leverage)}
             entry_price = float(signal['entry_price'])
             
-            # Check for existing position first
-            position = self.bitmart.get_position(symbol)
-            if position.get('code') == 1000 and position.get('data'):
-                for pos in position['data']:
-                    if pos['symbol'] == symbol and int(pos['current_amount']) > 0:
-                        self.logger.info(f"Found existing position for {symbol}, closing it first...")
-                        close_result = self.bitmart.close_position(symbol, pos)
-                        self.logger.info(f"Position close result: {json.dumps(close_result, indent=2)}")
-                        # Wait a bit for the order to process
-                        await asyncio.sleep(1)
-            
-            # Calculate position size for 15 USDT
-            size = self.bitmart.calculate_position_size(symbol, entry_price)
-            actual_value = size * entry_price * float(self.bitmart._get_contract_size(symbol))
+            # Calculate position size for the configured target value
+            usdt_value = self.balance.target_notional(
+                trading.sizing,
+                entry_price,
+                stop_loss=float(signal['stop_loss']),
+                leverage=signal['leverage']
+            )
+            # Client calls run in threads: a rate-limit wait must not block the event loop
+            # One contract lookup gives the size, the specs and the market price the entry is measured against
+            contract = await asyncio.to_thread(self.bitmart.get_contract, symbol)
+            size = self.bitmart.calculate_position_size(symbol, entry_price, usdt_value, contract=contract)
+            contract_size = float(contract['contract_size'])
+            market_price = float(contract.get('last_price') or 0)
+            actual_value = size * entry_price * contract_size
             
             # Get minimum order size
-            min_size = self.bitmart._get_min_volume(symbol)
+            min_size = int(contract['min_volume'])
             size_per_third = size // 3
             size_per_half = size // 2
             
             # Determine position type
-            if actual_value > 15.0:
+            large_value = usdt_value * trading.exits.large_value_ratio
+            if actual_value > large_value:
                 position_type = "Large (single TP)"
             elif size_per_third < min_size:
                 position_type = "Medium (2 TPs)"
@@ -136,6 +471,7 @@ Trade Parameters:
 Symbol: {symbol}
 Side: {signal['side']}
 Size: {size} contracts
+Target Value: {usdt_value:.2f} USDT
 Actual Value: {actual_value:.2f} USDT
 Position Type: {position_type}
 Min Order Size: {min_size}
@@ -146,44 +482,123 @@ Take Profits: {signal['take_profits']}
 Stop Loss: {signal['stop_loss']}
             """)
 
-            # Set leverage
-            leverage_result = self.bitmart.submit_leverage(
+            # Record the trade before any order goes out so the reconciler leaves it alone
+            trade = Trade(
                 symbol=symbol,
+                side=signal['side'],
+                size=size,
                 leverage=signal['leverage'],
-                open_type='cross'
+                entry_price=entry_price,
+                stop_loss=float(signal['stop_loss']),
+                signal_stop_loss=float(signal['stop_loss']),
+                take_profits=list(signal['take_profits']),
+                notional=actual_value,
+                config_version=trading.version,
+                channel_id=signal.get('channel_id', 0),
+                message_id=signal.get('message_id', 0)
             )
-            self.logger.info(f"Leverage set result: {json.dumps(leverage_result, indent=2)}")
+            # The position this trade replaces doesn't count against it; it is only closed once admitted
+            rejection = self.risk.admit(trade, trading.risk, replacing=self.trades.get(symbol))
+            if rejection:
+                self.logger.warning(f"Signal for {symbol} rejected by risk limits: {rejection}")
+                self.runtime_config.audit('risk_rejection', symbol=symbol, message_id=signal.get('message_id'),
+                                          version=trading.version, **rejection.as_dict())
+                return
+
+            # Close any existing position first, using the reconciler's snapshot,
+            # refreshing it if our previous trade filled after the last pass
+            positions = self.reconciler.positions_for(symbol)
+            if not positions and symbol in self.trades:
+                await self.reconciler.refresh()
+                positions = self.reconciler.positions_for(symbol)
+            for pos in positions:
+                self.logger.info(f"Found existing position for {symbol}, closing it first...")
+                with tagged_orders(self._tag_of(self.trades.get(symbol))):
+                    close_result = await asyncio.to_thread(self.bitmart.close_position, symbol, pos)
+                self.logger.info("Position close result: %s", pretty(close_result))
+                self._release_margin(symbol, close_result)
+                # Wait a bit for the order to process
+                await asyncio.sleep(trading.order_spacing)
+            
+            replaced = self.trades.get(symbol)
+            if replaced:
+                # Closed above; the reconciler won't see it go now that the symbol is taken
+                self.exit_engine.remove(symbol)
+                self.risk.release(replaced)
+                self._attribute(replaced)
+            self.trades[symbol] = trade
 
-            # Submit main order with calculated size
-            order_result = self.bitmart.submit_order(
+            # Set leverage
+            leverage_result = await asyncio.to_thread(
+                self.bitmart.submit_leverage,
                 symbol=symbol,
-                side=signal['side'],
-                size=size,  # Use calculated size
                 leverage=signal['leverage'],
                 open_type='cross'
             )
-            self.logger.info(f"Main order result: {json.dumps(order_result, indent=2)}")
+            self.logger.info("Leverage set result: %s", pretty(leverage_result))
 
-            if order_result.get('code') == 1000:
-                # Set trailing stop at first take profit
-                first_tp = str(signal['take_profits'][0])
+            # Submit main order (or ladder) with calculated size
+            entry = await self.entry_executor.execute(signal, size, trading.entry, market_price=market_price)
+            if entry.unconfirmed:
+                await self._confirm_entry(symbol, signal['side'], entry)
+
+            if not entry.filled:
+                del self.trades[symbol]
+                self.risk.release(trade)
+            else:
+                if entry.size != size:
+                    # Bracket only what the ladder actually filled
+                    size = entry.size
+                    size_per_third = size // 3
+                    size_per_half = size // 2
+                    actual_value = size * entry.avg_price * contract_size
+                    self.logger.info(f"Sizing brackets to filled size {size} ({actual_value:.2f} USDT)")
+                trade.size = size
+                trade.notional = actual_value
+                trade.filled_at = time.time()
+                self.risk.update(trade)
+                trade.market_price = entry.market_price
+                trade.slippage = entry.slippage(trade.is_short)
+                trade.brackets['entry'] = {
+                    'order_id': entry.order_ids[0] if entry.order_ids else None,
+                    'price': entry.avg_price,
+                    'size': size
+                }
+                self.balance.apply_open(actual_value, signal['leverage'])
+                self.runtime_config.audit_trade(trade, signal.get('message_id'))
+
+                # Set trailing stop at the configured take profit (the first by default)
+                target_index = min(trading.exits.trail_activation_target, len(signal['take_profits'])) - 1
+                activation_price = str(signal['take_profits'][target_index])
                 is_short = signal['side'] == 4
                 
-                self.logger.info(f"\nSubmitting Trailing Stop at {first_tp}...")
-                trailing_result = self.bitmart.submit_trail_order(
-                    symbol=symbol,
-                    side=2 if is_short else 3,  # 2=buy_close_short, 3=sell_close_long
-                    size=size,
-                    leverage=signal['leverage'],
-                    open_type='cross',
-                    activation_price=first_tp,
-                    callback_rate="2",  # 2% callback
-                    activation_price_type=1  # 1=last_price
-                )
-                self.logger.info(f"Trailing Stop result: {json.dumps(trailing_result, indent=2)}")
+                if self._halted_during(trade):
+                    return
+                if trading.exits.client_trailing:
+                    self.logger.info(f"\nTrailing stop handled in-process, activating at {activation_price}")
+                else:
+                    self.logger.info(f"\nSubmitting Trailing Stop at {activation_price}...")
+                    trailing_result = await asyncio.to_thread(
+                        self.bitmart.submit_trail_order,
+                        symbol=symbol,
+                        side=2 if is_short else 3,  # 2=buy_close_short, 3=sell_close_long
+                        size=size,
+                        leverage=signal['leverage'],
+                        open_type='cross',
+                        activation_price=activation_price,
+                        callback_rate=f"{trading.exits.callback_rate:g}",  # Percent callback
+                        activation_price_type=1  # 1=last_price
+                    )
+                    self.logger.info("Trailing Stop result: %s", pretty(trailing_result))
+                    if trailing_result.get('code') == 1000:
+                        trade.brackets['trail'] = {
+                            'order_id': trailing_result.get('data', {}).get('order_id'),
+                            'price': float(activation_price),
+                            'size': size
+                        }
 
                 # Take profit setup based on position type
-                if actual_value > 15.0:
+                if actual_value > large_value:
                     # For large positions, only use first take profit with full size
                     take_profits = [
                         {"price": str(signal['take_profits'][0]), "size": size}
@@ -201,11 +616,13 @@ Stop Loss: {signal['stop_loss']}
                         for price in signal['take_profits']
                     ]
 
-                self.logger.info(f"Formatted take profits: {json.dumps(take_profits, indent=2)}")
+                self.logger.info("Formatted take profits: %s", pretty(take_profits))
 
                 # Submit take profit plan orders
                 for i, tp in enumerate(take_profits, 1):
-                    await asyncio.sleep(1)
+                    await asyncio.sleep(trading.order_spacing)
+                    if self._halted_during(trade):
+                        return
                     is_short = signal['side'] == 4
                     
                     self.logger.info(f"""
@@ -217,7 +634,8 @@ Price Way: {2 if is_short else 1} (2=price_way_short, 1=price_way_long)
 Is Short: {is_short}
                     """)
                     
-                    tp_result = self.bitmart.submit_plan_order(
+                    tp_result = await asyncio.to_thread(
+                        self.bitmart.submit_plan_order,
                         symbol=symbol,
                         side=2 if is_short else 3,  # 2=buy_close_short, 3=sell_close_long
                         size=tp['size'],
@@ -227,12 +645,21 @@ Is Short: {is_short}
                         order_type='market',
                         price_way=2 if is_short else 1  # 2=price_way_short, 1=price_way_long
                     )
-                    self.logger.info(f"Take Profit {i} result: {json.dumps(tp_result, indent=2)}")
+                    self.logger.info(f"Take Profit {i} result: %s", pretty(tp_result))
+                    if tp_result.get('code') == 1000:
+                        trade.brackets[f'tp{i}'] = {
+                            'order_id': tp_result.get('data', {}).get('order_id'),
+                            'price': float(tp['price']),
+                            'size': tp['size']
+                        }
 
                 # Submit stop loss using TP/SL endpoint
-                await asyncio.sleep(1)
+                await asyncio.sleep(trading.order_spacing)
+                if self._halted_during(trade):
+                    return
                 self.logger.info(f"\nSubmitting Stop Loss at {signal['stop_loss']}...")
-                sl_result = self.bitmart.submit_tp_sl_order(
+                sl_result = await asyncio.to_thread(
+                    self.bitmart.submit_tp_sl_order,
                     symbol=symbol,
                     side=2 if is_short else 3,
                     type="stop_loss",
@@ -241,11 +668,33 @@ Is Short: {is_short}
                     price_type=1,
                     plan_category=1
                 )
-                self.logger.info(f"Stop Loss result: {json.dumps(sl_result, indent=2)}")
+                self.logger.info("Stop Loss result: %s", pretty(sl_result))
+                if sl_result.get('code') == 1000:
+                    trade.protected_at = time.time()
+                    trade.brackets['stop_loss'] = {
+                        'order_id': sl_result.get('data', {}).get('order_id'),
+                        'price': trade.stop_loss,
+                        'size': size
+                    }
+                    if trading.exits.client_trailing:
+                        self._track_exit(trade, trading.exits)
+                trade.status = TradeStatus.OPEN
 
         except Exception as e:
             self.logger.error(f"Error executing trade: {e}")
             raise
+        finally:
+            # Hand any half-placed bracket over to the reconciler for repair
+            trade = self.trades.get(signal['symbol'])
+            if trade and trade.status == TradeStatus.OPENING:
+                trade.status = TradeStatus.OPEN
+                self.reconciler.poke()
+
+    def _halted_during(self, trade: Trade) -> bool:
+        """Stop placing a trade's orders once the kill switch has halted trading"""
+        if self.halted:
+            self.logger.warning(f"Trading halted while opening {trade.symbol}, placing no more of its orders")
+        return self.halted
 
     def parse_signal(self, message: str) -> Optional[dict]:
         """
@@ -253,74 +702,18 @@ Is Short: {is_short}
         Returns a dictionary with parsed signal data or None if message format doesn't match
         """
         try:
-            # Split message into lines and remove empty lines
-            lines = [line.strip() for line in message.split('\n') if line.strip()]
-            
-            if len(lines) < 6:  # Minimum required lines for a valid signal
-                return None
-
-            # Parse first line for symbol and side
-            first_line = lines[0].split()
-            if len(first_line) != 2:
-                return None
-                
-            symbol = first_line[0]
-            side = PositionSide(first_line[1])
-            
-            # Initialize variables
-            leverage = None
-            entry = None
-            targets = []
-            stoploss = None
-            trailing_config = None
-            
-            # Parse remaining lines
-            for line in lines[1:]:
-                if line.startswith('Leverage:'):
-                    # Handle both Cross and Isolated leverage
-                    leverage_match = re.search(r'(Cross|Isolated) (\d+)[xX]', line)
-                    if leverage_match:
-                        leverage = int(leverage_match.group(2))
-                elif line.startswith('Entry'):  # Handle both "Entry:" and "Entry zone:"
-                    entry_str = line.split(':')[1].strip()
-                    # If entry is a range, take the first value
-                    if '-' in entry_str:
-                        entry = float(entry_str.split('-')[0].strip())
-                    else:
-                        entry = float(entry_str)
-                elif line.startswith('Target'):
-                    target = float(line.split(':')[1].strip())
-                    targets.append(target)
-                elif line.startswith('Stoploss:'):
-                    stoploss = float(line.split(':')[1].strip())
-                elif line.startswith('Trailing Configuration:'):
-                    stop = re.search(r'Stop: ([^-]+)', line).group(1).strip()
-                    trigger = re.search(r'Trigger: ([^)]+)', line).group(1).strip()
-                    trailing_config = TrailingConfig(stop=stop, trigger=trigger)
-
-            if not all([leverage, entry, targets, stoploss]):
-                raise SignalParsingError("Missing required signal components")
-
-            self.logger.info(f"""
+            signal = signal_parser.parse_signal(message)
+            if signal:
+                self.logger.info(f"""
 Parsed Signal:
-Symbol: {symbol}
-Side: {side}
-Leverage: {leverage}
-Entry: {entry}
-Targets: {targets}
-Stop Loss: {stoploss}
+Symbol: {signal['symbol']}
+Side: {'SHORT' if signal['is_short'] else 'LONG'}
+Leverage: {signal['leverage']}
+Entry: {signal['entry_price']}
+Targets: {signal['take_profits']}
+Stop Loss: {signal['stop_loss']}
             """)
-
-            return {
-                'symbol': symbol,
-                'side': 4 if side == PositionSide.SHORT else 1,
-                'leverage': str(leverage),
-                'size': 1,
-                'entry_price': entry,  # Make sure entry price is included
-                'take_profits': targets,
-                'stop_loss': stoploss,
-                'is_short': side == PositionSide.SHORT
-            }
+            return signal
 
         except Exception as e:
             self.logger.error(f"Error parsing signal: {e}")
@@ -329,13 +722,10 @@ Stop Loss: {stoploss}
     def parse_cancellation(self, message: str) -> Optional[str]:
         """Parse cancellation message to get symbol"""
         try:
-            # Match pattern #SYMBOL/USDT Manually Cancelled
-            match = re.match(r'#([A-Z]+)/USDT Manually Cancelled', message)
-            if match:
-                symbol = f"{match.group(1)}USDT"
+            symbol = signal_parser.parse_cancellation(message)
+            if symbol:
                 self.logger.info(f"Found cancellation request for {symbol}")
-                return symbol
-            return None
+            return symbol
         except Exception as e:
             self.logger.error(f"Error parsing cancellation: {e}")
             return None
@@ -345,32 +735,176 @@ Stop Loss: {stoploss}
         try:
             self.logger.info(f"Processing cancellation for {symbol}")
             
-            # Get current position
-            position = self.bitmart.get_position(symbol)
-            if position.get('code') != 1000:
-                self.logger.error(f"Error getting position: {position}")
-                return
-                
-            positions = position.get('data', [])
+            # Get current position from the reconciler's snapshot, refreshing it
+            # if we opened the position after the last pass
+            positions = self.reconciler.positions_for(symbol)
+            if not positions and symbol in self.trades:
+                await self.reconciler.refresh()
+                positions = self.reconciler.positions_for(symbol)
+
             if not positions:
                 self.logger.info(f"No open position found for {symbol}")
                 return
                 
             # Close each position for the symbol
             for pos in positions:
-                if pos['symbol'] == symbol and int(pos['current_amount']) > 0:
-                    self.logger.info(f"Found open position: {json.dumps(pos, indent=2)}")
-                    result = self.bitmart.close_position(symbol, pos)
-                    self.logger.info(f"Position close result: {json.dumps(result, indent=2)}")
+                self.logger.info("Found open position: %s", pretty(pos))
+                with tagged_orders(self._tag_of(self.trades.get(symbol))):
+                    result = await asyncio.to_thread(self.bitmart.close_position, symbol, pos)
+                self.logger.info("Position close result: %s", pretty(result))
+                self._release_margin(symbol, result)
+            self.reconciler.poke()
                     
         except Exception as e:
             self.logger.error(f"Error handling cancellation: {e}")
 
+    async def amend_trade(self, signal: dict):
+        """Bring the brackets of a signal's trade in line with an edit of the signal"""
+        trade = next((t for t in self.trades.values()
+                      if t.message_id == signal['message_id'] and t.channel_id == signal.get('channel_id', 0)), None)
+        if not trade:
+            self.logger.info(f"No open trade for edited message {signal['message_id']}, ignoring the edit")
+            return
+        if trade.symbol != signal['symbol'] or trade.side != signal['side']:
+            self.logger.warning(f"Edit of message {signal['message_id']} changes the symbol or side of the "
+                                f"{trade.symbol} trade; not closing it, ignoring the edit")
+            return
+
+        # Let execute_trade finish placing the original brackets first
+        trading = self.config.trading
+        deadline = time.monotonic() + trading.signal_timeout
+        while trade.status == TradeStatus.OPENING and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        if trade.status != TradeStatus.OPEN:
+            self.logger.warning(f"Trade for {trade.symbol} is {trade.status.value}, ignoring the edit")
+            return
+
+        changes = plan_changes(trade, signal, trading.exits.trail_activation_target)
+        if float(signal['entry_price']) != trade.entry_price:
+            self.logger.info(f"Edit moves the entry of {trade.symbol}, already filled; keeping the position")
+        if not changes:
+            self.logger.info(f"Edit of message {signal['message_id']} leaves the {trade.symbol} brackets unchanged")
+            return
+
+        if self.halted:
+            self.logger.warning(f"Trading halted, ignoring the edit of message {signal['message_id']}")
+            return
+
+        # OPENING keeps the reconciler away while legs are being replaced
+        trade.status = TradeStatus.OPENING
+        try:
+            async with self._execution():
+                with tagged_orders(self._tag_of(trade)):
+                    outcome = await self.amender.apply(trade, changes, trading.exits.callback_rate)
+        finally:
+            trade.status = TradeStatus.OPEN
+        # A stop loss leg that failed to move keeps its price; one that is gone is re-placed by the reconciler
+        stop_loss = trade.brackets.get('stop_loss')
+        trade.stop_loss = stop_loss['price'] if stop_loss else float(signal['stop_loss'])
+        trade.signal_stop_loss = float(signal['stop_loss'])
+        trade.take_profits = list(signal['take_profits'])
+        self.exit_engine.amend(trade.symbol, stop=trade.stop_loss, targets=trade.take_profits)
+        self.logger.info(f"Amended {trade.symbol} brackets: {outcome}")
+        self.runtime_config.audit('amendment', symbol=trade.symbol, message_id=signal['message_id'],
+                                  changes=[(c.leg, c.old_price, c.new_price) for c in changes], outcome=outcome)
+        self.reconciler.poke()
+
+    async def _confirm_entry(self, symbol: str, side: int, entry: EntryFill):
+        """Take the entry size from the position when some entry orders couldn't be read back"""
+        try:
+            await self.reconciler.refresh()
+        except Exception as e:
+            self.logger.error(f"Entry orders {entry.unconfirmed} for {symbol} unconfirmed and positions "
+                              f"unavailable ({e}); bracketing the {entry.size} contracts read back")
+            return
+        position_type = 2 if side == 4 else 1
+        held = [pos for pos in self.reconciler.positions_for(symbol) if int(pos['position_type']) == position_type]
+        size = sum(int(pos['current_amount']) for pos in held)
+        self.logger.warning(f"Entry orders {entry.unconfirmed} for {symbol} unconfirmed: "
+                            f"{entry.size} contracts read back, {size} held")
+        if size != entry.size:
+            entry.size = size
+            entry.avg_price = float(held[0]['entry_price']) if held else 0.0
+
+    def _track_exit(self, trade: Trade, exits):
+        """Hand a trade's stop loss to the in-process exit engine"""
+        policy = ExitPolicy(
+            trail_percent=exits.callback_rate,
+            activate_after_tp=exits.trail_activation_target,
+            breakeven_after_tp=exits.breakeven_after_tp,
+            tighten_per_tp=exits.tighten_per_tp,
+            min_trail_percent=exits.min_trail_percent
+        )
+        self.exit_engine.add(
+            trade.symbol, trade.symbol, not trade.is_short, trade.entry_price,
+            trade.stop_loss, trade.take_profits, policy, context=trade
+        )
+
+    def _move_stop(self, position: TrackedPosition, stop: float) -> bool:
+        """Amend a trade's stop loss order; called by the exit engine off the event loop"""
+        trade = position.context
+        stop_loss = trade.brackets.get('stop_loss')
+        if not stop_loss or not stop_loss.get('order_id'):
+            return False
+
+        result = self.bitmart.modify_tp_sl_order(trade.symbol, stop_loss['order_id'], str(stop))
+        if result.get('code') != 1000:
+            self.logger.error(f"Error moving stop for {trade.symbol}: {result}")
+            return False
+
+        self.logger.info(f"Moved stop for {trade.symbol} to {stop}")
+        return True
+
+    def _stop_moved(self, position: TrackedPosition, stop: float):
+        """Record a stop the exchange accepted; called by the exit engine on the event loop"""
+        trade = position.context
+        trade.stop_loss = stop
+        stop_loss = trade.brackets.get('stop_loss')
+        if stop_loss:
+            stop_loss['price'] = stop
+
+    def _on_trade_closed(self, trade: Trade):
+        """Called by the reconciler when a trade's position is gone from the exchange"""
+        self.exit_engine.remove(trade.symbol)
+        self.risk.release(trade)
+        self._attribute(trade)
+
+    def _on_trade_reduced(self, trade: Trade, remaining: int):
+        """Called by the reconciler when take profits closed part of a trade's position"""
+        self.risk.reduce(trade, trade.notional * remaining / trade.size)
+
+    @staticmethod
+    def _tag_of(trade: Optional[Trade]) -> str:
+        """Client order id tag of a trade's orders; untagged when there's no trade"""
+        return trade_tag(trade.channel_id, trade.message_id) if trade else 'BOT'
+
+    def _attribute(self, trade: Trade):
+        """Fetch a closed trade's fills and fold its result into the attribution"""
+        if self.attribution and trade.filled_at:
+            self._spawn(self._attribute_fills(trade, time.time()))
+
+    async def _attribute_fills(self, trade: Trade, closed_at: float):
+        fills = await asyncio.to_thread(self.bitmart.get_trades, trade.symbol,
+                                        int(trade.opened_at) - 1, int(closed_at) + 1)
+        if fills.get('code') != 1000:
+            metrics.inc('attribution_errors_total')
+            self.logger.error(f"Error getting fills to attribute the {trade.symbol} trade: {fills}")
+            return
+        data = fills.get('data') or []
+        self.attribution.record(self.attribution.attribute(trade, data, closed_at))
+
+    def _release_margin(self, symbol: str, close_result: dict):
+        """Return a closed trade's margin to the balance cache"""
+        trade = self.trades.get(symbol)
+        if trade and close_result.get('code') == 1000:
+            self.balance.apply_close(trade.notional, trade.leverage)
+            self.risk.release(trade)
+
     def _cleanup_signal_cache(self, current_time: int):
         """Remove old signals from cache"""
         to_remove = []
         for key, timestamp in self.recent_signals.items():
-            if current_time - timestamp > self.signal_timeout:
+            if current_time - timestamp > self.config.trading.signal_timeout:
                 to_remove.append(key)
         
         for key in to_remove:
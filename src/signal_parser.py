@@ -0,0 +1,83 @@
+from models import PositionSide, TrailingConfig
+import re
+from typing import Optional
+
+class SignalParsingError(Exception):
+    pass
+
+def parse_signal(message: str) -> Optional[dict]:
+    """
+    Parse trading signal from message
+    Returns a dictionary with parsed signal data or None if message format doesn't match.
+    Raises if the message looks like a signal but is malformed.
+    """
+    # Split message into lines and remove empty lines
+    lines = [line.strip() for line in message.split('\n') if line.strip()]
+    
+    if len(lines) < 6:  # Minimum required lines for a valid signal
+        return None
+
+    # Parse first line for symbol and side
+    first_line = lines[0].split()
+    if len(first_line) != 2:
+        return None
+        
+    symbol = first_line[0]
+    side = PositionSide(first_line[1])
+    
+    # Initialize variables
+    leverage = None
+    entry = None
+    entry_zone = None
+    targets = []
+    stoploss = None
+    trailing_config = None
+    
+    # Parse remaining lines
+    for line in lines[1:]:
+        if line.startswith('Leverage:'):
+            # Handle both Cross and Isolated leverage
+            leverage_match = re.search(r'(Cross|Isolated) (\d+)[xX]', line)
+            if leverage_match:
+                leverage = int(leverage_match.group(2))
+        elif line.startswith('Entry'):  # Handle both "Entry:" and "Entry zone:"
+            entry_str = line.split(':')[1].strip()
+            # If entry is a range, take the first value and keep the whole zone
+            if '-' in entry_str:
+                low, high = (float(bound.strip()) for bound in entry_str.split('-', 1))
+                entry = low
+                entry_zone = (min(low, high), max(low, high))
+            else:
+                entry = float(entry_str)
+        elif line.startswith('Target'):
+            target = float(line.split(':')[1].strip())
+            targets.append(target)
+        elif line.startswith('Stoploss:'):
+            stoploss = float(line.split(':')[1].strip())
+        elif line.startswith('Trailing Configuration:'):
+            stop = re.search(r'Stop: ([^-]+)', line).group(1).strip()
+            trigger = re.search(r'Trigger: ([^)]+)', line).group(1).strip()
+            trailing_config = TrailingConfig(stop=stop, trigger=trigger)
+
+    if not all([leverage, entry, targets, stoploss]):
+        raise SignalParsingError("Missing required signal components")
+
+    return {
+        'symbol': symbol,
+        'side': 4 if side == PositionSide.SHORT else 1,
+        'leverage': str(leverage),
+        'size': 1,
+        'entry_price': entry,  # Make sure entry price is included
+        'entry_zone': entry_zone or (entry, entry),
+        'take_profits': targets,
+        'stop_loss': stoploss,
+        'is_short': side == PositionSide.SHORT
+    }
+
+def parse_cancellation(message: str) -> Optional[str]:
+    """Parse cancellation message to get symbol"""
+    # Match pattern #SYMBOL/USDT Manually Cancelled
+    match = re.match(r'#([A-Z]+)/USDT Manually Cancelled', message)
+    if match:
+        return f"{match.group(1)}USDT"
+    return None
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KIND_SIGNAL = 1
+KIND_CANCELLATION = 2
+
+MAX_TARGETS = 3  # Extra targets are dropped, missing ones are NaN
+
+# Column name -> dtype. Each column is a raw little-endian file appended in
+# batches and memory-mapped on load.
+COLUMNS = {
+    'channel_id': np.int64,
+    'message_id': np.int64,
+    'timestamp': np.int64,  # Message date, unix seconds
+    'kind': np.int8,
+    'symbol_id': np.int32,
+    'side': np.int8,  # BitMart open side: 1=long, 4=short, 0 for cancellations
+    'leverage': np.int16,
+    'entry': np.float64,
+    'targets': np.float64,  # MAX_TARGETS values per row
+    'stop_loss': np.float64,
+}
+
+class SignalStore:
+    """Columnar on-disk store of parsed channel signals
+
+    Rows are appended in batches; state.json records the committed row count
+    and the last ingested message id per channel, so an interrupted batch is
+    truncated away on the next open and ingestion resumes where it stopped.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._state_path = os.path.join(directory, 'state.json')
+        self._symbols_path = os.path.join(directory, 'symbols.json')
+
+        self.state = {'rows': 0, 'last_message_id': {}}
+        if os.path.exists(self._state_path):
+            with open(self._state_path) as f:
+                self.state = json.load(f)
+
+        self.symbols: List[str] = []
+        if os.path.exists(self._symbols_path):
+            with open(self._symbols_path) as f:
+                self.symbols = json.load(f)
+        self._symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self._truncate_uncommitted()
+
+    @property
+    def rows(self) -> int:
+        return self.state['rows']
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _width(self, name: str) -> int:
+        return MAX_TARGETS if name == 'targets' else 1
+
+    def _truncate_uncommitted(self):
+        """Drop rows written after the last committed state"""
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(name)
+            committed = self.rows * self._width(name) * np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) > committed:
+                logger.warning(f"Truncating uncommitted rows from {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(committed)
+
+    def symbol_id(self, symbol: str) -> int:
+        """Id of a symbol, registering it if new"""
+        if symbol not in self._symbol_ids:
+            self._symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self._symbol_ids[symbol]
+
+    def last_message_id(self, channel_id: int) -> int:
+        return self.state['last_message_id'].get(str(channel_id), 0)
+
+    def append(self, columns: Dict[str, np.ndarray], channel_id: int, last_message_id: int):
+        """Append a batch of rows and commit the ingestion position
+
+        Args:
+            columns: Arrays for every column in COLUMNS, all with the same row count
+            channel_id: Channel the batch was read from
+            last_message_id: Highest message id covered by the batch, parsed or not
+        """
+        count = len(columns['message_id'])
+        for name, dtype in COLUMNS.items():
+            values = np.ascontiguousarray(columns[name], dtype=dtype)
+            if len(values) != count:
+                raise ValueError(f"Column {name} has {len(values)} rows, expected {count}")
+            with open(self._column_path(name), 'ab') as f:
+                values.tofile(f)
+
+        # Symbols first: state must never reference an unknown symbol id
+        self._write_json(self._symbols_path, self.symbols)
+        self.state['rows'] += count
+        self.state['last_message_id'][str(channel_id)] = last_message_id
+        self._write_json(self._state_path, self.state)
+
+    def _write_json(self, path: str, data):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped view of a committed column"""
+        if self.rows == 0:
+            shape = (0, MAX_TARGETS) if name == 'targets' else (0,)
+            return np.empty(shape, dtype=COLUMNS[name])
+        shape = (self.rows, MAX_TARGETS) if name == 'targets' else (self.rows,)
+        return np.memmap(self._column_path(name), dtype=COLUMNS[name], mode='r', shape=shape)
+
+    def load(self, channels: Optional[Iterable[int]] = None, symbols: Optional[Iterable[str]] = None,
+             since: Optional[int] = None, until: Optional[int] = None,
+             kind: Optional[int] = KIND_SIGNAL) -> Dict[str, np.ndarray]:
+        """Load rows matching the filters without re-parsing any text
+
+        Args:
+            channels: Channel ids to keep
+            symbols: Symbols to keep
+            since: Keep messages at or after this unix time
+            until: Keep messages before this unix time
+            kind: KIND_SIGNAL, KIND_CANCELLATION or None for both
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        if channels is not None:
+            mask &= np.isin(self.column('channel_id'), np.fromiter(channels, dtype=np.int64))
+        if symbols is not None:
+            ids = [self._symbol_ids[s] for s in symbols if s in self._symbol_ids]
+            mask &= np.isin(self.column('symbol_id'), np.array(ids, dtype=np.int32))
+        if since is not None:
+            mask &= self.column('timestamp') >= since
+        if until is not None:
+            mask &= self.column('timestamp') < until
+        if kind is not None:
+            mask &= self.column('kind') == kind
+
+        return {name: np.asarray(self.column(name)[mask]) for name in COLUMNS}
+
+def empty_batch(size: int) -> Dict[str, np.ndarray]:
+    """Preallocated column arrays for a batch of `size` rows"""
+    batch = {name: np.zeros(size, dtype=dtype) for name, dtype in COLUMNS.items() if name != 'targets'}
+    batch['targets'] = np.full((size, MAX_TARGETS), np.nan)
+    for name in ('entry', 'stop_loss'):
+        batch[name][:] = np.nan
+    return batch
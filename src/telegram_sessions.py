@@ -0,0 +1,111 @@
+from telethon import TelegramClient, events
+from config import TelegramConfig
+from ingest_queue import RawMessage
+from metrics import metrics
+from typing import Callable, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SessionGroup:
+    """Several Telethon sessions listening to the same channels
+
+    Every session hands each message to on_message; the ingest pipeline keeps
+    the first copy of a message id and drops the rest. A session that
+    disconnects is reconnected in the background while the others keep
+    delivering, so one stuck connection doesn't cost a signal.
+    """
+
+    def __init__(self, config: TelegramConfig, on_message: Callable[[RawMessage], bool],
+                 extra_channels: List[int] = None):
+        self.config = config
+        self.on_message = on_message  # Returns False for a copy that was already seen
+        self.extra_channel_ids = list(extra_channels or [])  # Also listened to, e.g. shadow channels
+        self.clients = {}  # session name -> TelegramClient
+        self.channels = []  # Resolved signal channels, in configured order
+        self.extra_channels = []
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def client(self) -> Optional[TelegramClient]:
+        """A connected client, for sending alerts and other requests"""
+        for client in self.clients.values():
+            if client.is_connected():
+                return client
+        return next(iter(self.clients.values()), None)
+
+    @property
+    def channel(self):
+        return self.channels[0] if self.channels else None
+
+    async def connect(self):
+        """Start every session and resolve the channels; returns the first channel"""
+        channel_ids = [int(channel_id) for channel_id in str(self.config.channel_username).split(',')]
+        for session in self.config.sessions:
+            client = TelegramClient(session, self.config.api_id, self.config.api_hash)
+            try:
+                await client.start(phone=self.config.phone)
+                channels = [await client.get_entity(channel_id) for channel_id in channel_ids]
+                extra_channels = [await client.get_entity(channel_id) for channel_id in self.extra_channel_ids]
+            except Exception as e:
+                self.logger.error(f"Error starting session {session}: {e}")
+                continue
+            self.clients[session] = client
+            self.channels = self.channels or channels
+            self.extra_channels = self.extra_channels or extra_channels
+            metrics.set_gauge('telegram_session_connected', 1, session=session)
+            self.logger.info(f"Session {session} connected")
+
+        if not self.clients:
+            raise ValueError(f"No Telegram session could connect to channels {channel_ids}")
+        return self.channel
+
+    def add_handlers(self):
+        chats = [channel.id for channel in self.channels + self.extra_channels]
+        for session, client in self.clients.items():
+            handler = self._handler(session)
+            client.add_event_handler(handler, events.NewMessage(chats=chats))
+            client.add_event_handler(handler, events.MessageEdited(chats=chats))
+
+    def _handler(self, session: str):
+        async def handle_new_message(event):
+            received_at = time.time()
+            edited = isinstance(event, events.MessageEdited.Event) and event.message.edit_date
+            edit_date = edited.timestamp() if edited else 0.0
+            sent_at = edit_date or event.message.date.timestamp()
+            metrics.observe('telegram_arrival_delay_seconds', max(0.0, received_at - sent_at), session=session)
+            message = RawMessage(event.message.id, event.message.text or "", received_at,
+                                 channel_id=event.chat_id, session=session, edit_date=edit_date)
+            if self.on_message(message):
+                metrics.inc('telegram_first_arrivals_total', session=session)
+        return handle_new_message
+
+    async def run(self):
+        """Keep every session connected until cancelled"""
+        await asyncio.gather(*(self._supervise(session, client) for session, client in self.clients.items()))
+
+    async def _supervise(self, session: str, client: TelegramClient):
+        delay = 1.0
+        while True:
+            try:
+                await client.run_until_disconnected()
+            except Exception as e:
+                self.logger.error(f"Session {session} failed: {e}")
+            metrics.set_gauge('telegram_session_connected', 0, session=session)
+            self.logger.warning(f"Session {session} disconnected, reconnecting in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            try:
+                await client.connect()
+                if await client.is_user_authorized():
+                    # Ask for the updates missed while the session was down
+                    await client.catch_up()
+                    metrics.set_gauge('telegram_session_connected', 1, session=session)
+                    self.logger.info(f"Session {session} reconnected")
+                    delay = 1.0
+                    continue
+                self.logger.error(f"Session {session} is no longer authorized")
+            except Exception as e:
+                self.logger.error(f"Error reconnecting session {session}: {e}")
+            delay = min(delay * 2, 60.0)
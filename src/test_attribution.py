@@ -0,0 +1,71 @@
+from attribution import Attribution, trade_tag
+from bitmart_client import tagged_orders
+from config import AttributionConfig
+from metrics import metrics
+from models import Trade
+from offline_exchange import OfflineExchange
+import logging
+import tempfile
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def open_trade(exchange: OfflineExchange, channel_id: int, message_id: int, stop_loss: float) -> Trade:
+    trade = Trade(symbol="BTCUSDT", side=1, size=10, leverage="10", entry_price=100.0, stop_loss=stop_loss,
+                  signal_stop_loss=stop_loss, take_profits=[110.0], notional=100.0, channel_id=channel_id,
+                  message_id=message_id, opened_at=time.time() - 1)
+    with tagged_orders(trade_tag(channel_id, message_id)):
+        exchange.submit_order("BTCUSDT", side=1, size=10, leverage="10", open_type="cross")
+    trade.filled_at = time.time()
+    trade.protected_at = trade.filled_at + 0.25
+    trade.brackets = {'entry': {'price': 100.0, 'size': 10}, 'tp1': {'price': 110.0, 'size': 10},
+                      'stop_loss': {'price': stop_loss, 'size': 10}}
+    return trade
+
+def close(exchange: OfflineExchange, trade: Trade, price: float):
+    exchange.prices["BTCUSDT"] = price
+    with tagged_orders(trade_tag(trade.channel_id, trade.message_id)):
+        exchange.submit_order("BTCUSDT", side=3, size=10, leverage="10", open_type="cross")
+
+def test_attribution():
+    # Contract size 0.1: 10 contracts at 100 is 100 USDT
+    exchange = OfflineExchange(prices={"BTCUSDT": 100.0}, latency=0.0, volatility=0.0)
+    exchange.taker_fee = 0.001
+    directory = tempfile.mkdtemp()
+    attribution = Attribution(AttributionConfig(path=directory))
+
+    assert len(trade_tag(-1001234567890, 99999)) <= 15
+    winner = open_trade(exchange, -1001, 7, stop_loss=95.0)
+    close(exchange, winner, 110.0)
+    # An untagged fill in the window still counts; another trade's tagged fill doesn't
+    other = {**exchange.trade_log[-1], 'client_order_id': f"{trade_tag(-1002, 1)}_1_1", 'realised_profit': "50"}
+    fills = list(exchange.trade_log) + [other]
+    result = attribution.attribute(winner, fills, time.time())
+    logger.info(f"Winner: {result}")
+    # +10 on 1 BTC of exposure, fees on 100 + 110 notional, risk 5 USDT to the stop
+    assert result.fills == 2 and result.exit == 'tp'
+    assert abs(result.fees - 0.21) < 1e-6 and abs(result.pnl - 9.79) < 1e-6
+    assert abs(result.r - 9.79 / 5) < 1e-6 and abs(result.time_to_protect - 0.25) < 1e-6
+    assert attribution.record(result) and not attribution.record(result)
+
+    loser = open_trade(exchange, -1001, 8, stop_loss=95.0)
+    close(exchange, loser, 95.0)
+    result = attribution.attribute(loser, exchange.get_trades("BTCUSDT")['data'][2:], time.time())
+    assert result.exit == 'stop_loss' and result.pnl < 0
+    attribution.record(result)
+
+    stats = attribution.totals['channel']['-1001']
+    assert stats.trades == 2 and stats.win_rate == 0.5
+    assert metrics.get_gauge('attribution_channel_trades', channel='-1001') == 2
+    assert metrics.get_gauge('attribution_symbol_win_rate', symbol='BTCUSDT') == 0.5
+
+    # A restart resumes from the rollup without the fills
+    reloaded = Attribution(AttributionConfig(path=directory))
+    reloaded.load()
+    again = reloaded.totals['channel']['-1001']
+    assert again.trades == 2 and abs(again.pnl - stats.pnl) < 1e-9 and again.exits == stats.exits
+    logger.info(f"Channels: {reloaded.summary('channel')}")
+
+if __name__ == "__main__":
+    test_attribution()
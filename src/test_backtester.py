@@ -0,0 +1,53 @@
+from backtester import Backtester, BacktestParams, summarize
+from kline_store import KLINE_DTYPE
+import json
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeKlineStore:
+    """Serves a hand-made price path for every symbol"""
+
+    def __init__(self, prices):
+        candles = np.zeros(len(prices), dtype=KLINE_DTYPE)
+        candles['timestamp'] = 1700000000 + 60 * np.arange(len(prices))
+        candles['open'] = candles['close'] = prices
+        candles['high'] = np.asarray(prices) * 1.001
+        candles['low'] = np.asarray(prices) * 0.999
+        self.candles = candles
+
+    def load(self, symbol, step):
+        return self.candles
+
+def test_backtester():
+    # Up to 104 (through all three targets), then back down to 95, in steps
+    # smaller than the candle range so no level is gapped
+    prices = [100.0] * 5 + list(np.linspace(100, 104, 200)) + list(np.linspace(104, 95, 400))
+    store = FakeKlineStore(prices)
+
+    signals = {
+        'timestamp': np.array([1700000000 - 1, 1700000000 - 1]),
+        'symbol_id': np.array([0, 0]),
+        'side': np.array([1, 4]),  # One long, one short
+        'targets': np.array([[101.0, 102.0, 103.0], [99.0, 98.0, 97.0]]),
+        'stop_loss': np.array([97.0, 102.0]),
+    }
+    # 0.01 contract size and min volume 1: 15 USDT at 100 is 15 contracts, 5 per TP
+    backtester = Backtester.from_stores(signals, ['TESTUSDT'], store, 1, {'TESTUSDT': (0.01, 1)})
+    results = backtester.run(BacktestParams(horizon=700, taker_fee=0.0))
+    logger.info(json.dumps(summarize(results), indent=2))
+
+    # Long: all targets fill, the 0 contracts left are never trailed out
+    assert results['size'][0] == 15
+    assert results['tp_hit'][0].tolist() == [True, True, True]
+    assert abs(results['pnl'][0] - 0.01 * 5 * (1 + 2 + 3)) < 1e-9
+
+    # Short: stopped out at 102 for the full size before any target
+    assert results['tp_hit'][1].tolist() == [False, False, False]
+    assert results['sl_hit'][1]
+    assert abs(results['pnl'][1] - 0.01 * 15 * (100 - 102)) < 1e-9
+
+if __name__ == "__main__":
+    test_backtester()
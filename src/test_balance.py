@@ -0,0 +1,47 @@
+from balance import BalanceCache
+from config import ReconcileConfig, SizingConfig
+from offline_exchange import OfflineExchange
+from reconciler import PositionReconciler
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_balance():
+    # BTC at 60000 with contract size 0.0001: 6 USDT per contract
+    exchange = OfflineExchange(prices={"BTCUSDT": 60000.0}, latency=0.0, volatility=0.0, equity=10000.0)
+    balance = BalanceCache(exchange)
+    percent = SizingConfig(mode="percent_equity", equity_percent=5.0)
+
+    # Not seeded yet: every mode falls back to the fixed value
+    assert balance.target_notional(percent, 60000.0, leverage="10") == percent.usdt_value
+    balance.seed()
+    assert balance.equity == 10000.0 and balance.available == 10000.0
+
+    # 5% of equity as margin at 10x, and the size in contracts that follows from it
+    assert balance.target_notional(percent, 60000.0, leverage="10") == 5000.0
+    assert exchange.calculate_position_size("BTCUSDT", 60000.0, 5000.0) == 833
+    risk = SizingConfig(mode="risk", risk_percent=0.5)
+    assert abs(balance.target_notional(risk, 60000.0, stop_loss=58800.0, leverage="10") - 2500.0) < 1e-6
+
+    # Opening 98000 USDT at 10x reserves 9800 of margin; sizing is capped by what is left
+    balance.apply_open(98000.0, "10")
+    assert balance.available == 200.0 and balance.position_margin == 9800.0
+    assert balance.target_notional(percent, 60000.0, leverage="10") == 2000.0
+    assert exchange.calculate_position_size("BTCUSDT", 60000.0, 2000.0) == 333
+    balance.apply_close(98000.0, "10", realized_pnl=50.0)
+    assert balance.available == 10050.0 and balance.equity == 10050.0 and balance.position_margin == 0.0
+
+    # A reconciler pass overwrites the local figures with the exchange's
+    exchange.submit_order("BTCUSDT", side=1, size=1000, leverage="10", open_type="cross")
+    seeded_at = balance.updated_at
+    reconciler = PositionReconciler(exchange, {}, ReconcileConfig(), balance)
+    asyncio.run(reconciler.reconcile())
+    assert balance.updated_at >= seeded_at
+    assert balance.equity == 10000.0 and balance.position_margin == 600.0 and balance.available == 9400.0
+    assert balance.target_notional(percent, 60000.0, leverage="10") == 5000.0
+    logger.info(f"Balance: equity {balance.equity}, available {balance.available}")
+
+if __name__ == "__main__":
+    test_balance()
@@ -0,0 +1,62 @@
+from bracket_amender import BracketAmender, plan_changes
+from models import Trade
+from offline_exchange import OfflineExchange
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def open_trade(exchange: OfflineExchange) -> Trade:
+    trade = Trade(symbol="ETHUSDT", side=1, size=9, leverage="10", entry_price=3000.0, stop_loss=2900.0,
+                  signal_stop_loss=2900.0, take_profits=[3050.0, 3100.0, 3150.0], message_id=7)
+    exchange.submit_order("ETHUSDT", side=1, size=9, leverage="10", open_type="cross")
+    result = exchange.submit_trail_order("ETHUSDT", side=3, size=9, leverage="10", open_type="cross",
+                                         activation_price="3050")
+    trade.brackets['trail'] = {'order_id': result['data']['order_id'], 'price': 3050.0, 'size': 9}
+    for i, price in enumerate(trade.take_profits, 1):
+        result = exchange.submit_plan_order("ETHUSDT", side=3, size=3, leverage="10", open_type="cross",
+                                            trigger_price=str(price), order_type="market")
+        trade.brackets[f'tp{i}'] = {'order_id': result['data']['order_id'], 'price': price, 'size': 3}
+    result = exchange.submit_tp_sl_order("ETHUSDT", side=3, type="stop_loss", size=9, trigger_price="2900")
+    trade.brackets['stop_loss'] = {'order_id': result['data']['order_id'], 'price': 2900.0, 'size': 9}
+    return trade
+
+def signal(stop_loss, take_profits):
+    return {'symbol': "ETHUSDT", 'side': 1, 'entry_price': 3000.0, 'stop_loss': stop_loss,
+            'take_profits': take_profits, 'message_id': 7}
+
+def test_bracket_amender():
+    exchange = OfflineExchange(prices={"ETHUSDT": 3000.0}, latency=0.0, volatility=0.0)
+    trade = open_trade(exchange)
+    amender = BracketAmender(exchange)
+
+    assert plan_changes(trade, signal(2900, [3050, 3100, 3150]), 1) == []
+
+    # Stop and second target moved, third target dropped; the first target drives the trail
+    changes = plan_changes(trade, signal(2950, [3060, 3120]), 1)
+    assert {c.leg: c.new_price for c in changes} == {
+        'stop_loss': 2950.0, 'tp1': 3060.0, 'tp2': 3120.0, 'tp3': None, 'trail': 3060.0
+    }
+    trail_id = trade.brackets['trail']['order_id']
+    outcome = dict(asyncio.run(amender.apply(trade, changes, callback_rate=2.0)))
+    logger.info(f"Outcome: {outcome}")
+    assert outcome == {'stop_loss': 'modified', 'tp1': 'modified', 'tp2': 'modified',
+                       'tp3': 'cancelled', 'trail': 'replaced'}
+
+    # The position is untouched; the exchange holds exactly the amended legs
+    assert exchange.positions[("ETHUSDT", 1)]['size'] == 9
+    plans = {plan['order_id']: plan for plan in exchange.plan_orders.values()}
+    assert trail_id not in plans and 'tp3' not in trade.brackets
+    for leg, bracket in trade.brackets.items():
+        assert float(plans[bracket['order_id']]['trigger_price']) == bracket['price'], leg
+    assert len(plans) == len(trade.brackets) == 4
+
+    # A stop that trailed to 3010 isn't loosened by an edit to 2980, but is tightened by one to 3020
+    trade.signal_stop_loss = 2950.0
+    trade.brackets['stop_loss']['price'] = 3010.0
+    assert plan_changes(trade, signal(2980, [3060, 3120]), 1) == []
+    assert [(c.leg, c.new_price) for c in plan_changes(trade, signal(3020, [3060, 3120]), 1)] == [('stop_loss', 3020.0)]
+
+if __name__ == "__main__":
+    test_bracket_amender()
@@ -0,0 +1,61 @@
+from bitmart_client import BitmartClient
+from config import BitmartConfig, ConnectionConfig
+from connection_warmer import ConnectionWarmer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics import metrics
+import logging
+import socket
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TimeHandler(BaseHTTPRequestHandler):
+    """Keep-alive /system/time endpoint that remembers its connections"""
+    protocol_version = "HTTP/1.1"
+    connections = []
+
+    def do_GET(self):
+        if self.connection not in self.connections:
+            self.connections.append(self.connection)
+        body = b'{"code":1000,"data":{"server_time":%d}}' % int(time.time() * 1000)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def requests_by_conn() -> dict:
+    return {dict(labels)['conn']: histogram.count for (name, labels), histogram in metrics.histograms.items()
+            if name == 'bitmart_request_seconds' and dict(labels)['endpoint'] == '/system/time'}
+
+def test_connection_warmer():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TimeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    class LocalClient(BitmartClient):
+        BASE_URL = f"http://127.0.0.1:{server.server_port}"
+
+    client = LocalClient(BitmartConfig(api_key="test", api_secret="test", memo="test"))
+    warmer = ConnectionWarmer(client, ConnectionConfig(warm_connections=1))
+    warmer.install()
+    warmer.dns_cache.uninstall()
+    try:
+        assert warmer.warm() == 1 and warmer.warm() == 1
+        assert requests_by_conn() == {'cold': 1, 'warm': 1}
+
+        # The server drops the idle connection; urllib3 reopens it on the same pooled
+        # connection object, and that request must still count as cold
+        TimeHandler.connections[-1].shutdown(socket.SHUT_RDWR)
+        time.sleep(0.1)
+        assert warmer.warm() == 1
+        assert requests_by_conn() == {'cold': 2, 'warm': 1}, requests_by_conn()
+        logger.info(f"Requests by connection: {requests_by_conn()}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_connection_warmer()
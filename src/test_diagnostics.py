@@ -0,0 +1,39 @@
+from config import DiagnosticsConfig
+from diagnostics import Diagnostics
+import asyncio
+import logging
+import os
+import pstats
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def sign_request():
+    # Stands in for the signing, network and JSON work of a client call
+    return sum(i * i for i in range(10000))
+
+async def profile_trade():
+    directory = tempfile.mkdtemp()
+    diagnostics = Diagnostics(DiagnosticsConfig(profile_trades=True, profile_dir=directory))
+    diagnostics.set_enabled(True)
+    try:
+        # A call of another task's runs alongside, but only the trade's own worker call is profiled
+        other = asyncio.create_task(asyncio.to_thread(sign_request))
+        with diagnostics.profile("BTCUSDT", 7):
+            await asyncio.to_thread(sign_request)
+        await other
+    finally:
+        diagnostics.set_enabled(False)
+
+    [name] = os.listdir(directory)
+    assert name.endswith("_BTCUSDT_7.prof")
+    stats = pstats.Stats(os.path.join(directory, name))
+    calls = [value[0] for (_, _, function), value in stats.stats.items() if function == 'sign_request']
+    assert calls == [1], calls
+
+def test_diagnostics():
+    asyncio.run(profile_trade())
+
+if __name__ == "__main__":
+    test_diagnostics()
@@ -0,0 +1,93 @@
+from config import EntryConfig
+from entry_executor import EntryExecutor, ladder_prices, split_size
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeBitmart:
+    """Fills limit orders priced at or through the market, market orders at once"""
+
+    def __init__(self, last_price: float, min_volume: int = 1):
+        self.last_price = last_price
+        self.min_volume = min_volume
+        self.orders = {}
+
+    def get_contract_details(self, symbol=None):
+        return {'code': 1000, 'data': {'symbols': [{'symbol': symbol, 'last_price': str(self.last_price)}]}}
+
+    def _get_min_volume(self, symbol):
+        return self.min_volume
+
+    def submit_order(self, symbol, side, size, leverage, open_type, order_type="market", price=None, **kwargs):
+        order_id = str(len(self.orders) + 1)
+        price = self.last_price if order_type == "market" else float(price)
+        buys = side == 1
+        marketable = order_type == "market" or (price >= self.last_price if buys else price <= self.last_price)
+        self.orders[order_id] = {
+            'deal_size': size if marketable else 0,
+            'deal_avg_price': price if marketable else 0,
+            'state': 4 if marketable else 2
+        }
+        return {'code': 1000, 'data': {'order_id': order_id}}
+
+    def get_order(self, symbol, order_id):
+        return {'code': 1000, 'data': self.orders[order_id]}
+
+    def cancel_order(self, symbol, order_id):
+        self.orders[order_id]['state'] = 4
+        return {'code': 1000}
+
+async def test_entry_executor():
+    assert split_size(10, 3, 1) == [4, 3, 3]
+    assert split_size(5, 3, 2) == [3, 2]
+    assert ladder_prices((100.0, 102.0), 3, is_short=False) == [102.0, 101.0, 100.0]
+    assert ladder_prices((100.0, 102.0), 3, is_short=True) == [100.0, 101.0, 102.0]
+
+    signal = {'symbol': 'TESTUSDT', 'side': 1, 'leverage': '10', 'entry_zone': (100.0, 102.0)}
+    config = EntryConfig(mode="ladder", rungs=3, timeout=0.05, poll_interval=0.01, on_timeout="cancel")
+
+    # Market at 101: the 102 and 101 rungs fill, the 100 rung is cancelled
+    fill = await EntryExecutor(FakeBitmart(101.0)).execute(signal, 9, config)
+    assert fill.size == 6
+    assert fill.avg_price == 101.5
+    assert abs(fill.slippage(is_short=False) - 0.5 / 101 * 100) < 1e-9
+
+    # Converting the remainder fills the whole size
+    config.on_timeout = "market"
+    fill = await EntryExecutor(FakeBitmart(101.0)).execute(signal, 9, config)
+    assert fill.size == 9
+    logger.info(f"Ladder with market remainder: {fill}")
+
+    # A market entry measured against the price read while sizing makes no extra lookup
+    bitmart = FakeBitmart(101.0)
+    bitmart.get_contract_details = None
+    fill = await EntryExecutor(bitmart).execute(signal, 9, EntryConfig(), market_price=100.0)
+    assert fill.size == 9 and fill.market_price == 100.0 and abs(fill.slippage(is_short=False) - 1.0) < 1e-9
+
+class UnreliableBitmart(FakeBitmart):
+    """Fails every order query and cancel"""
+
+    def get_order(self, symbol, order_id):
+        return {'code': 30000, 'message': "service unavailable"}
+
+    def cancel_order(self, symbol, order_id):
+        return {'code': 30000, 'message': "service unavailable"}
+
+async def test_unconfirmed_entry():
+    signal = {'symbol': 'TESTUSDT', 'side': 1, 'leverage': '10', 'entry_zone': (100.0, 102.0)}
+    # A market order whose fill can't be read isn't counted as filled
+    bitmart = UnreliableBitmart(101.0)
+    fill = await EntryExecutor(bitmart).execute(signal, 9, EntryConfig(), market_price=101.0)
+    assert not fill.filled and fill.unconfirmed == ['1']
+
+    # A ladder order that can't be confirmed cancelled may still be resting: no market top-up
+    bitmart = UnreliableBitmart(101.0)
+    config = EntryConfig(mode="ladder", rungs=3, timeout=0.05, poll_interval=0.01, on_timeout="market")
+    fill = await EntryExecutor(bitmart).execute(signal, 9, config)
+    assert not fill.filled and sorted(fill.unconfirmed) == ['1', '2', '3'] and len(bitmart.orders) == 3
+
+if __name__ == "__main__":
+    asyncio.run(test_entry_executor())
+    asyncio.run(test_unconfirmed_entry())
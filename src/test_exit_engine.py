@@ -0,0 +1,81 @@
+from exit_engine import ExitEngine, ExitPolicy, ExitSimulator
+import asyncio
+import json
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_exit_engine():
+    sent = []
+    engine = ExitEngine(lambda position, stop: sent.append((position.key, stop)) or True)
+    policy = ExitPolicy(trail_percent=2.0, activate_after_tp=2, breakeven_after_tp=1)
+    engine.add('long', 'TESTUSDT', True, 100.0, 97.0, [101.0, 102.0, 103.0], policy)
+    engine.add('short', 'TESTUSDT', False, 100.0, 103.0, [99.0, 98.0, 97.0], policy)
+
+    # First target of the long: stop to breakeven, not trailing yet
+    engine.on_tick('TESTUSDT', 101.0)
+    assert engine.positions['long'].stop_price == 100.0
+    assert engine.positions['short'].stop_price == 103.0
+
+    # Second target: trail 2% under the best price; several ticks, one amend
+    engine.on_tick('TESTUSDT', 102.0)
+    engine.on_tick('TESTUSDT', 104.0)
+    engine.on_tick('TESTUSDT', 103.5)
+    assert abs(engine.positions['long'].stop_price - 104.0 * 0.98) < 1e-9
+    assert engine.flush() == 1
+    assert sent == [('long', engine.positions['long'].stop_price)]
+
+    # The short's stop is hit and it is no longer tracked
+    assert 'short' not in engine.positions
+
+    # Long stopped out below the trailed stop
+    engine.on_tick('TESTUSDT', 101.0)
+    assert not engine.positions
+
+    # A stop moved locally but not yet on the exchange: crossing it doesn't end tracking
+    engine.add('lagging', 'TESTUSDT', True, 100.0, 97.0, [101.0, 102.0, 103.0], policy)
+    engine.on_tick('TESTUSDT', 101.0)
+    engine.on_tick('TESTUSDT', 99.5)
+    assert 'lagging' in engine.positions and engine.positions['lagging'].stop_price == 100.0
+    engine.flush()
+    engine.on_tick('TESTUSDT', 99.5)
+    assert 'lagging' not in engine.positions
+
+async def remove_during_send():
+    # The send runs in a worker thread and fails; the position is removed on the loop meanwhile
+    sending, release = threading.Event(), threading.Event()
+
+    def send(position, stop):
+        sending.set()
+        release.wait(5)
+        return False
+
+    moved = []
+    engine = ExitEngine(send, coalesce_window=0.01, on_stop_moved=lambda p, stop: moved.append(stop))
+    engine.add('long', 'TESTUSDT', True, 100.0, 97.0, [101.0], ExitPolicy(activate_after_tp=1))
+    engine.on_tick('TESTUSDT', 101.0)
+    runner = asyncio.create_task(engine.run())
+    while not sending.is_set():
+        await asyncio.sleep(0.01)
+    engine.remove('long')
+    release.set()
+    await asyncio.sleep(0.05)
+    runner.cancel()
+    # Not put back for a retry that would never end
+    assert not engine.positions and not engine._dirty and not moved
+
+def test_exit_engine_threaded():
+    asyncio.run(remove_during_send())
+
+def test_exit_simulator():
+    stats = ExitSimulator(positions=500, symbols=50, seed=1).run(ticks=200000)
+    logger.info(json.dumps(stats, indent=2))
+    assert stats['stops_monotonic']
+    assert stats['stop_updates'] > 0
+
+if __name__ == "__main__":
+    test_exit_engine()
+    test_exit_engine_threaded()
+    test_exit_simulator()
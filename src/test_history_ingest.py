@@ -0,0 +1,88 @@
+from history_ingest import ingest_channel
+from signal_store import SignalStore, KIND_CANCELLATION, KIND_SIGNAL
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import asyncio
+import logging
+import numpy as np
+import os
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIGNAL = """{symbol} {direction}
+Leverage: Cross 20x
+Entry: {entry}
+Target 1: {t1}
+Target 2: {t2}
+Target 3: {t3}
+Stoploss: {stop}"""
+
+def signal_text(symbol: str, entry: float, short: bool = False) -> str:
+    d = -1 if short else 1
+    return SIGNAL.format(symbol=symbol, direction="SHORT" if short else "LONG", entry=entry,
+                         t1=entry * (1 + d * 0.01), t2=entry * (1 + d * 0.02), t3=entry * (1 + d * 0.03),
+                         stop=entry * (1 - d * 0.02))
+
+class FakeTelegram:
+    """Serves a channel's history the way Telethon's iter_messages pages it"""
+
+    def __init__(self, history):
+        self.history = history  # (message id, unix time, text), in id order
+        self.pages = []  # min_id of every iter_messages call
+
+    async def get_entity(self, channel_id):
+        return channel_id
+
+    async def iter_messages(self, channel, min_id=0, reverse=False, wait_time=None):
+        assert reverse, "history is read oldest first"
+        self.pages.append(min_id)
+        for message_id, timestamp, text in self.history:
+            if message_id > min_id:
+                yield SimpleNamespace(id=message_id, date=datetime.fromtimestamp(timestamp, timezone.utc), text=text)
+
+def test_history_ingest():
+    history = [
+        (1, 1700000000, signal_text("BTCUSDT", 60000.0)),
+        (2, 1700000100, "Good morning everyone"),
+        (3, 1700000200, signal_text("ETHUSDT", 3000.0, short=True)),
+        (4, 1700000300, "#BTC/USDT Manually Cancelled"),
+        (5, 1700000400, None),
+        (6, 1700000500, signal_text("SOLUSDT", 150.0)),
+        (7, 1700000600, signal_text("BTCUSDT", 61000.0, short=True)),
+    ]
+    telegram = FakeTelegram(history[:5])
+    directory = tempfile.mkdtemp()
+    store = SignalStore(directory)
+
+    # Committed in batches of two; chatter and empty messages are skipped
+    asyncio.run(ingest_channel(telegram, store, -1001, batch_size=2))
+    assert store.rows == 3 and store.last_message_id(-1001) == 5
+
+    # A later run resumes after the last message and only adds the new ones
+    telegram.history = history
+    asyncio.run(ingest_channel(telegram, store, -1001, batch_size=2))
+    assert telegram.pages == [0, 5] and store.rows == 5
+
+    # A batch written but never committed is dropped when the store is reopened
+    with open(os.path.join(directory, 'message_id.bin'), 'ab') as f:
+        np.array([99], dtype=np.int64).tofile(f)
+    store = SignalStore(directory)
+    assert os.path.getsize(os.path.join(directory, 'message_id.bin')) == 5 * 8
+
+    # Columns come back typed and filterable without the text
+    signals = store.load(channels=[-1001])
+    assert list(signals['message_id']) == [1, 3, 6, 7]
+    assert list(signals['side']) == [1, 4, 1, 4] and list(signals['leverage']) == [20] * 4
+    btc = store.load(symbols=["BTCUSDT"])
+    assert list(btc['entry']) == [60000.0, 61000.0]
+    assert np.allclose(btc['targets'][0], [60600.0, 61200.0, 61800.0]) and btc['stop_loss'][0] == 58800.0
+    cancellations = store.load(kind=KIND_CANCELLATION)
+    assert list(cancellations['message_id']) == [4]
+    assert store.symbols[cancellations['symbol_id'][0]] == "BTCUSDT"
+    assert list(store.load(since=1700000200, until=1700000600, kind=KIND_SIGNAL)['message_id']) == [3, 6]
+    logger.info(f"Stored {store.rows} rows for symbols {store.symbols}")
+
+if __name__ == "__main__":
+    test_history_ingest()
@@ -0,0 +1,63 @@
+from config import IngestConfig
+from ingest_queue import BoundedPriorityQueue, IngestPipeline, RawMessage, PRIORITY_CANCELLATION, PRIORITY_SIGNAL
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def test_queue():
+    dropped = []
+    queue = BoundedPriorityQueue("test", 3, "drop_oldest", levels=2, on_overflow=lambda reason, item: dropped.append((reason, item)))
+    for i in range(4):
+        queue.put_nowait(f"signal{i}", PRIORITY_SIGNAL)
+    assert dropped == [("dropped", "signal0")]
+
+    # A cancellation evicts a signal and jumps the queue
+    queue.put_nowait("cancel", PRIORITY_CANCELLATION)
+    assert await queue.get() == "cancel"
+    assert [await queue.get() for _ in range(2)] == ["signal2", "signal3"]
+
+    rejecting = BoundedPriorityQueue("test", 1, "reject", levels=2, on_overflow=lambda reason, item: dropped.append((reason, item)))
+    assert rejecting.put_nowait("a", PRIORITY_SIGNAL)
+    assert not rejecting.put_nowait("b", PRIORITY_SIGNAL)
+    assert dropped[-1] == ("rejected", "b")
+
+async def test_pipeline():
+    handled = []
+
+    async def slow_signal(payload):
+        await asyncio.sleep(0.05)
+        handled.append(payload)
+
+    async def cancellation(payload):
+        handled.append(payload)
+
+    def classify(message: RawMessage):
+        if message.text.startswith("cancel "):
+            return 'cancellation', message.text, PRIORITY_CANCELLATION
+        return 'signal', message.text, PRIORITY_SIGNAL
+
+    superseded = []
+    pipeline = IngestPipeline(IngestConfig(), classify, {'signal': slow_signal, 'cancellation': cancellation},
+                              supersedes=lambda work, queued: queued == ('signal', work[1][len("cancel "):]),
+                              on_superseded=superseded.append)
+    pipeline.start()
+    for i, text in enumerate(["s1", "s2", "s3", "cancel s2"]):
+        assert pipeline.submit(RawMessage(i, text, session="a"))
+        # The same message from a second session is dropped
+        assert not pipeline.submit(RawMessage(i, text, session="b"))
+    # An edit is a new version of the message, its copies are still dropped
+    assert pipeline.submit(RawMessage(0, "s1 edited", session="a", edit_date=1.0))
+    assert not pipeline.submit(RawMessage(0, "s1 edited", session="b", edit_date=1.0))
+    await asyncio.sleep(0.4)
+    await pipeline.stop()
+    # The whole burst is parsed before the first execution, so the cancellation runs first
+    # and the s2 signal it cancelled never runs
+    assert handled == ["cancel s2", "s1", "s3", "s1 edited"], handled
+    assert superseded == [('signal', "s2")]
+
+if __name__ == "__main__":
+    asyncio.run(test_queue())
+    asyncio.run(test_pipeline())
+    logger.info("ok")
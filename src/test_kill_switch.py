@@ -0,0 +1,83 @@
+from config import EntryConfig, KillSwitchConfig
+from entry_executor import EntryExecutor
+from offline_exchange import OfflineExchange
+from kill_switch import KillSwitch
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FlakyExchange(OfflineExchange):
+    """Once flaky, fails the first call of each cancel and close"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.flaky = False
+        self.failed = set()
+
+    def _request(self, method, endpoint, params=None, body=None, signed=True):
+        key = (endpoint, (body or {}).get('symbol'), (body or {}).get('order_id'))
+        if self.flaky and ('cancel' in endpoint or endpoint.endswith('submit-order')):
+            if key not in self.failed:
+                self.failed.add(key)
+                raise ConnectionError(f"reset on {endpoint}")
+        return super()._request(method, endpoint, params=params, body=body, signed=signed)
+
+def open_book(exchange: OfflineExchange):
+    for symbol, side in (("BTCUSDT", 1), ("ETHUSDT", 4)):
+        exchange.submit_order(symbol, side=side, size=10, leverage="10", open_type="cross")
+        exchange.submit_tp_sl_order(symbol, side=3 if side == 1 else 2, type="stop_loss", size=10,
+                                    trigger_price=str(exchange.prices[symbol] * (0.9 if side == 1 else 1.1)))
+    exchange.submit_plan_order("BTCUSDT", side=3, size=5, leverage="10", open_type="cross",
+                               trigger_price=str(exchange.prices["BTCUSDT"] * 1.1), order_type="market")
+    trail = exchange.submit_trail_order("ETHUSDT", side=2, size=10, leverage="10", open_type="cross",
+                                        activation_price=str(exchange.prices["ETHUSDT"] * 0.95))
+    # A resting entry far from the price
+    exchange.submit_order("BTCUSDT", side=1, size=1, leverage="10", open_type="cross",
+                          order_type="limit", price=exchange.prices["BTCUSDT"] * 0.5)
+    return [("ETHUSDT", trail['data']['order_id'])]
+
+def test_kill_switch():
+    exchange = FlakyExchange(latency=0.0, volatility=0.0)
+    trails = open_book(exchange)
+    assert len(exchange.positions) == 2 and len(exchange.plan_orders) == 4
+
+    exchange.flaky = True
+    kill_switch = KillSwitch(exchange, KillSwitchConfig(retry_delay=0.01), trail_orders=lambda: trails)
+    report = asyncio.run(kill_switch.flatten("test"))
+    logger.info(str(report))
+
+    assert report.flat and not report.failures and report.rounds == 1
+    # Closing a position also drops its brackets, so some cancels find nothing to cancel
+    assert report.positions_closed == 2 and report.orders_cancelled >= 1
+    assert not exchange.positions and not exchange.plan_orders
+    assert not [o for o in exchange.orders.values() if o['state'] == 2]
+
+async def flatten_during_entry():
+    exchange = OfflineExchange(latency=0.0, volatility=0.0)
+    halted = False
+    executor = EntryExecutor(exchange, halted=lambda: halted)
+    price = exchange.prices["BTCUSDT"]
+    signal = {'symbol': "BTCUSDT", 'side': 1, 'leverage': "10", 'entry_zone': (price * 0.5, price * 0.6)}
+    # A ladder far below the price, set to buy the remainder at market on timeout
+    entry = asyncio.create_task(executor.execute(
+        signal, 10, EntryConfig(mode="ladder", rungs=2, timeout=0.5, poll_interval=0.02, on_timeout="market")
+    ))
+    await asyncio.sleep(0.05)
+
+    halted = True
+    kill_switch = KillSwitch(exchange, KillSwitchConfig(retry_delay=0.01), in_flight=lambda: [entry])
+    report = await kill_switch.flatten("test")
+    logger.info(str(report))
+    # The ladder was cancelled and no market order followed it
+    assert entry.done() and not entry.result().filled
+    assert report.flat and not exchange.positions
+    assert not [o for o in exchange.orders.values() if o['state'] == 2]
+
+def test_flatten_during_entry():
+    asyncio.run(flatten_during_entry())
+
+if __name__ == "__main__":
+    test_kill_switch()
+    test_flatten_during_entry()
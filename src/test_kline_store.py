@@ -0,0 +1,54 @@
+from kline_store import KlineStore, PAGE_SIZE
+import logging
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeBitmart:
+    """One-minute klines from a listing time on; records every request"""
+
+    def __init__(self, listed_at: int):
+        self.listed_at = listed_at
+        self.requests = []
+
+    def get_kline(self, symbol, step, start_time, end_time):
+        self.requests.append((start_time, end_time))
+        first = max(start_time, self.listed_at)
+        return {'code': 1000, 'data': [
+            {'timestamp': t, 'open_price': str(t), 'high_price': str(t + 1), 'low_price': str(t - 1),
+             'close_price': str(t), 'volume': "1"}
+            for t in range(first, end_time, step * 60)
+        ]}
+
+def test_kline_store():
+    day = 86400
+    listed_at = 1700000000 // 60 * 60
+    bitmart = FakeBitmart(listed_at)
+    store = KlineStore(bitmart, tempfile.mkdtemp())
+
+    # First run: the day after listing, in pages
+    assert store.fetch("NEWUSDT", 1, listed_at, listed_at + day) == 1440
+    assert len(bitmart.requests) == -(-1440 // PAGE_SIZE)
+
+    # Asking from before the listing fetches the empty stretch once, then never again
+    bitmart.requests.clear()
+    assert store.fetch("NEWUSDT", 1, listed_at - day, listed_at + day) == 0
+    assert bitmart.requests and bitmart.requests[0][0] == listed_at - day
+    bitmart.requests.clear()
+    assert store.fetch("NEWUSDT", 1, listed_at - day, listed_at + day) == 0
+    assert not bitmart.requests and store.missing_ranges("NEWUSDT", 1, listed_at - day, listed_at + day) == []
+
+    # Older candles go in front of the file, newer ones at the end
+    assert store.fetch("OLDUSDT", 1, listed_at + 600, listed_at + 1200) == 10
+    assert store.fetch("OLDUSDT", 1, listed_at, listed_at + 1800) == 20
+    candles = store.load("OLDUSDT", 1)
+    assert len(candles) == 30 and candles['timestamp'][0] == listed_at
+    assert (candles['timestamp'][1:] - candles['timestamp'][:-1] == 60).all()
+
+    window = store.window("NEWUSDT", 1, listed_at, listed_at + 3600)
+    assert len(window) == 60 and window['timestamp'][0] == listed_at and window['close'][-1] == listed_at + 3540
+    logger.info(f"Stored {len(candles)} candles, window of {len(window)}")
+
+if __name__ == "__main__":
+    test_kline_store()
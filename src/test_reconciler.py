@@ -0,0 +1,70 @@
+from bitmart_client import tagged_orders, trade_tag
+from config import ReconcileConfig
+from models import Trade, TradeStatus
+from offline_exchange import OfflineExchange
+from reconciler import PositionReconciler
+import asyncio
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def run_reconciler():
+    exchange = OfflineExchange(prices={"BTCUSDT": 60000.0, "ETHUSDT": 3000.0, "SOLUSDT": 150.0},
+                               latency=0.0, volatility=0.0)
+    # Left over from a previous run: the bot's ETH short with its brackets, and a manual BTC long
+    with tagged_orders(trade_tag(-1001, 42)):
+        exchange.submit_order("ETHUSDT", side=4, size=10, leverage="5", open_type="cross")
+        exchange.submit_plan_order("ETHUSDT", side=2, size=5, leverage="5", open_type="cross",
+                                   trigger_price="2900", order_type="market", price_way=2)
+        exchange.submit_plan_order("ETHUSDT", side=2, size=5, leverage="5", open_type="cross",
+                                   trigger_price="2800", order_type="market", price_way=2)
+        exchange.submit_tp_sl_order("ETHUSDT", side=2, type="stop_loss", size=10, trigger_price="3100",
+                                    price_type=1, plan_category=1)
+    exchange.submit_order("BTCUSDT", side=1, size=10, leverage="10", open_type="cross")
+    # A SOL short of the bot's whose stop loss is gone: adopted with only its target
+    with tagged_orders(trade_tag(-1001, 43)):
+        exchange.submit_order("SOLUSDT", side=4, size=10, leverage="5", open_type="cross")
+        exchange.submit_plan_order("SOLUSDT", side=2, size=10, leverage="5", open_type="cross",
+                                   trigger_price="140", order_type="market", price_way=2)
+
+    trades = {}
+    reduced = []
+    reconciler = PositionReconciler(exchange, trades, ReconcileConfig(close_orphans=True),
+                                    on_trade_reduced=lambda trade, held: reduced.append((trade.symbol, held)))
+    adopted = await reconciler.adopt()
+    assert sorted(t.symbol for t in adopted) == ["ETHUSDT", "SOLUSDT"] and set(trades) == {"ETHUSDT", "SOLUSDT"}
+    trade = trades["ETHUSDT"]
+    assert trade.is_short and trade.size == 10 and (trade.channel_id, trade.message_id) == (-1001, 42)
+    assert trade.stop_loss == 3100 and trade.take_profits == [2900, 2800]
+    assert set(trade.brackets) == {'entry', 'tp1', 'tp2', 'stop_loss'} and trade.notional > 0
+
+    # The manual position has no bot order on it, so it survives a pass even with close_orphans on
+    await reconciler.reconcile()
+    assert ("BTCUSDT", 1) in exchange.positions and "ETHUSDT" in trades
+    # No stop loss level is known for SOL, so none is placed: a trigger at 0 would close the short
+    assert trades["SOLUSDT"].stop_loss == 0 and ("SOLUSDT", 2) in exchange.positions
+    assert not any(order.get('symbol') == "SOLUSDT" and order.get('type') == 'stop_loss'
+                   for order in exchange.get_plan_orders(plan_type='profit_loss')['data'])
+
+    # The first ETH target fills: the trade is reported as reduced to what is still held
+    exchange.submit_order("ETHUSDT", side=2, size=5, leverage="5", open_type="cross")
+    await reconciler.reconcile()
+    assert reduced == [("ETHUSDT", 5)] and "ETHUSDT" in trades
+
+    # A trade filled after the pass's snapshot isn't dropped for missing from it
+    late = Trade(symbol="XRPUSDT", side=1, size=1, leverage="5", entry_price=1.0, stop_loss=0.9,
+                 take_profits=[1.1], status=TradeStatus.OPEN, filled_at=time.time() + 60)
+    trades["XRPUSDT"] = late
+    await reconciler.reconcile()
+    assert "XRPUSDT" in trades
+    late.filled_at = time.time() - 60
+    await reconciler.reconcile()
+    assert "XRPUSDT" not in trades and late.status == TradeStatus.CLOSED
+
+def test_reconciler():
+    asyncio.run(run_reconciler())
+
+if __name__ == "__main__":
+    test_reconciler()
@@ -0,0 +1,68 @@
+from config import RiskConfig
+from models import Trade
+from risk_engine import RiskEngine
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeBalance:
+    seeded = True
+    equity = 1000.0
+
+def trade(symbol, side=1, notional=100.0, leverage="10", channel_id=1):
+    return Trade(symbol=symbol, side=side, size=1, leverage=leverage, entry_price=1.0,
+                 stop_loss=0.9, take_profits=[1.1], notional=notional, channel_id=channel_id)
+
+def test_risk_engine():
+    limits = RiskConfig(
+        max_positions=3,
+        max_symbol_notional=150,
+        max_margin_percent=5,
+        max_symbol_leverage={'DOGEUSDT': 10},
+        correlation_groups={'BTCUSDT': 'majors', 'ETHUSDT': 'majors'},
+        max_group_notional=180
+    )
+    risk = RiskEngine(FakeBalance())
+
+    btc = trade('BTCUSDT')
+    assert risk.admit(btc, limits) is None
+    assert risk.admit(trade('BTCUSDT'), limits).reason == 'max_symbol_notional'
+    # A signal that replaces the BTC trade is checked without it, and leaves it booked
+    replacement = trade('BTCUSDT')
+    assert risk.admit(replacement, limits, replacing=btc) is None
+    assert risk.by_symbol['BTCUSDT'] == 200.0
+    risk.release(replacement)
+    # Long majors: 100 + 100 > 180, while a short is a different side
+    assert risk.admit(trade('ETHUSDT'), limits).reason == 'max_group_notional'
+    eth_short = trade('ETHUSDT', side=4)
+    assert risk.admit(eth_short, limits) is None
+    assert risk.admit(trade('DOGEUSDT', leverage="20"), limits).reason == 'max_symbol_leverage'
+
+    # Margin: 10 + 10 + 35 = 55 of 1000 equity is over 5%
+    rejection = risk.admit(trade('SOLUSDT', notional=140, leverage="4"), limits)
+    assert rejection.reason == 'max_margin_percent' and abs(rejection.value - 5.5) < 1e-9
+    logger.info(f"Rejection: {rejection.as_dict()}")
+
+    assert risk.admit(trade('SOLUSDT'), limits) is None
+    assert risk.admit(trade('XRPUSDT'), limits).reason == 'max_positions'
+
+    # A position adopted at startup is booked without a check
+    risk.add(trade('ADAUSDT'), limits)
+    assert risk.positions == 4
+
+    # Partial fill, then close: aggregates return to zero, releasing twice is harmless
+    btc.notional = 50.0
+    risk.update(btc)
+    assert risk.by_symbol['BTCUSDT'] == 50.0
+    # A take profit closed 60% of it; a stale, larger figure doesn't book it back up
+    risk.reduce(btc, 20.0)
+    risk.reduce(btc, 40.0)
+    assert risk.by_symbol['BTCUSDT'] == 20.0 and abs(risk.margin - (2 + 10 + 10 + 10)) < 1e-9
+    for booked in list(risk._booked.values()):
+        risk.release(booked[0])
+    risk.release(btc)
+    assert risk.positions == 0 and abs(risk.total_notional) < 1e-9 and abs(risk.margin) < 1e-9
+
+if __name__ == "__main__":
+    test_risk_engine()
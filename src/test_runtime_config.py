@@ -0,0 +1,86 @@
+from config import Config, RuntimeConfig, TelegramConfig, BitmartConfig, load_trading_config
+from runtime_config import RuntimeConfigManager
+from metrics import metrics
+from signal import SIGHUP
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def write_config(path: str, mtime: float, **sizing):
+    """Write a trading config file with an explicit mtime, so changes show up whatever the filesystem's resolution"""
+    with open(path, 'w') as f:
+        json.dump({'sizing': {'mode': "fixed", **sizing}, 'signal_timeout': 30.0}, f)
+    os.utime(path, (mtime, mtime))
+
+def audit_versions(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line)['version'] for line in f]
+
+async def test_runtime_config():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "trading.json")
+    audit_path = os.path.join(directory, "audit.jsonl")
+    write_config(path, 1000, usdt_value=10)
+
+    runtime = RuntimeConfig(path=path, watch_interval=0.05, audit_path=audit_path)
+    config = Config(telegram=TelegramConfig(api_id="1", api_hash="x", phone="", channel_username="-1001"),
+                    bitmart=BitmartConfig(api_key="", api_secret="", memo=""),
+                    trading=load_trading_config(path), runtime=runtime)
+    manager = RuntimeConfigManager(config, runtime)
+    manager.start()
+    first = config.trading.version
+    assert config.trading.sizing.usdt_value == 10
+
+    # File change: the watcher picks up the new mtime and applies it
+    watcher = asyncio.create_task(manager.watch())
+    write_config(path, 2000, usdt_value=20)
+    for _ in range(40):
+        await asyncio.sleep(0.05)
+        if config.trading.sizing.usdt_value == 20:
+            break
+    assert config.trading.sizing.usdt_value == 20 and config.trading.version != first
+    second = config.trading.version
+
+    # SIGHUP: handled the way SignalMonitor installs it. The mtime is left unchanged
+    # so the watcher can't be the one reloading
+    watcher.cancel()
+    write_config(path, 2000, usdt_value=30)
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(SIGHUP, manager.reload)
+    try:
+        os.kill(os.getpid(), SIGHUP)
+        for _ in range(40):
+            await asyncio.sleep(0.01)
+            if config.trading.sizing.usdt_value == 30:
+                break
+    finally:
+        loop.remove_signal_handler(SIGHUP)
+    assert config.trading.sizing.usdt_value == 30
+    third = config.trading.version
+
+    # Bad files are rejected and the applied config stays in place
+    errors = metrics.counters.get(metrics._key('runtime_config_reload_errors_total', {}), 0)
+    with open(path, 'w') as f:
+        f.write('{"sizing": {"mode": "fixed", "usdt_value": ')
+    assert not manager.reload()
+    write_config(path, 3000, usdt_value=-5)
+    assert not manager.reload()
+    write_config(path, 4000, mode="martingale")
+    assert not manager.reload()
+    assert config.trading.version == third and config.trading.sizing.usdt_value == 30
+    assert metrics.counters[metrics._key('runtime_config_reload_errors_total', {})] == errors + 3
+
+    # Reloading an unchanged file applies nothing
+    write_config(path, 5000, usdt_value=30)
+    assert not manager.reload()
+
+    assert audit_versions(audit_path) == [first, second, third]
+    logger.info(f"Applied versions {first} -> {second} -> {third}, rejected 3 bad files")
+
+if __name__ == "__main__":
+    asyncio.run(test_runtime_config())
@@ -0,0 +1,73 @@
+from config import ShadowConfig
+from offline_exchange import OfflineExchange
+from shadow_exchange import ShadowBooks, ShadowExchange
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_shadow_exchange():
+    # An offline exchange stands in for the live client's public endpoints
+    live = OfflineExchange(prices={"BTCUSDT": 100.0}, latency=0.0, volatility=0.0)
+    shadow = ShadowExchange(live, ShadowConfig(equity=1000.0, taker_fee=0.001), channel_id=42)
+    books = ShadowBooks({42: shadow})
+
+    # Contract size 0.1: 10 contracts at 100 is 100 USDT
+    assert shadow.get_contract_details("BTCUSDT")['code'] == 1000
+    assert shadow.submit_order("BTCUSDT", side=1, size=10, leverage="10", open_type="cross")['code'] == 1000
+    assert shadow.positions[("BTCUSDT", 1)]['size'] == 10
+    assert books.symbols == ["BTCUSDT"]
+
+    shadow.submit_plan_order("BTCUSDT", side=3, size=5, leverage="10", open_type="cross",
+                             trigger_price="110", order_type="market", price_way=1)
+    shadow.submit_tp_sl_order("BTCUSDT", side=3, type="stop_loss", size=10, trigger_price="95",
+                              price_type=1, plan_category=1)
+    shadow.submit_trail_order("BTCUSDT", side=3, size=10, leverage="10", open_type="cross",
+                              activation_price="105", callback_rate="2", activation_price_type=1)
+
+    # Activates the trail at 105, TP at 110 takes half, a 2% retrace from 112 fires the trail
+    for price in (104, 105, 110, 112, 110.5, 109.7):
+        books.on_tick("BTCUSDT", price)
+    assert not shadow.positions and not shadow.plan_orders
+
+    # 5 @ +10 and 5 @ +9.7 on 0.1 contracts; fees on 100 + 55 + 54.85 notional
+    assert abs(shadow.realized_pnl - 9.85) < 1e-9
+    assert abs(shadow.fees - 0.20985) < 1e-9
+    assert abs(shadow.equity - (1000 + 9.85 - 0.20985)) < 1e-9
+    summary = books.report()[0]
+    logger.info(f"Shadow summary: {summary}")
+    assert summary['closed_trades'] == 1 and summary['open_positions'] == 0
+
+    # Short stopped out; a resting limit fills when the price comes to it
+    shadow.submit_order("BTCUSDT", side=4, size=10, leverage="10", open_type="cross")
+    shadow.submit_tp_sl_order("BTCUSDT", side=2, type="stop_loss", size=10, trigger_price="112",
+                              price_type=1, plan_category=1)
+    shadow.submit_order("BTCUSDT", side=1, size=2, leverage="10", open_type="cross", order_type="limit", price=108)
+    books.on_tick("BTCUSDT", 111)
+    assert ("BTCUSDT", 2) in shadow.positions and shadow.resting
+    books.on_tick("BTCUSDT", 108)
+    assert shadow.positions[("BTCUSDT", 1)]['size'] == 2 and not shadow.resting
+    books.on_tick("BTCUSDT", 112.5)
+    assert ("BTCUSDT", 2) not in shadow.positions
+
+def test_cached_details():
+    live = OfflineExchange(prices={"BTCUSDT": 100.0, "ETHUSDT": 10.0}, latency=0.0, volatility=0.0)
+    shadow = ShadowExchange(live, ShadowConfig(price_max_age=0.2), channel_id=42)
+    books = ShadowBooks({42: shadow})
+
+    # Every contract of the shared poll is learned, so entries on any symbol skip the live client
+    books.on_details(live.get_contract_details())
+    books.on_tick("ETHUSDT", 11.0)
+    requests = live.requests
+    assert shadow.get_contract("ETHUSDT")['last_price'] == "11"
+    assert shadow.calculate_position_size("BTCUSDT", 100.0, 100.0) == 10
+    assert live.requests == requests
+
+    # A stale price is fetched from the live client again
+    shadow.priced_at["BTCUSDT"] -= 1.0
+    shadow.get_contract("BTCUSDT")
+    assert live.requests == requests + 1
+
+if __name__ == "__main__":
+    test_shadow_exchange()
+    test_cached_details()
@@ -0,0 +1,70 @@
+from config import BridgeConfig
+from metrics import metrics
+from signal_bridge import BridgeReceiver, BridgeSender, decode_record, encode_record, FRAME
+import signal_parser
+import asyncio
+import logging
+import os
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIGNAL = """BTCUSDT SHORT
+Leverage: Cross 20x
+Entry zone: 59800 - 60200
+Target 1: 59000
+Target 2: 58500
+Target 3: 58000
+Stoploss: 61000"""
+
+def test_record_round_trip():
+    signal = signal_parser.parse_signal(SIGNAL)
+    signal.update(message_id=12345, channel_id=-1001234567890)
+    frame = encode_record('signal', signal, 1, received_at=1700000000.5)
+    length, = FRAME.unpack_from(frame)
+    assert length == len(frame) - FRAME.size
+
+    kind, payload, priority, received_at, _ = decode_record(frame[FRAME.size:])
+    assert (kind, priority, received_at) == ('signal', 1, 1700000000.5)
+    assert payload == {**signal, 'entry_zone': tuple(signal['entry_zone']), 'take_profits': list(signal['take_profits'])}
+
+    kind, payload, _, _, _ = decode_record(encode_record('shadow_cancellation', (-100777, 'ETHUSDT'), 0)[FRAME.size:])
+    assert (kind, payload) == ('shadow_cancellation', (-100777, 'ETHUSDT'))
+    logger.info(f"Signal record: {len(frame)} bytes")
+
+async def send_and_receive(count: int = 200):
+    config = BridgeConfig(socket_path=os.path.join(tempfile.mkdtemp(), "bridge.sock"))
+    received = []
+    receiver = BridgeReceiver(config, lambda kind, payload, priority: received.append((kind, payload)))
+    sender = BridgeSender(config)
+
+    # Sent before the executor is up: held and flushed on connect
+    sender.send('cancellation', 'SOLUSDT', 0)
+    await receiver.start()
+    task = asyncio.create_task(sender.run())
+    while not sender.connected:
+        await asyncio.sleep(0.01)
+
+    signal = signal_parser.parse_signal(SIGNAL)
+    for message_id in range(count):
+        sender.send('signal', {**signal, 'message_id': message_id}, 1)
+        await asyncio.sleep(0)
+    while len(received) < count + 1:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    sender._writer.close()
+    await asyncio.sleep(0.05)  # Let the receiver see the disconnect
+    receiver.server.close()
+
+    assert received[0] == ('cancellation', 'SOLUSDT')
+    assert [payload['message_id'] for _, payload in received[1:]] == list(range(count))
+    return metrics.histograms[metrics._key('bridge_handoff_seconds', {})]
+
+def test_bridge():
+    handoff = asyncio.run(send_and_receive())
+    logger.info(f"Handoff: {handoff.count} records, mean {handoff.sum / handoff.count * 1e6:.0f} us")
+
+if __name__ == "__main__":
+    test_record_round_trip()
+    test_bridge()
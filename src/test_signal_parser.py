@@ -1,5 +1,6 @@
 import asyncio
 from config import Config, TelegramConfig, BitmartConfig
+from ingest_queue import RawMessage
 from signal_monitor import SignalMonitor
 import json
 
@@ -21,6 +22,14 @@ Target 1: 557.39
 Target 2: 567.75
 Target 3: 576.48
 Stoploss: 526.85""",
+
+    """ETHUSDT LONG
+Leverage: Cross 20x
+Entry zone: 3250.5 - 3270.0
+Target 1: 3300.0
+Target 2: 3340.0
+Target 3: 3380.0
+Stoploss: 3190.0""",
 ]
 
 async def test_parser():
@@ -66,5 +75,16 @@ Stoploss: 549.26"""
     parsed = monitor.parse_signal(signal)
     print(json.dumps(parsed, indent=2))
 
+    # An edit of an old cancellation must not close whatever trade is open on the symbol now
+    cancellation = "#BCH/USDT Manually Cancelled"
+    assert monitor.classify_message(RawMessage(1, cancellation))[:2] == ('cancellation', 'BCHUSDT')
+    assert monitor.classify_message(RawMessage(1, cancellation + ".", edit_date=1.0)) is None
+
+    # A cancellation drops the queued signals for its symbol only
+    kind, payload, _ = monitor.classify_message(RawMessage(2, cancellation))
+    assert monitor._supersedes((kind, payload), ('signal', parsed))
+    assert not monitor._supersedes((kind, payload), ('signal', {**parsed, 'symbol': "ETHUSDT"}))
+    assert not monitor._supersedes((kind, payload), ('shadow_signal', parsed))
+
 if __name__ == "__main__":
     asyncio.run(test_parser()) 
\ No newline at end of file
@@ -0,0 +1,85 @@
+from config import IngestConfig, TelegramConfig
+from ingest_queue import IngestPipeline
+from metrics import metrics
+from telethon import events
+from telethon.tl.types import PeerChannel
+from types import SimpleNamespace
+import asyncio
+import datetime
+import logging
+import telegram_sessions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHANNEL = PeerChannel(1001)
+CHANNEL_ID = -1000000001001
+
+def message(message_id: int, text: str, edited: bool = False):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return SimpleNamespace(id=message_id, text=text, date=now - datetime.timedelta(seconds=1),
+                           edit_date=now if edited else None, peer_id=CHANNEL, out=False, post=True)
+
+class FakeClient:
+    """Enough of TelegramClient for SessionGroup.connect; the 'broken' session can't start"""
+
+    def __init__(self, session, api_id, api_hash):
+        self.session = session
+
+    async def start(self, phone=None):
+        if self.session == "broken":
+            raise ConnectionError("auth key unregistered")
+
+    async def get_entity(self, channel_id):
+        return SimpleNamespace(id=channel_id)
+
+    def is_connected(self):
+        return True
+
+def first_arrivals(session: str) -> float:
+    return metrics.counters.get(('telegram_first_arrivals_total', (('session', session),)), 0)
+
+async def deliver():
+    pipeline = IngestPipeline(IngestConfig(), classify=lambda message: None, handlers={})
+    config = TelegramConfig(api_id="0", api_hash="test", phone="", channel_username=str(CHANNEL_ID),
+                            sessions=["a", "b"])
+    group = telegram_sessions.SessionGroup(config, on_message=pipeline.submit)
+    a, b = group._handler("a"), group._handler("b")
+
+    # Message 1 reaches session b first, message 2 session a; the later copies are dropped
+    await b(events.NewMessage.Event(message(1, "BTCUSDT LONG")))
+    await a(events.NewMessage.Event(message(1, "BTCUSDT LONG")))
+    await a(events.NewMessage.Event(message(2, "#ETH/USDT Manually Cancelled")))
+    await b(events.NewMessage.Event(message(2, "#ETH/USDT Manually Cancelled")))
+    # An edit is a new version of message 1, delivered once as well
+    edit = message(1, "BTCUSDT LONG (edited)", edited=True)
+    await a(events.MessageEdited.Event(edit))
+    await b(events.MessageEdited.Event(edit))
+
+    queued = [await pipeline.raw.get() for _ in range(len(pipeline.raw))]
+    assert [(m.message_id, m.session, bool(m.edit_date)) for m in queued] == [(1, "b", False), (2, "a", False),
+                                                                              (1, "a", True)]
+    assert all(m.channel_id == CHANNEL_ID for m in queued)
+    assert first_arrivals("a") == 2 and first_arrivals("b") == 1
+    assert metrics.counters[('ingest_duplicates_total', (('session', 'b'),))] == 2
+
+async def connect():
+    # A session that can't start is skipped; the others carry the channels
+    config = TelegramConfig(api_id="0", api_hash="test", phone="", channel_username=f"{CHANNEL_ID},-1002",
+                            sessions=["broken", "backup"])
+    group = telegram_sessions.SessionGroup(config, on_message=lambda message: True, extra_channels=[-1003])
+    client_class, telegram_sessions.TelegramClient = telegram_sessions.TelegramClient, FakeClient
+    try:
+        channel = await group.connect()
+    finally:
+        telegram_sessions.TelegramClient = client_class
+    assert list(group.clients) == ["backup"] and group.client.session == "backup"
+    assert channel.id == CHANNEL_ID and [c.id for c in group.extra_channels] == [-1003]
+    assert metrics.get_gauge('telegram_session_connected', session="backup") == 1
+
+def test_telegram_sessions():
+    asyncio.run(deliver())
+    asyncio.run(connect())
+
+if __name__ == "__main__":
+    test_telegram_sessions()
@@ -0,0 +1,57 @@
+from bitmart_client import BitmartClient
+from config import BitmartConfig
+from json_codec import dumpb
+import hashlib
+import hmac
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SKEW = 2.5  # Seconds the fake server's clock runs ahead of ours
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data: dict):
+        self.content = dumpb({'code': 1000, 'data': data})
+        self.text = self.content.decode()
+
+class FakeSession:
+    """Serves /system/time from a skewed clock and records the headers of every request"""
+
+    def __init__(self):
+        self.delays = [(0.08, 0.0)]  # (before, after) the server stamps its reply, per call
+        self.headers = []
+
+    def request(self, method, url, headers=None, params=None, data=None):
+        self.headers.append(headers or {})
+        before, after = self.delays.pop(0) if self.delays else (0.0, 0.0)
+        time.sleep(before)
+        server_time = int((time.time() + SKEW) * 1000)
+        time.sleep(after)
+        if url.endswith("/system/time"):
+            return FakeResponse({'server_time': server_time})
+        return FakeResponse([])
+
+def test_time_sync():
+    config = BitmartConfig(api_key="key", api_secret="secret", memo="memo")
+    client = BitmartClient(config)
+    client.session = FakeSession()
+
+    # The first sample is slow and lopsided; calibration keeps the fastest one
+    offset = client.calibrate_time(samples=4)
+    logger.info(f"Calibrated offset {offset * 1000:.1f} ms, RTT {client.rtt * 1000:.2f} ms")
+    assert abs(offset - SKEW) < 0.01 and client.rtt < 0.05
+
+    # Signed requests carry the server-time timestamp, and the signature covers it
+    client.get_contract_assets()
+    headers = client.session.headers[-1]
+    timestamp = int(headers['X-BM-TIMESTAMP'])
+    assert abs(timestamp / 1000 - (time.time() + SKEW)) < 0.05
+    expected = hmac.new(b"secret", f"{timestamp}#memo#".encode(), hashlib.sha256).hexdigest()
+    assert headers['X-BM-SIGN'] == expected
+
+if __name__ == "__main__":
+    test_time_sync()